@@ -0,0 +1,23 @@
+#!/bin/bash
+# Builds the Lambda function deployment package.
+# Run from the project root. The resulting DiscordBot/function.zip is uploaded to
+# AWS Lambda > your function > Code > Upload from > .zip file.
+
+set -e
+
+echo "Building Lambda function package..."
+
+BUILD_DIR=$(mktemp -d)
+
+cp DiscordBot/lambda_function.py DiscordBot/server_ping.py DiscordBot/fleet_state.py DiscordBot/metrics.py DiscordBot/spot_selection.py DiscordBot/perf_report.py DiscordBot/command_output.py "$BUILD_DIR/"
+# Shared with the EC2 instance scripts
+cp ec2/scripts/rcon.py ec2/scripts/status_cache.py ec2/scripts/servers.py "$BUILD_DIR/"
+cp awsInfra/createFleet.json "$BUILD_DIR/"
+# Per-server fleet configurations, if any (see "Multiple Servers" in the README)
+for f in awsInfra/createFleet-*.json; do if [ -e "$f" ]; then cp "$f" "$BUILD_DIR/"; fi; done
+
+rm -f DiscordBot/function.zip
+(cd "$BUILD_DIR" && zip -r - .) > DiscordBot/function.zip
+rm -rf "$BUILD_DIR"
+
+echo "Done. Upload DiscordBot/function.zip to your Lambda function."
@@ -1,23 +1,35 @@
+"""
+Registers the bot's slash commands with Discord.
+
+Instead of posting every command on each run, the commands Discord already has are fetched
+once and compared with the definitions below. Only when something differs is the whole list
+sent in one bulk overwrite (PUT), or, with --strategy individual, only the changed commands
+(POST/PATCH/DELETE). Requests follow Discord's X-RateLimit-* and Retry-After headers instead
+of sleeping a fixed time.
+
+Usage:
+    python DiscordBot/commandRegistration.py               # sync the global commands
+    python DiscordBot/commandRegistration.py --dry-run     # only print what would change
+    python DiscordBot/commandRegistration.py --guild ID    # sync one server's commands (they update at once)
+"""
+import argparse
 import os
-import requests
+import sys
 import time
-from dotenv import load_dotenv
 
-# Load environment variables from a .env file
-load_dotenv()
+import requests
 
 # --- CONFIGURATION ---
-# Get these from your .env file or set them directly
-APP_ID = os.environ.get("DISCORD_APP_ID")
-BOT_TOKEN = os.environ.get("DISCORD_BOT_TOKEN") 
+# Get these from your .env file or set them directly (read in main())
+APP_ID = None
+BOT_TOKEN = None
+# Optional: the same comma-separated server names as the Lambda function's SERVERS variable.
+# When set, the 'server' option of every command offers them as choices.
+SERVERS = []
+# Point this at a stub server when testing locally
+DISCORD_API_BASE = os.environ.get("DISCORD_API_BASE", "https://discord.com/api/v10")
 # --- END CONFIGURATION ---
 
-if not all([APP_ID, BOT_TOKEN]):
-    print("Error: Please set DISCORD_APP_ID and DISCORD_BOT_TOKEN in your .env file.")
-    exit()
-
-url = f"https://discord.com/api/v10/applications/{APP_ID}/commands"
-
 # This is the definition of your slash commands
 commands = [
     {
@@ -40,6 +52,26 @@ commands = [
         "type": 1,
         "description": "Checks the status of the Minecraft server."
     },
+    {
+        "name": "backup",
+        "type": 1,
+        "description": "Backs up the Minecraft world to S3."
+    },
+    {
+        "name": "perf",
+        "type": 1,
+        "description": "Shows recent tick times, players and memory of the Minecraft server.",
+        "options": [
+            {
+                "name": "minutes",
+                "description": "How many minutes to look back (default 15, max 60).",
+                "type": 4,
+                "required": False,
+                "min_value": 1,
+                "max_value": 60
+            }
+        ]
+    },
     {
         "name": "help",
         "type": 1,
@@ -60,23 +92,229 @@ commands = [
     }
 ]
 
-headers = {
-    "Authorization": f"Bot {BOT_TOKEN}",
-    "Content-Type": "application/json"
-}
 
-print("Registering commands with Discord...")
+def server_option(servers, allow_all=False):
+    """The optional 'server' option that every command takes to pick one of the managed servers."""
+    option = {
+        "name": "server",
+        "description": "Which server (default: the first one).",
+        "type": 3,
+        "required": False
+    }
+    choices = servers + (["all"] if allow_all else [])
+    if servers:
+        option["choices"] = [{"name": name, "value": name} for name in choices]
+    return option
+
+
+def build_commands(servers):
+    """The command definitions to register, with the 'server' option added to every command but /help."""
+    built = []
+    for command in commands:
+        command = dict(command, options=list(command.get("options", [])))
+        if command["name"] != "help":
+            command["options"].append(server_option(servers, allow_all=command["name"] == "status"))
+        if not command["options"]:
+            del command["options"]
+        built.append(command)
+    return built
+
+
+# Fields of a command and of its options that this script manages, with the value Discord assumes when they are
+# missing. Everything else Discord returns (id, version, contexts, ...) is ignored when comparing.
+COMMAND_FIELDS = {"name": None, "type": 1, "description": "", "options": []}
+OPTION_FIELDS = {"type": None, "name": None, "description": "", "required": False, "choices": [], "options": [],
+                 "min_value": None, "max_value": None, "min_length": None, "max_length": None, "autocomplete": False}
+
+
+def normalize(definition, fields=COMMAND_FIELDS):
+    """Reduces a command (or option) to the fields in fields, with missing and default values made explicit."""
+    normalized = {}
+    for field, default in fields.items():
+        value = definition.get(field, default)
+        if value is None:
+            value = default
+        if field == "options":
+            value = [normalize(option, OPTION_FIELDS) for option in value or []]
+        elif field == "choices":
+            value = [{"name": choice["name"], "value": choice["value"]} for choice in value or []]
+        normalized[field] = value
+    return normalized
+
+
+def changed_fields(desired, registered):
+    """Names of the top-level fields that differ between a desired and a registered command."""
+    desired, registered = normalize(desired), normalize(registered)
+    return [field for field in COMMAND_FIELDS if desired[field] != registered[field]]
 
-for command in commands:
-    print(f"  - Registering '/{command['name']}' command...")
-    response = requests.post(url, headers=headers, json=command)
 
-    if response.status_code == 200 or response.status_code == 201:
-        print(f"  - Success! The '/{command['name']}' command has been registered.")
+def diff_commands(desired, registered):
+    """
+    Compares the desired command definitions with the commands Discord has, matched by name and type.
+    Returns {'create': [command], 'update': [(id, command, changed fields)], 'delete': [registered command],
+    'unchanged': [name]}.
+    """
+    by_key = {(command["name"], command.get("type", 1)): command for command in registered}
+    plan = {"create": [], "update": [], "delete": [], "unchanged": []}
+    for command in desired:
+        existing = by_key.pop((command["name"], command.get("type", 1)), None)
+        if existing is None:
+            plan["create"].append(command)
+            continue
+        fields = changed_fields(command, existing)
+        if fields:
+            plan["update"].append((existing["id"], command, fields))
+        else:
+            plan["unchanged"].append(command["name"])
+    plan["delete"] = list(by_key.values())
+    return plan
+
+
+class DiscordApiError(Exception):
+    pass
+
+
+class DiscordApi:
+    """
+    Minimal client for the application command endpoints. When a response says the rate limit
+    bucket is exhausted (X-RateLimit-Remaining: 0), the next request waits X-RateLimit-Reset-After;
+    a 429 is retried after its Retry-After.
+    """
+
+    def __init__(self, app_id, bot_token, guild_id=None, api_base=DISCORD_API_BASE, max_retries=5,
+                 session=None, clock=time.monotonic, sleep=time.sleep):
+        self.url = f"{api_base}/applications/{app_id}"
+        if guild_id:
+            self.url += f"/guilds/{guild_id}"
+        self.url += "/commands"
+        self.headers = {
+            "Authorization": f"Bot {bot_token}",
+            "Content-Type": "application/json",
+            "User-Agent": "DiscordBot (AWSMinecraft, 1.0)"
+        }
+        self.max_retries = max_retries
+        self.session = session or requests.Session()
+        self.clock = clock
+        self.sleep = sleep
+        self.requests = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+        self._blocked_until = 0.0
+
+    def _wait(self, seconds):
+        if seconds > 0:
+            self.waited += seconds
+            self.sleep(seconds)
+
+    def request(self, method, command_id=None, payload=None):
+        url = f"{self.url}/{command_id}" if command_id else self.url
+        for _ in range(self.max_retries + 1):
+            self._wait(self._blocked_until - self.clock())
+            self.requests += 1
+            response = self.session.request(method, url, headers=self.headers, json=payload, timeout=10)
+
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                self._blocked_until = self.clock() + float(response.headers.get("X-RateLimit-Reset-After", 1))
+            if response.status_code == 429:
+                self.rate_limited += 1
+                retry_after = response.headers.get("Retry-After")
+                if retry_after is None:
+                    retry_after = response.json().get("retry_after", 1)
+                print(f"  Rate limited on {method} {url}, retrying in {float(retry_after):.2f}s")
+                self._blocked_until = max(self._blocked_until, self.clock() + float(retry_after))
+                continue
+            if response.status_code >= 400:
+                raise DiscordApiError(f"{method} {url} failed: {response.status_code} {response.text}")
+            return response.json() if response.content else None
+        raise DiscordApiError(f"{method} {url} still rate limited after {self.max_retries} retries")
+
+    def list_commands(self):
+        return self.request("GET")
+
+    def bulk_overwrite(self, commands):
+        return self.request("PUT", payload=commands)
+
+    def create(self, command):
+        return self.request("POST", payload=command)
+
+    def edit(self, command_id, command):
+        return self.request("PATCH", command_id, command)
+
+    def delete(self, command_id):
+        return self.request("DELETE", command_id)
+
+
+def print_plan(plan):
+    for command in plan["create"]:
+        print(f"  + /{command['name']} (new)")
+    for _, command, fields in plan["update"]:
+        print(f"  ~ /{command['name']} ({', '.join(fields)} changed)")
+    for command in plan["delete"]:
+        print(f"  - /{command['name']} (no longer defined)")
+    for name in plan["unchanged"]:
+        print(f"  = /{name}")
+
+
+def sync_commands(api, desired, strategy="bulk", dry_run=False):
+    """
+    Brings the registered commands in line with desired. 'bulk' sends the whole list in one PUT;
+    'individual' creates, edits and deletes only the commands that differ. Returns the plan.
+    """
+    plan = diff_commands(desired, api.list_commands())
+    print_plan(plan)
+    if not (plan["create"] or plan["update"] or plan["delete"]):
+        print("Commands are up to date. Nothing to register.")
+        return plan
+    if dry_run:
+        print("Dry run: no changes sent to Discord.")
+        return plan
+
+    if strategy == "bulk":
+        # Commands keep their IDs when they keep their name, and anything missing from the list is deleted
+        api.bulk_overwrite(desired)
     else:
-        print(f"  - Error registering '/{command['name']}' command: {response.status_code}")
-        print(response.text)
-    # Add a small delay to avoid rate limiting
-    time.sleep(1)
+        for command in plan["create"]:
+            api.create(command)
+        for command_id, command, _ in plan["update"]:
+            api.edit(command_id, command)
+        for command in plan["delete"]:
+            api.delete(command["id"])
+    print(f"Registered {len(plan['create'])} new, {len(plan['update'])} changed and deleted {len(plan['delete'])} "
+          f"command(s) with {api.requests} request(s).")
+    return plan
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Sync the bot's slash commands with Discord.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the changes without sending them")
+    parser.add_argument("--strategy", choices=["bulk", "individual"], default="bulk",
+                        help="Overwrite all commands in one request, or create/edit/delete only the changed ones")
+    parser.add_argument("--guild", help="Sync the commands of one Discord server instead of the global ones")
+    args = parser.parse_args()
+
+    # Load environment variables from a .env file
+    load_dotenv()
+    app_id = APP_ID or os.environ.get("DISCORD_APP_ID")
+    bot_token = BOT_TOKEN or os.environ.get("DISCORD_BOT_TOKEN")
+    servers = SERVERS or [name.strip() for name in os.environ.get("MINECRAFT_SERVERS", "").split(",") if name.strip()]
+    if not all([app_id, bot_token]):
+        print("Error: Please set DISCORD_APP_ID and DISCORD_BOT_TOKEN in your .env file.")
+        return 1
+
+    api = DiscordApi(app_id, bot_token, guild_id=args.guild, api_base=os.environ.get("DISCORD_API_BASE", DISCORD_API_BASE))
+    print(f"Syncing {'guild ' + args.guild if args.guild else 'global'} commands with Discord...")
+    try:
+        plan = sync_commands(api, build_commands(servers), args.strategy, args.dry_run)
+    except (DiscordApiError, requests.RequestException) as e:
+        print(f"Error: {e}")
+        return 1
+    changed = plan["create"] or plan["update"] or plan["delete"]
+    if changed and not args.dry_run and not args.guild:
+        print("Global command changes may take up to an hour to appear in your server.")
+    return 0
+
 
-print("\nAll commands registered. It may take up to an hour for them to appear in your server.")
+if __name__ == "__main__":
+    sys.exit(main())
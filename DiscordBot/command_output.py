@@ -0,0 +1,137 @@
+"""
+Turns the output of a Minecraft command into Discord messages.
+
+Outputs like `datapack list` or plugin dumps can be far longer than one message. The output
+is processed as a stream of text chunks, so a long output is never held or fetched in full:
+
+  1. read: SSM keeps only the first 24,000 characters of StandardOutputContent. When that
+     limit is hit, the full output is read page by page from the command's CloudWatch log
+     stream (read_cloudwatch_output) instead.
+  2. strip: ANSI escape sequences and § color codes are removed in one pass over the chunks,
+     holding back a sequence that is cut at a chunk boundary until the next chunk arrives.
+  3. paginate: lines are packed into pages that fit Discord's 2000 character limit, each in
+     its own code block (with ``` in the output defused). After max_pages, reading stops and
+     the last page says where the full output is.
+"""
+import re
+
+# Discord rejects messages longer than this
+DISCORD_MESSAGE_LIMIT = 2000
+# StandardOutputContent of get_command_invocation is cut after this many characters
+SSM_OUTPUT_LIMIT = 24000
+# CSI sequences (ESC [ ... final byte) and the two-character ESC sequences
+ANSI_REGEX = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+COLOR_CODE_REGEX = re.compile('§[0-9a-fk-or]', re.IGNORECASE)
+# An escape or color sequence that may continue in the next chunk
+INCOMPLETE_TAIL_REGEX = re.compile(r'(\x1B(\[[0-?]*[ -/]*)?|§)$')
+CODE_BLOCK = '```'
+# Added to every page: the opening and closing code block fences and their line breaks
+PAGE_OVERHEAD = 2 * len(CODE_BLOCK) + 2
+
+
+def strip_codes(text):
+    """Removes ANSI escape sequences and § color codes from a complete string."""
+    return COLOR_CODE_REGEX.sub('', ANSI_REGEX.sub('', text))
+
+
+def strip_stream(chunks):
+    """Yields the chunks with ANSI escape sequences and § color codes removed, even when they span two chunks."""
+    pending = ''
+    for chunk in chunks:
+        text = pending + chunk
+        tail = INCOMPLETE_TAIL_REGEX.search(text)
+        pending = tail.group(0) if tail else ''
+        if pending:
+            text = text[:-len(pending)]
+        if text:
+            yield strip_codes(text)
+    if pending:
+        yield strip_codes(pending)
+
+
+def iter_lines(chunks):
+    """Yields the lines (without line breaks) of a stream of text chunks."""
+    partial = ''
+    for chunk in chunks:
+        lines = (partial + chunk).split('\n')
+        partial = lines.pop()
+        yield from lines
+    if partial:
+        yield partial
+
+
+def defuse_code_blocks(line):
+    """Breaks up ``` so the output cannot close its code block early."""
+    return line.replace(CODE_BLOCK, '``\u200b`')
+
+
+def paginate(chunks, header='', max_pages=5, limit=DISCORD_MESSAGE_LIMIT, saved_to=None):
+    """
+    Returns the output in chunks as a list of at most max_pages messages, each at most limit characters.
+    header starts the first page. If the output does not fit, the last page ends with a note pointing at
+    saved_to (where the full output can be found) and the rest of chunks is not read.
+    """
+    note = f"\n_Output cut after {max_pages} page(s).{f' Full output: {saved_to}' if saved_to else ''}_"
+    pages, current, used = [], [], 0
+
+    def capacity():
+        """Characters of output the page being filled can hold."""
+        room = limit - PAGE_OVERHEAD - (len(header) + 1 if not pages and header else 0)
+        return room - (len(note) if len(pages) == max_pages - 1 else 0)
+
+    def add(piece):
+        nonlocal used
+        used += len(piece) + (1 if current else 0)
+        current.append(piece)
+
+    def close_page():
+        nonlocal current, used
+        prefix = f"{header}\n" if not pages and header else ''
+        pages.append(f"{prefix}{CODE_BLOCK}\n" + '\n'.join(current) + f"\n{CODE_BLOCK}")
+        current, used = [], 0
+
+    truncated = False
+    for line in iter_lines(strip_stream(chunks)):
+        line = defuse_code_blocks(line.rstrip('\r'))
+        while line is not None:
+            room = capacity() - used - (1 if current else 0)
+            if len(line) <= room:
+                add(line)
+                line = None
+                continue
+            if room > 0 and (not current or len(line) > limit - PAGE_OVERHEAD - len(note)):
+                # A line longer than a page fills this one and continues on the next
+                add(line[:room])
+                line = line[room:]
+            if len(pages) == max_pages - 1:
+                truncated = True
+                break
+            close_page()
+        if truncated:
+            break
+
+    if not current and not pages:
+        return [f"{header}\n(no output)" if header else "(no output)"]
+    if current:
+        close_page()
+    if truncated:
+        pages[-1] += note
+    return pages
+
+
+def read_cloudwatch_output(logs_client, log_group, log_stream, page_limit=100):
+    """
+    Yields the message of every event in a CloudWatch log stream, oldest first, fetching one page of
+    events at a time so the caller can stop early. An SSM Run Command writes its stdout to the stream
+    <command ID>/<instance ID>/aws-runShellScript/stdout.
+    """
+    kwargs = {'logGroupName': log_group, 'logStreamName': log_stream, 'startFromHead': True, 'limit': page_limit}
+    while True:
+        response = logs_client.get_log_events(**kwargs)
+        for event in response['events']:
+            message = event['message']
+            yield message if message.endswith('\n') else message + '\n'
+        # The same token comes back once the end of the stream is reached
+        if not response['events'] or response.get('nextForwardToken') == kwargs.get('nextToken'):
+            return
+        kwargs['nextToken'] = response['nextForwardToken']
@@ -0,0 +1,272 @@
+"""
+Resolves the state of the Minecraft fleet and its active instance.
+
+Every command needs some part of the same fleet -> fleet instances -> instance chain
+(or, in fast-resume mode, just the standby instance).
+FleetStateResolver fetches it once with the minimum number of EC2 calls, running
+describe_fleets next to describe_fleet_instances, and memoizes the resulting
+FleetSnapshot for the rest of the invocation (and optionally for a few seconds
+across warm invocations). resolve_many() does the same for several servers at once,
+with the same few calls however many fleets there are.
+"""
+import time
+
+# Fleet states in which the fleet can still run instances
+ACTIVE_FLEET_STATES = ['submitted', 'active', 'modifying']
+# Fleet states after which the fleet can never run instances again
+FINISHED_FLEET_STATES = ['cancelled', 'cancelled_running', 'cancelled_terminating', 'deleted', 'deleted_running',
+                         'deleted_terminating', 'failed']
+# Instance states that describe_fleet_instances reports as active
+LIVE_INSTANCE_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+
+def timed_call(timings, name, func, *args, **kwargs):
+    """Calls func and records its duration in milliseconds under timings[name]. timings may be None."""
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if timings is not None:
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+class FleetSnapshot:
+    """
+    Point-in-time view of the fleet and its active instance. Fields are None when unknown.
+    Standby snapshots describe a persistent instance that is stopped and resumed instead of
+    a fleet, so their fleet fields are always None.
+    """
+
+    __slots__ = ('fleet_id', 'fleet_state', 'target_capacity', 'instance_id', 'instance_state', 'public_ip',
+                 'instance_type', 'launch_time', 'lifecycle', 'hibernation', 'tags', 'standby', 'resolved_at')
+
+    def __init__(self, fleet_id, standby=False):
+        self.fleet_id = fleet_id
+        self.fleet_state = None
+        self.target_capacity = None
+        self.instance_id = None
+        self.instance_state = None
+        self.public_ip = None
+        self.instance_type = None
+        self.launch_time = None
+        self.lifecycle = None
+        self.hibernation = False
+        self.tags = {}
+        self.standby = standby
+        self.resolved_at = time.time()
+
+    @property
+    def fleet_exists(self):
+        """True if AWS still knows about the fleet."""
+        return self.fleet_state is not None
+
+    @property
+    def fleet_active(self):
+        return self.fleet_state in ACTIVE_FLEET_STATES
+
+    @property
+    def fleet_finished(self):
+        """True if the fleet is gone or can never run instances again. Never true for standby snapshots."""
+        if self.standby:
+            return False
+        return self.fleet_state is None or self.fleet_state in FINISHED_FLEET_STATES
+
+    @property
+    def instance_running(self):
+        return self.instance_state == 'running' and self.public_ip is not None
+
+    def __repr__(self):
+        return (f"FleetSnapshot(fleet_id={self.fleet_id!r}, standby={self.standby!r}, fleet_state={self.fleet_state!r}, "
+                f"target_capacity={self.target_capacity!r}, instance_id={self.instance_id!r}, "
+                f"instance_state={self.instance_state!r}, public_ip={self.public_ip!r})")
+
+
+class FleetStateResolver:
+    """
+    Builds FleetSnapshots and memoizes them by fleet ID (or instance ID for standby instances).
+
+    Call begin_invocation() at the start of every Lambda invocation. Snapshots are reused
+    within the invocation, and across invocations while they are younger than ttl seconds.
+    Call invalidate() after any change to the fleet or its instances.
+    """
+
+    def __init__(self, ec2_client, executor, ttl=0):
+        self.ec2_client = ec2_client
+        self.executor = executor
+        self.ttl = ttl
+        self._snapshots = {}
+        self._invocation_snapshots = {}
+
+    def begin_invocation(self):
+        """Drops the per-invocation memo. Snapshots younger than the TTL are still reused."""
+        self._invocation_snapshots = {}
+
+    def invalidate(self, key=None):
+        """Forgets the snapshot of one fleet or standby instance, or of everything if no ID is given."""
+        if key is None:
+            self._snapshots = {}
+            self._invocation_snapshots = {}
+        else:
+            self._snapshots.pop(key, None)
+            self._invocation_snapshots.pop(key, None)
+
+    def resolve(self, fleet_id, timings=None):
+        """Returns the snapshot of the fleet, describing it only if no usable snapshot is memoized."""
+        return self._memoized(fleet_id, lambda: self._describe(fleet_id, timings))
+
+    def resolve_standby(self, instance_id, timings=None):
+        """Returns the snapshot of a standby instance that is resumed instead of launched through a fleet."""
+        return self._memoized(instance_id, lambda: self._describe_standby(instance_id, timings))
+
+    def resolve_many(self, fleet_ids=(), standby_instance_ids=(), timings=None):
+        """
+        Returns {fleet or instance ID: snapshot} for several fleets and standby instances, describing the ones
+        without a usable memoized snapshot together. The calls do not grow with the number of fleets:
+        one describe_fleets, one describe_instances for the instances of all fleets (by their
+        aws:ec2:fleet-id tag) and one describe_instances for the standby instances, all in parallel.
+        """
+        snapshots = {key: self._usable(key) for key in list(fleet_ids) + list(standby_instance_ids)}
+        missing_fleets = [fleet_id for fleet_id in fleet_ids if snapshots[fleet_id] is None]
+        missing_standby = [instance_id for instance_id in standby_instance_ids if snapshots[instance_id] is None]
+        if not missing_fleets and not missing_standby:
+            return snapshots
+
+        fresh = {fleet_id: FleetSnapshot(fleet_id) for fleet_id in missing_fleets}
+        for instance_id in missing_standby:
+            fresh[instance_id] = FleetSnapshot(None, standby=True)
+            fresh[instance_id].instance_id = instance_id
+
+        fleets_future = instances_future = standby_future = None
+        if missing_fleets:
+            fleets_future = self.executor.submit(timed_call, timings, 'describe_fleets', self._fleets, missing_fleets)
+            instances_future = self.executor.submit(timed_call, timings, 'describe_instances',
+                                                    self._fleet_instances, missing_fleets)
+        if missing_standby:
+            standby_future = self.executor.submit(timed_call, timings, 'describe_standby_instances',
+                                                  self.ec2_client.describe_instances, InstanceIds=missing_standby)
+
+        if fleets_future:
+            for fleet in fleets_future.result():
+                fresh[fleet['FleetId']].fleet_state = fleet['FleetState']
+                fresh[fleet['FleetId']].target_capacity = fleet['TargetCapacitySpecification']['TotalTargetCapacity']
+            for fleet_id, instance_details in instances_future.result().items():
+                fresh[fleet_id].instance_id = instance_details['InstanceId']
+                self._apply_instance(fresh[fleet_id], instance_details)
+        if standby_future:
+            for reservation in standby_future.result()['Reservations']:
+                for instance_details in reservation['Instances']:
+                    self._apply_instance(fresh[instance_details['InstanceId']], instance_details)
+
+        for key, snapshot in fresh.items():
+            print(f"Resolved {'standby ' if snapshot.standby else ''}{snapshot}")
+            self._snapshots[key] = self._invocation_snapshots[key] = snapshots[key] = snapshot
+        return snapshots
+
+    def _fleets(self, fleet_ids):
+        """describe_fleets for several fleets. Fleets too old to be known to AWS are left out."""
+        # Imported here so loading this module does not pull in botocore
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.ec2_client.describe_fleets(FleetIds=fleet_ids)['Fleets']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidFleetId.NotFound':
+                raise e
+            if len(fleet_ids) == 1:
+                return []
+        # One unknown ID fails the whole call; fall back to one call per fleet
+        return [fleet for fleet_id in fleet_ids for fleet in self._fleets([fleet_id])]
+
+    def _fleet_instances(self, fleet_ids):
+        """{fleet ID: instance details} of the live instance of each fleet, found by the tag EC2 Fleet puts on them."""
+        filters = [{'Name': 'tag:aws:ec2:fleet-id', 'Values': fleet_ids},
+                   {'Name': 'instance-state-name', 'Values': LIVE_INSTANCE_STATES}]
+        instances = {}
+        kwargs = {}
+        while True:
+            response = self.ec2_client.describe_instances(Filters=filters, **kwargs)
+            for reservation in response['Reservations']:
+                for instance_details in reservation['Instances']:
+                    tags = {tag['Key']: tag['Value'] for tag in instance_details.get('Tags', [])}
+                    instances.setdefault(tags.get('aws:ec2:fleet-id'), instance_details)
+            if not response.get('NextToken'):
+                return instances
+            kwargs['NextToken'] = response['NextToken']
+
+    def _usable(self, key):
+        """The memoized snapshot for key if it can still be used, else None."""
+        snapshot = self._invocation_snapshots.get(key)
+        if snapshot is None:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or time.time() - snapshot.resolved_at >= self.ttl:
+                return None
+            self._invocation_snapshots[key] = snapshot
+        return snapshot
+
+    def _memoized(self, key, describe):
+        snapshot = self._invocation_snapshots.get(key)
+        if snapshot is None:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or time.time() - snapshot.resolved_at >= self.ttl:
+                snapshot = describe()
+                self._snapshots[key] = snapshot
+            self._invocation_snapshots[key] = snapshot
+        return snapshot
+
+    def _describe_instance(self, snapshot, timings):
+        instance_response = timed_call(timings, 'describe_instances',
+                                       self.ec2_client.describe_instances, InstanceIds=[snapshot.instance_id])
+        self._apply_instance(snapshot, instance_response['Reservations'][0]['Instances'][0])
+
+    def _apply_instance(self, snapshot, instance_details):
+        snapshot.instance_state = instance_details['State']['Name']
+        snapshot.public_ip = instance_details.get('PublicIpAddress')
+        snapshot.instance_type = instance_details.get('InstanceType')
+        snapshot.launch_time = instance_details.get('LaunchTime')
+        snapshot.lifecycle = instance_details.get('InstanceLifecycle')
+        snapshot.hibernation = instance_details.get('HibernationOptions', {}).get('Configured', False)
+        snapshot.tags = {tag['Key']: tag['Value'] for tag in instance_details.get('Tags', [])}
+
+    def _describe_standby(self, instance_id, timings):
+        snapshot = FleetSnapshot(None, standby=True)
+        snapshot.instance_id = instance_id
+        self._describe_instance(snapshot, timings)
+        print(f"Resolved standby {snapshot}")
+        return snapshot
+
+    def _describe(self, fleet_id, timings):
+        # Imported here so loading this module does not pull in botocore
+        from botocore.exceptions import ClientError
+
+        snapshot = FleetSnapshot(fleet_id)
+
+        # describe_fleets and describe_fleet_instances are independent; only the instance details wait
+        fleet_future = self.executor.submit(timed_call, timings, 'describe_fleets',
+                                            self.ec2_client.describe_fleets, FleetIds=[fleet_id])
+        try:
+            fleet_instance_response = timed_call(timings, 'describe_fleet_instances',
+                                                 self.ec2_client.describe_fleet_instances, FleetId=fleet_id)
+            active_instances = fleet_instance_response.get('ActiveInstances', [])
+        except ClientError as e:
+            # Fleets that no longer exist cannot list instances either
+            if e.response['Error']['Code'] != 'InvalidFleetId.NotFound':
+                raise e
+            active_instances = []
+
+        if active_instances:
+            snapshot.instance_id = active_instances[0]['InstanceId']
+            self._describe_instance(snapshot, timings)
+
+        try:
+            fleets = fleet_future.result()['Fleets']
+        except ClientError as e:
+            # A fleet that is old enough no longer shows up in describe_fleets at all
+            if e.response['Error']['Code'] != 'InvalidFleetId.NotFound':
+                raise e
+            fleets = []
+        if fleets:
+            snapshot.fleet_state = fleets[0]['FleetState']
+            snapshot.target_capacity = fleets[0]['TargetCapacitySpecification']['TotalTargetCapacity']
+
+        print(f"Resolved {snapshot}")
+        return snapshot
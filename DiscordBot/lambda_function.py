@@ -1,26 +1,184 @@
 import os
 import json
-import socket
-import boto3
 import time
-import re
+import threading
+import shlex
+from concurrent.futures import ThreadPoolExecutor
 from nacl.signing import VerifyKey
 from nacl.exceptions import BadSignatureError
-from botocore.exceptions import ClientError
+from rcon import RconClient, RconError
+from command_output import SSM_OUTPUT_LIMIT, paginate, read_cloudwatch_output
+from server_ping import ping_server
+from fleet_state import FleetStateResolver, timed_call
+from spot_selection import SpotSelector
+from perf_report import format_perf_report
+from status_cache import StatusCache, MemoryStatusStore, DynamoStatusStore, status_key
+from servers import SERVER_TAG, parameter_name, parse_servers
+import metrics
 
 # Load environment variables
 AWS_REGION = os.environ.get('MY_AWS_REGION', 'us-east-1') # Default to us-east-1 if not set
 
-ec2_client = boto3.client('ec2', region_name=AWS_REGION)
-ssm_client = boto3.client('ssm', region_name=AWS_REGION)
+# With LAZY_INIT (the default), boto3 is imported and the clients and SSM parameters are loaded on first use,
+# so PING, rejected signatures and /help never pay for them. 'false' loads everything during the init phase.
+LAZY_INIT = os.environ.get('LAZY_INIT', 'true').lower() != 'false'
+
+class LazyClient:
+    """
+    Stands in for a boto3 client and creates it the first time one of its attributes is used.
+    Every AWS call made through it is timed for the per-command EMF metrics (see metrics.py).
+    """
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self._client = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Returns the boto3 client, creating it if needed."""
+        if self._client is None:
+            # Executor threads can reach a new client at the same time
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    self._client = metrics.instrument_client(boto3.client(self.service_name, region_name=AWS_REGION))
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+ec2_client = LazyClient('ec2')
+ssm_client = LazyClient('ssm')
+lambda_client = LazyClient('lambda')
+dynamodb_client = LazyClient('dynamodb')
+logs_client = LazyClient('logs')
 
 server_port = 25565
+# Total time budget for the Server List Ping handshake, status request and ping/pong
+SERVER_PING_TIMEOUT = float(os.environ.get('SERVER_PING_TIMEOUT', '1.5'))
+# Instance tag with the JVM profile the server was started with (written by ec2/scripts/jvm_profile.py)
+JVM_PROFILE_TAG = 'minecraft:jvm-profile'
+
+# Deferred responses: slow commands are acknowledged right away with a type 5 response and
+# finished by a worker that edits the original message through the interaction webhook.
+# 'lambda' re-invokes this function asynchronously, 'thread' runs the worker on a local
+# background thread (stand-in for local testing only), 'off' runs every command inline.
+DEFERRED_MODE = os.environ.get('DEFERRED_MODE', 'lambda')
+DISCORD_API_BASE = os.environ.get('DISCORD_API_BASE', 'https://discord.com/api/v10')
+
+# How /command reaches the server. 'ssm' runs the RCON client on the instance through SSM Run Command,
+# 'direct' connects from Lambda to RCON_PORT on the instance (requires a security group rule for that port).
+RCON_TRANSPORT = os.environ.get('RCON_TRANSPORT', 'ssm')
+RCON_PORT = int(os.environ.get('RCON_PORT', '25575'))
+SSM_COMMAND_TIMEOUT = float(os.environ.get('SSM_COMMAND_TIMEOUT', '8'))
+# Long /command output is sent as up to this many messages (the first edits the deferred response, the rest
+# are follow-ups). Output beyond that is only in the SSM command's CloudWatch log stream.
+MAX_OUTPUT_PAGES = int(os.environ.get('MAX_OUTPUT_PAGES', '5'))
+# Log group of the SSM Run Command output. It keeps the full stdout, which get_command_invocation cuts at 24,000 characters.
+COMMAND_LOG_GROUP = '/aws/ssm/AWS-RunShellScript'
+# Seconds /backup waits for the backup to finish before reporting that it is still running on the instance
+BACKUP_COMMAND_TIMEOUT = float(os.environ.get('BACKUP_COMMAND_TIMEOUT', '20'))
+# Ring buffer of tick performance samples written on the instance by /opt/minecraft/perf_sampler.py
+PERF_FILE = '/run/minecraft-perf/perf.json'
+
+# Shared pool for independent AWS calls. boto3 clients are thread safe, and the pool survives warm invocations.
+# 10 workers match the connection pool of a boto3 client.
+aws_executor = ThreadPoolExecutor(max_workers=10)
+# Server list pings of `/status all`, one per running server at the same time
+ping_executor = ThreadPoolExecutor(max_workers=16)
+
+# Comma-separated names of the servers (worlds) the bot manages. Every command takes a 'server' option and
+# defaults to the first one. Each server's parameters live under /minecraft/<server>/, except 'default',
+# which uses the original /minecraft/ parameters (see ec2/scripts/servers.py).
+SERVERS = parse_servers(os.environ.get('SERVERS', ''))
+
+# 'fleet' starts the server by raising the fleet's target capacity, which launches a fresh spot instance.
+# 'resume' starts the stopped (or hibernated) standby instance in /minecraft/standby_instance_id instead,
+# and falls back to the fleet if none is registered.
+START_MODE = os.environ.get('START_MODE', 'fleet')
+
+# Fleet snapshots are memoized for the invocation, and for FLEET_STATE_TTL seconds across warm invocations
+FLEET_STATE_TTL = float(os.environ.get('FLEET_STATE_TTL', '0'))
+fleet_resolver = FleetStateResolver(ec2_client, aws_executor, FLEET_STATE_TTL)
+
+# Comma-separated instance types /start_fleet ranks by spot price, interruption rate and single-thread
+# performance before creating the fleet. Empty sends createFleet.json as is.
+SPOT_CANDIDATE_TYPES = [t.strip() for t in os.environ.get('SPOT_CANDIDATE_TYPES', '').split(',') if t.strip()]
+SPOT_PRICE_WINDOW_HOURS = float(os.environ.get('SPOT_PRICE_WINDOW_HOURS', '24'))
+SPOT_PRICE_CACHE_TTL = float(os.environ.get('SPOT_PRICE_CACHE_TTL', '3600'))
+spot_selector = SpotSelector(ec2_client, aws_executor, AWS_REGION, SPOT_CANDIDATE_TYPES,
+                             SPOT_PRICE_WINDOW_HOURS, SPOT_PRICE_CACHE_TTL)
+
+# /status results are shared for STATUS_CACHE_TTL seconds, and concurrent invocations wait for one refresh
+# instead of each describing the fleet. The cache lives in the DynamoDB table named in
+# /minecraft/status_cache_table, or in this Lambda instance's memory if none is set. 0 disables it.
+STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', '10'))
+status_cache = None
+
+# SSM parameters used by the bot, for every server. They are fetched together (get_parameters takes up to
+# 10 names per call, so larger batches run in parallel) and kept across warm invocations for PARAMETER_CACHE_TTL seconds.
+SERVER_PARAMETERS = ['fleet_id', 'eip_allocation_id', 'rcon_password', 'standby_instance_id']
+PARAMETER_NAMES = [
+    '/minecraft/discord_public_key',
+    '/minecraft/status_cache_table'
+] + [parameter_name(server, name) for server in SERVERS for name in SERVER_PARAMETERS]
+GET_PARAMETERS_BATCH_SIZE = 10
+PARAMETER_CACHE_TTL = int(os.environ.get('PARAMETER_CACHE_TTL', '300'))
+
+# Parameter name -> (value, fetch time). Missing parameters are cached as None.
+parameter_cache = {}
+
+def refresh_parameters(names):
+    """Fetches the given parameters from SSM Parameter Store in as few batches as possible and caches them."""
+    batches = [names[i:i + GET_PARAMETERS_BATCH_SIZE] for i in range(0, len(names), GET_PARAMETERS_BATCH_SIZE)]
+    if len(batches) == 1:
+        responses = [ssm_client.get_parameters(Names=batches[0], WithDecryption=True)]
+    else:
+        responses = list(aws_executor.map(lambda batch: ssm_client.get_parameters(Names=batch, WithDecryption=True), batches))
+    fetched_at = time.time()
+    for response in responses:
+        for parameter in response['Parameters']:
+            parameter_cache[parameter['Name']] = (parameter['Value'], fetched_at)
+        for name in response.get('InvalidParameters', []):
+            parameter_cache[name] = (None, fetched_at)
+
+def is_parameter_fresh(name):
+    """Checks if a parameter is cached and younger than PARAMETER_CACHE_TTL."""
+    cached = parameter_cache.get(name)
+    return cached is not None and time.time() - cached[1] < PARAMETER_CACHE_TTL
+
+def get_parameter(name):
+    """
+    Returns a parameter value from the cache, or None if the parameter does not exist.
+    On a miss, every stale parameter is refreshed in the same round trip.
+    """
+    if not is_parameter_fresh(name):
+        stale_names = [n for n in PARAMETER_NAMES if not is_parameter_fresh(n)]
+        if name not in stale_names:
+            stale_names.append(name)
+        refresh_parameters(stale_names)
+    return parameter_cache[name][0]
+
+def invalidate_parameter(name):
+    """Drops a parameter from the cache so the next read fetches it from SSM again."""
+    parameter_cache.pop(name, None)
+
+# Setting DISCORD_PUBLIC_KEY skips the SSM lookup, so PING and rejected requests never touch AWS
+verify_key = None
 
-ssmResponse = ssm_client.get_parameter(
-    Name='/minecraft/discord_public_key'
-)
-PUBLIC_KEY = ssmResponse['Parameter']['Value']
-verify_key = VerifyKey(bytes.fromhex(PUBLIC_KEY))
+def get_verify_key():
+    """Returns the VerifyKey for the application's public key, building it on first use."""
+    global verify_key
+    if verify_key is None:
+        public_key = os.environ.get('DISCORD_PUBLIC_KEY') or get_parameter('/minecraft/discord_public_key')
+        verify_key = VerifyKey(bytes.fromhex(public_key))
+    return verify_key
+
+if not LAZY_INIT:
+    get_verify_key()
+    refresh_parameters([name for name in PARAMETER_NAMES if not is_parameter_fresh(name)])
+    for client in [ec2_client, ssm_client, lambda_client]:
+        client.load()
 
 # Hardcoded list of authorized user IDs (Discord user IDs as strings)
 # Find your ID in Discord: Settings > Advanced > Enable Developer Mode, then right-click your name > Copy User ID
@@ -35,88 +193,126 @@ def is_authorized(user_id):
     """
     return user_id in AUTHORIZED_USERS
 
-def get_fleet_id():
-    """Retrieves the fleet ID from SSM Parameter Store."""
-    try:
-        ssm_response = ssm_client.get_parameter(Name='/minecraft/fleet_id')
-        return ssm_response['Parameter']['Value']
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ParameterNotFound':
-            return None
-        raise e
+def get_fleet_id(server):
+    """Retrieves the server's fleet ID from SSM Parameter Store."""
+    return get_parameter(parameter_name(server, 'fleet_id'))
 
-def get_eip_id():
-    """Retrieves the EIP Allocation ID from SSM Parameter Store."""
-    try:
-        ssm_response = ssm_client.get_parameter(Name='/minecraft/eip_allocation_id')
-        return ssm_response['Parameter']['Value']
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ParameterNotFound':
-            return None
-        raise e
+def get_eip_id(server):
+    """Retrieves the server's EIP Allocation ID from SSM Parameter Store."""
+    return get_parameter(parameter_name(server, 'eip_allocation_id'))
         
-def get_rcon_password():
-    """Retrives the encrypted RCON password from SSM Parameter Store."""
+def get_rcon_password(server):
+    """Retrives the server's encrypted RCON password from SSM Parameter Store."""
+    return get_parameter(parameter_name(server, 'rcon_password'))
+
+def get_standby_instance_id(server):
+    """Retrieves the ID of the server's persistent instance used by the fast-resume start mode."""
+    return get_parameter(parameter_name(server, 'standby_instance_id'))
+
+def get_standby_instance_ids():
+    """Returns {server: standby instance ID} of the servers that have one, in fast-resume mode."""
+    if START_MODE != 'resume':
+        return {}
+    return {server: get_standby_instance_id(server) for server in SERVERS if get_standby_instance_id(server)}
+
+def get_status_cache():
+    """Returns the shared /status cache, creating its store on first use."""
+    global status_cache
+    if status_cache is None:
+        table_name = get_parameter('/minecraft/status_cache_table')
+        store = DynamoStatusStore(dynamodb_client, table_name) if table_name else MemoryStatusStore()
+        status_cache = StatusCache(store)
+    return status_cache
+
+def invalidate_status(server):
+    """Drops the server's cached /status result after a change to it. A failure only leaves it stale for a few seconds."""
     try:
-        ssm_response = ssm_client.get_parameter(Name='/minecraft/rcon_password', WithDecryption=True)
-        return ssm_response['Parameter']['Value']
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ParameterNotFound':
-            return None
-        raise e
+        get_status_cache().invalidate(status_key(server))
+    except Exception as e:
+        print(f"Could not invalidate the status cache: {e}")
+
+def format_server_details(ping):
+    """Formats the player count, version, MOTD and latency from a server list ping for the status message."""
+    if ping is None or ping['players_online'] is None:
+        return ""
+    details = (
+        f"**Players Online:** `{ping['players_online']}/{ping['players_max']}`\n"
+        f"**Version:** `{ping['version']}`\n"
+        f"**MOTD:** `{ping['motd']}`\n"
+    )
+    if ping['latency_ms'] is not None:
+        details += f"**Ping Latency:** `{ping['latency_ms']} ms`\n"
+    return details
 
-def check_server_port(ip, port, timeout=3):
+def get_fleet_snapshot(server, timings=None):
     """
-    Checks if a given port is open on an IP address.
-    Returns 'ONLINE' if the port is open, 'OFFLINE' otherwise.
+    Returns the FleetSnapshot of the server's fleet registered in SSM, or None if no fleet ID is registered.
+    If the cached fleet ID points at a finished fleet, the ID is re-read from SSM once in case
+    /start_fleet replaced it from another Lambda instance.
     """
-    try:
-        with socket.create_connection((ip, port), timeout=timeout) as sock:
-            return 'ONLINE'
-    except (socket.timeout, ConnectionRefusedError):
-        return 'OFFLINE'
-    except Exception as e:
-        print(f"Error checking port: {e}")
-        return 'UNKNOWN'
+    fleet_id = get_fleet_id(server)
+    if not fleet_id:
+        return None
+    snapshot = fleet_resolver.resolve(fleet_id, timings)
+    if snapshot.fleet_finished:
+        invalidate_parameter(parameter_name(server, 'fleet_id'))
+        current_fleet_id = get_fleet_id(server)
+        if current_fleet_id and current_fleet_id != fleet_id:
+            snapshot = fleet_resolver.resolve(current_fleet_id, timings)
+    return snapshot
 
-def strip_ansi_codes(text):
+def get_server_snapshot(server, timings=None):
     """
-    Strips ANSI escape codes from a string.
+    Returns the snapshot of whatever runs the server: the standby instance in fast-resume mode,
+    otherwise the fleet. None if neither is registered.
     """
-    ansi_regex = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_regex.sub('', text)
+    if START_MODE == 'resume':
+        standby_instance_id = get_standby_instance_id(server)
+        if standby_instance_id:
+            return fleet_resolver.resolve_standby(standby_instance_id, timings)
+    return get_fleet_snapshot(server, timings)
 
-def start_fleet():
-    """Creates a new EC2 Fleet and stores its ID in SSM Parameter Store."""
+def fleet_config_file(server):
+    """The fleet configuration of a server: createFleet-<server>.json if it exists, otherwise createFleet.json."""
+    server_file = f"createFleet-{server}.json"
+    return server_file if os.path.exists(server_file) else 'createFleet.json'
+
+def tag_fleet_instances(fleet_config, server):
+    """Adds the minecraft:server tag to the instances the fleet launches, so they know which server to run."""
+    tag = {'Key': SERVER_TAG, 'Value': server}
+    specifications = fleet_config.setdefault('TagSpecifications', [])
+    for specification in specifications:
+        if specification.get('ResourceType') == 'instance':
+            specification['Tags'] = [t for t in specification.get('Tags', []) if t['Key'] != SERVER_TAG] + [tag]
+            return fleet_config
+    specifications.append({'ResourceType': 'instance', 'Tags': [tag]})
+    return fleet_config
+
+def start_fleet(server):
+    """Creates a new EC2 Fleet for the server and stores its ID in SSM Parameter Store."""
     try:
-        FLEET_ID = get_fleet_id()
-        if FLEET_ID:
-            try:
-                # Check current state of existing fleet ID
-                response = ec2_client.describe_fleets(FleetIds=[FLEET_ID])
-                print(response)
-                config = response['Fleets'][0]
-                status = config['FleetState']
-                print("Fetched fleet status")
-                print(f"Fleet status: {status}")
-
-                if status in ['submitted', 'active', 'modifying']:
-                    return f"Cannot create a new fleet: the current fleet is active! Current fleet status: {status}."
-
-            except botocore.exceptions.ClientError as e:
-                # If the error is 'InvalidFleetId.NotFound', the fleet is so old it isn't showing up in describe_fleets
-                # We can safely ignore this and move on to creating a new fleet.
-                if e.response['Error']['Code'] == 'InvalidFleetId.NotFound':
-                    print(f"Fleet {FLEET_ID} no longer exists in AWS records. Proceeding...")
-                else:
-                    # If it's a different error, re-raise it
-                    raise e
+        snapshot = get_fleet_snapshot(server)
+        if snapshot:
+            print(f"Fleet status: {snapshot.fleet_state}")
+            if snapshot.fleet_active:
+                return f"Cannot create a new fleet: the current fleet is active! Current fleet status: {snapshot.fleet_state}."
+            if not snapshot.fleet_exists:
+                # The fleet is so old it isn't showing up in describe_fleets, we can move on to creating a new fleet.
+                print(f"Fleet {snapshot.fleet_id} no longer exists in AWS records. Proceeding...")
 
         # Read the fleet configuration from a JSON file
-        print("Reading fleet configuration from createFleet.json...")
-        with open('createFleet.json', 'r') as f:
-            fleet_config = json.load(f)
-        
+        config_file = fleet_config_file(server)
+        print(f"Reading fleet configuration from {config_file}...")
+        with open(config_file, 'r') as f:
+            fleet_config = tag_fleet_instances(json.load(f), server)
+
+        ranked = []
+        try:
+            fleet_config, ranked = spot_selector.select(fleet_config)
+        except Exception as e:
+            # Ranking only refines the request; the static configuration still works
+            print(f"Spot selection failed, using {config_file} as is: {e}")
+
         print("Creating new EC2 Fleet...")
         create_fleet_response = ec2_client.create_fleet(**fleet_config)
         
@@ -128,267 +324,413 @@ def start_fleet():
         print(f"Successfully created Fleet with ID: {fleet_id}")
         
         # Save the Fleet ID to SSM Parameter Store
-        print(f"Saving Fleet ID to Parameter Store at /minecraft/fleet_id...")
+        fleet_id_parameter = parameter_name(server, 'fleet_id')
+        print(f"Saving Fleet ID to Parameter Store at {fleet_id_parameter}...")
         ssm_client.put_parameter(
-            Name='/minecraft/fleet_id',
+            Name=fleet_id_parameter,
             Value=fleet_id,
             Type='String',
             Overwrite=True
         )
+        invalidate_parameter(fleet_id_parameter)
+        fleet_resolver.invalidate()
+        invalidate_status(server)
         
+        if ranked:
+            preferred = ', '.join(f"{item['instance_type']} (${item['price']:.4f}/h)" for item in ranked[:3])
+            return f"Successfully created new fleet: `{fleet_id}`. Preferred instance types: {preferred}."
         return f"Successfully created new fleet: `{fleet_id}`."
         
     except Exception as e:
         print(f"An error occurred: {e}")
         return f"An error occurred: {e}"
 
-def stop_fleet():
-    """Deletes the existing fleet based on the ID in SSM Parameter Store."""
+def stop_fleet(server):
+    """Deletes the server's existing fleet based on the ID in SSM Parameter Store."""
     try:
-        FLEET_ID = get_fleet_id()
+        snapshot = get_fleet_snapshot(server)
 
-        if not FLEET_ID:
+        if not snapshot:
             return f"Cannot delete fleet: no fleet ID in SSM store!"
 
-        # Check current state of existing fleet ID
-        response = ec2_client.describe_fleets(FleetIds=[FLEET_ID])
-        print(response)
-        config = response['Fleets'][0]
-        status = config['FleetState']
-        print("Fetched fleet status")
-        print(f"Fleet status: {status}")
-
-        if status not in ['submitted', 'active', 'modifying']:
-            return f"Cannot delete fleet: the current fleet is not active! Current fleet status: {status}."
+        print(f"Fleet status: {snapshot.fleet_state}")
+        if not snapshot.fleet_active:
+            return f"Cannot delete fleet: the current fleet is not active! Current fleet status: {snapshot.fleet_state}."
         
         print("Deleting EC2 Fleet...")
         
         # Delete fleet and terminate instances
         ec2_client.delete_fleets(
-            FleetIds=[FLEET_ID],
+            FleetIds=[snapshot.fleet_id],
             TerminateInstances=True
         )
+        fleet_resolver.invalidate(snapshot.fleet_id)
+        invalidate_status(server)
 
-        return f"Successfully deleted fleet: `{FLEET_ID}`."
+        return f"Successfully deleted fleet: `{snapshot.fleet_id}`."
         
     except Exception as e:
         print(f"An error occurred: {e}")
         return f"An error occurred: {e}"
 
-def start_minecraft_server():
-    """Starts the Minecraft server by setting Fleet target capacity to 1."""
+def resume_standby_instance(instance_id, server):
+    """Starts the stopped (or hibernated) standby instance. Its services and world volume are already set up."""
+    snapshot = fleet_resolver.resolve_standby(instance_id)
+    print(f"Standby instance state: {snapshot.instance_state}")
+
+    if snapshot.instance_state in ['pending', 'running']:
+        return "The Minecraft server is already running or in the process of starting."
+    if snapshot.instance_state == 'stopping':
+        return "The server is still shutting down. Try `/start` again in a minute."
+    if snapshot.instance_state != 'stopped':
+        return f"Cannot resume the standby instance: it is `{snapshot.instance_state}`. Register a new one or switch START_MODE back to `fleet`."
+
+    ec2_client.start_instances(InstanceIds=[instance_id])
+    fleet_resolver.invalidate(instance_id)
+    invalidate_status(server)
+    if snapshot.hibernation:
+        return "Server resume initiated! The hibernated server should be back within a minute."
+    return "Server resume initiated! The stopped server should be back in a minute or two."
+
+def start_minecraft_server(server):
+    """
+    Starts a Minecraft server. In fast-resume mode the standby instance is started,
+    otherwise the Fleet target capacity is set to 1.
+    """
     try:
-        # Get fleet ID
-        FLEET_ID = get_fleet_id()
+        if START_MODE == 'resume':
+            standby_instance_id = get_standby_instance_id(server)
+            if standby_instance_id:
+                return resume_standby_instance(standby_instance_id, server)
+            print("No standby instance registered. Falling back to the fleet.")
+
+        snapshot = get_fleet_snapshot(server)
 
-        if not FLEET_ID:
+        if not snapshot:
             return "Cannot start Minecraft server: no fleet registered in SSM! Run /start_fleet to start a fleet"
 
-        # Retrieve data and parse
-        response = ec2_client.describe_fleets(FleetIds=[FLEET_ID])
-        print(response)
-        config = response['Fleets'][0]
-        status = config['FleetState']
-        print("Fetched fleet status")
-        print(f"Fleet status: {status}")
-        
-        if status in ['cancelled', 'cancelled_running', 'cancelled_terminating', 'deleted', 'deleted_terminating']:
+        print(f"Fleet status: {snapshot.fleet_state}")
+        if snapshot.fleet_finished:
             return "Cannot start the server: the Fleet request has been cancelled. Create a new fleet with /start_fleet"
 
-        if config['TargetCapacitySpecification']['TotalTargetCapacity'] > 0:
+        if snapshot.target_capacity > 0:
             return "The Minecraft server is already running or in the process of starting."
             
         ec2_client.modify_fleet(
-            FleetId=FLEET_ID,
+            FleetId=snapshot.fleet_id,
             TargetCapacitySpecification={
                 'TotalTargetCapacity': 1
             }
             #ExcessCapacityTerminationPolicy='noTermination' # Important to prevent immediate shutdown
         )
+        fleet_resolver.invalidate(snapshot.fleet_id)
+        invalidate_status(server)
         return "Server startup initiated! Please allow a few minutes for the instance to boot."
     except Exception as e:
         print(f"Error starting server: {e}")
         return "An error occurred while trying to start the server. Check the Lambda logs."
 
-def status_fleet():
-    """Retrieves and returns the status of the EC2 fleet, instances, and Elastic IP."""
-    try:
-        # Check if a fleet ID exists in SSM Parameter Store
-        fleet_id = get_fleet_id()
-        if not fleet_id:
-            return "The Minecraft server is currently offline. No active fleet ID found."
-        
-        eip_id = get_eip_id()
-        eip_response = ec2_client.describe_addresses(AllocationIds=[eip_id])
-        eip_info = eip_response['Addresses'][0]
-        eip_public_ip = eip_info['PublicIp']
-        
-        fleet_response = ec2_client.describe_fleets(FleetIds=[fleet_id])
-        fleet_info = fleet_response['Fleets'][0]
-        
-        fleet_state = fleet_info['FleetState']
-        
-        fleet_instance_response = ec2_client.describe_fleet_instances(FleetId=fleet_id)
-
-        instance_id = "N/A"
-        instance_public_ip = "N/A"
-        instance_state = "N/A"
-        instance_type = "N/A"
-        instance_launch_time = "N/A"
-        server_status = "N/A"
-        instance_lifecycle = "N/A"
-        
-        # Get instance ID and IP if the fleet has instances
-        if 'ActiveInstances' in fleet_instance_response and len(fleet_instance_response['ActiveInstances']) > 0:
-            
-            instance_id = fleet_instance_response['ActiveInstances'][0]['InstanceId']
-            
-            # Fetch instance details to get the public IP and launch time
-            instance_response = ec2_client.describe_instances(InstanceIds=[instance_id])
-            instance_details = instance_response['Reservations'][0]['Instances'][0]
-            instance_state = instance_details['State']['Name']
-            instance_public_ip = instance_details.get('PublicIpAddress', 'N/A')
-            instance_launch_time = instance_details.get('LaunchTime', 'N/A')
-            instance_type = instance_details.get('InstanceType', 'N/A')
-            instance_lifecycle = instance_details.get('InstanceLifecycle', 'N/A')
-
-            # Check Minecraft server port only if instance is running and has a public IP
-            if instance_state == 'running' and instance_public_ip != 'N/A':
-                server_status = check_server_port(instance_public_ip, server_port)
-            
-        status_message = (
-            "**Minecraft Server Status:**\n\n"
-            f"**Fleet ID:** `{fleet_id}`\n"
-            f"**Fleet State:** `{fleet_state}`\n"
-            f"**Instance ID:** `{instance_id}`\n"
-            f"**Instance State:** `{instance_state}`\n"
-            f"**Instance Lifecycle:** `{instance_lifecycle}`\n"
-            f"**Instance Type:** `{instance_type}`\n"
-            f"**Server Status:** `{server_status}`\n"
-            f"**Launch Time:** `{instance_launch_time}`\n"
-            f"**Instance Public IP:** `{instance_public_ip}`\n"
-            f"**Assigned Elastic IP:** `{eip_public_ip}`"
+def server_label(server):
+    """Names the server in messages, only when the bot manages more than one."""
+    return f" ({server})" if len(SERVERS) > 1 else ""
+
+def build_status_message(server):
+    """Retrieves the status of the server's EC2 fleet, instances, and Elastic IP and formats the /status message."""
+    # The Elastic IP lookup is independent of the fleet, so it runs while the fleet state is resolved
+    timings = {}
+    started = time.perf_counter()
+    eip_future = aws_executor.submit(timed_call, timings, 'describe_addresses', ec2_client.describe_addresses, AllocationIds=[get_eip_id(server)])
+
+    # Check if a fleet ID (or standby instance) exists in SSM Parameter Store
+    snapshot = get_server_snapshot(server, timings)
+    if not snapshot:
+        return "The Minecraft server is currently offline. No active fleet ID found."
+
+    # Ping the Minecraft server only if instance is running and has a public IP
+    ping = None
+    if snapshot.instance_running:
+        ping = timed_call(timings, 'ping_server', ping_server, snapshot.public_ip, server_port, SERVER_PING_TIMEOUT)
+
+    eip_public_ip = eip_future.result()['Addresses'][0]['PublicIp']
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"Status call timings (ms): {json.dumps(timings)}")
+
+    fleet_id = snapshot.fleet_id or "N/A (standby instance)"
+    fleet_state = snapshot.fleet_state or ("N/A" if snapshot.standby else "not found")
+    instance_id = snapshot.instance_id or "N/A"
+    instance_public_ip = snapshot.public_ip or "N/A"
+    instance_state = snapshot.instance_state or "N/A"
+    instance_type = snapshot.instance_type or "N/A"
+    instance_launch_time = snapshot.launch_time or "N/A"
+    server_status = ping['status'] if ping else "N/A"
+    instance_lifecycle = snapshot.lifecycle or "N/A"
+    # Tagged at boot by /opt/minecraft/jvm_profile.py
+    jvm_profile = snapshot.tags.get(JVM_PROFILE_TAG, "N/A")
+
+    status_message = (
+        f"**Minecraft Server Status{server_label(server)}:**\n\n"
+        f"**Fleet ID:** `{fleet_id}`\n"
+        f"**Fleet State:** `{fleet_state}`\n"
+        f"**Instance ID:** `{instance_id}`\n"
+        f"**Instance State:** `{instance_state}`\n"
+        f"**Instance Lifecycle:** `{instance_lifecycle}`\n"
+        f"**Instance Type:** `{instance_type}`\n"
+        f"**JVM Profile:** `{jvm_profile}`\n"
+        f"**Server Status:** `{server_status}`\n"
+        f"{format_server_details(ping)}"
+        f"**Launch Time:** `{instance_launch_time}`\n"
+        f"**Instance Public IP:** `{instance_public_ip}`\n"
+        f"**Assigned Elastic IP:** `{eip_public_ip}`"
+    )
+    
+    # Handle a stopped or hibernated standby instance
+    if snapshot.standby and instance_state in ['stopped', 'stopping', 'pending']:
+        status_message += f"\n\n**Server is {instance_state}.** Run `/start` to resume it, or wait a moment and run `/status` again."
+    # Handle Fleets that are shutting down or gone
+    elif snapshot.fleet_finished:
+        status_message += f"\n\n**Fleet is shutting down or unavailable!** Please run `/start_fleet` to create a new one."
+    # Handle cases where the Instance is running, but the Minecraft Server itself is failing
+    elif instance_state == 'running' and server_status == "OFFLINE":
+        status_message += (
+            f"\n\n**Warning:** The EC2 instance is running, but the **Minecraft server is OFFLINE**.\n"
+            f"Something went wrong during startup. Check logs or run `/start` to try and kickstart the service."
         )
-        
-        # Handle Fleets that are shutting down or gone
-        if fleet_state in ["deleted_terminating", "deleted", "failed"]:
-            status_message += f"\n\n**Fleet is shutting down or unavailable!** Please run `/start_fleet` to create a new one."
-        # Handle cases where the Instance is running, but the Minecraft Server itself is failing
-        elif instance_state == 'running' and server_status == "OFFLINE":
-            status_message += (
-                f"\n\n**Warning:** The EC2 instance is running, but the **Minecraft server is OFFLINE**.\n"
-                f"Something went wrong during startup. Check logs or run `/start` to try and kickstart the service."
-            )
-        # Everything is actually ready
-        elif instance_state == 'running' and server_status == "ONLINE" and eip_public_ip:
-            status_message += f"\n\n**Server ready!** Connect with: `{eip_public_ip}`"
-        # Handle transition states
-        elif fleet_state == "active" and instance_state != 'running':
-            status_message += f"\n\n**Fleet is active but no instance is running yet.** Run `/start` to start the server."
-        elif fleet_state in ["modifying", "submitted"]:
-            status_message += f"\n\n**Fleet loading!** Wait a moment and run `/status` again!"
-        else:
-            status_message += f"\n\n**Status unclear.** Run `/start_fleet` or contact the admin."
-        
-        print(status_message)
-        return status_message
+    # Everything is actually ready
+    elif instance_state == 'running' and server_status == "ONLINE" and eip_public_ip:
+        status_message += f"\n\n**Server ready!** Connect with: `{eip_public_ip}`"
+    # Handle transition states
+    elif fleet_state == "active" and instance_state != 'running':
+        status_message += f"\n\n**Fleet is active but no instance is running yet.** Run `/start` to start the server."
+    elif fleet_state in ["modifying", "submitted"]:
+        status_message += f"\n\n**Fleet loading!** Wait a moment and run `/status` again!"
+    else:
+        status_message += f"\n\n**Status unclear.** Run `/start_fleet` or contact the admin."
+    
+    print(status_message)
+    return status_message
 
+def status_fleet(server):
+    """Returns the server's /status message, from the shared status cache while it is younger than STATUS_CACHE_TTL."""
+    try:
+        if STATUS_CACHE_TTL <= 0:
+            return build_status_message(server)
+        message, age, source = get_status_cache().get(status_key(server), lambda: build_status_message(server), STATUS_CACHE_TTL)
+        print(f"Status cache: {source}, {age:.1f}s old")
+        if source in ['hit', 'coalesced']:
+            metrics.add('StatusCacheHit')
+        if age >= 1:
+            message += f"\n\n_Status as of {age:.0f} seconds ago._"
+        return message
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return f"An error occurred while getting the server status: {e}"
+
+def server_summary(server, snapshot, ping, eip_public_ip):
+    """One line of the /status all overview."""
+    if not snapshot:
+        return f"**{server}:** `offline` (no fleet)"
+    if snapshot.fleet_finished:
+        return f"**{server}:** `fleet {snapshot.fleet_state or 'gone'}` (run `/start_fleet`)"
+    if not snapshot.instance_id:
+        return f"**{server}:** `{'stopped' if snapshot.standby or snapshot.target_capacity == 0 else 'starting'}`"
+    line = f"**{server}:** `{snapshot.instance_state}`"
+    if ping:
+        line += f", server `{ping['status']}`"
+        if ping['players_online'] is not None:
+            line += f", {ping['players_online']}/{ping['players_max']} players"
+    if snapshot.instance_type:
+        line += f", `{snapshot.instance_type}`"
+    if ping and ping['status'] == 'ONLINE' and eip_public_ip:
+        line += f", connect with `{eip_public_ip}`"
+    return line
+
+def build_status_all_message():
+    """
+    Formats a one-line status of every server. The fleets, instances and Elastic IPs of all servers are
+    described together, and the running servers are pinged in parallel, so this takes about as long as
+    the /status of a single server.
+    """
+    timings = {}
+    started = time.perf_counter()
+    eip_ids = {server: get_eip_id(server) for server in SERVERS}
+    allocation_ids = sorted({eip_id for eip_id in eip_ids.values() if eip_id})
+    eip_future = None
+    if allocation_ids:
+        eip_future = aws_executor.submit(timed_call, timings, 'describe_addresses', ec2_client.describe_addresses,
+                                         AllocationIds=allocation_ids)
+
+    standby_ids = get_standby_instance_ids()
+    fleet_ids = {server: get_fleet_id(server) for server in SERVERS if server not in standby_ids and get_fleet_id(server)}
+    snapshots = fleet_resolver.resolve_many(sorted(set(fleet_ids.values())), sorted(set(standby_ids.values())), timings)
+    server_snapshots = {server: snapshots[standby_ids.get(server) or fleet_ids[server]]
+                        for server in SERVERS if server in standby_ids or server in fleet_ids}
+
+    ping_futures = {server: ping_executor.submit(ping_server, snapshot.public_ip, server_port, SERVER_PING_TIMEOUT)
+                    for server, snapshot in server_snapshots.items() if snapshot.instance_running}
+    pings = {server: future.result() for server, future in ping_futures.items()}
+
+    addresses = {}
+    if eip_future:
+        addresses = {address['AllocationId']: address.get('PublicIp') for address in eip_future.result()['Addresses']}
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"Status all call timings (ms): {json.dumps(timings)}")
+
+    lines = [server_summary(server, server_snapshots.get(server), pings.get(server), addresses.get(eip_ids[server]))
+             for server in SERVERS]
+    status_message = "**Minecraft Servers:**\n\n" + "\n".join(lines) + "\n\nRun `/status server:<name>` for details."
+    print(status_message)
+    return status_message
+
+def status_all():
+    """Returns the /status all overview."""
+    try:
+        return build_status_all_message()
     except Exception as e:
         print(f"An error occurred: {e}")
         return f"An error occurred while getting the server status: {e}"
 
-def run_command(mc_command):
+def wait_for_command(command_id, instance_id, timeout=None):
+    """
+    Polls an SSM command with a short exponential backoff until it finishes or timeout (default SSM_COMMAND_TIMEOUT) passes.
+    Returns (get_command_invocation response or None on timeout, number of polls).
+    """
+    from botocore.exceptions import ClientError
+
+    deadline = time.time() + (timeout or SSM_COMMAND_TIMEOUT)
+    delay = 0.1
+    polls = 0
+    while True:
+        time.sleep(delay)
+        polls += 1
+        try:
+            output_response = ssm_client.get_command_invocation(
+                CommandId=command_id,
+                InstanceId=instance_id
+            )
+            if output_response['Status'] not in ['Pending', 'InProgress', 'Delayed']:
+                return output_response, polls
+        except ClientError as e:
+            # The invocation can take a moment to become visible right after send_command
+            if e.response['Error']['Code'] != 'InvocationDoesNotExist':
+                raise e
+        if time.time() + delay >= deadline:
+            return None, polls
+        delay = min(delay * 2, 1.0)
+
+def run_instance_command(instance_id, commands, timeout=None):
+    """
+    Runs shell commands on the instance through SSM Run Command and waits for them to finish.
+    Returns the get_command_invocation response, or None if they are still running after the timeout.
+    """
+    response = ssm_client.send_command(
+        InstanceIds=[instance_id],
+        DocumentName='AWS-RunShellScript',
+        Parameters={'commands': commands},
+        CloudWatchOutputConfig={
+            'CloudWatchOutputEnabled': True,
+            'CloudWatchLogGroupName': COMMAND_LOG_GROUP
+        }
+    )
+
+    command_id = response['Command']['CommandId']
+    print(f"Command ID: {command_id}")
+
+    output_response, polls = wait_for_command(command_id, instance_id, timeout)
+    metrics.add('SsmPolls', polls)
+    print(f"Polled response {polls} time(s)")
+    return output_response
+
+def command_output_chunks(output_response):
+    """
+    Yields the stdout of a finished SSM command. When get_command_invocation cut it off, the full output is
+    read from the command's CloudWatch log stream, one page of events at a time, as far as it is consumed.
+    """
+    stdout = output_response['StandardOutputContent']
+    if len(stdout) < SSM_OUTPUT_LIMIT:
+        yield stdout
+        return
+
+    from botocore.exceptions import ClientError
+
+    log_stream = f"{output_response['CommandId']}/{output_response['InstanceId']}/aws-runShellScript/stdout"
+    print(f"Output is truncated, reading it from {COMMAND_LOG_GROUP} {log_stream}")
+    read = 0
+    try:
+        for chunk in read_cloudwatch_output(logs_client, COMMAND_LOG_GROUP, log_stream):
+            read += len(chunk)
+            yield chunk
+    except ClientError as e:
+        # The log stream can lag behind the command by a moment; what SSM returned is still worth showing
+        print(f"Could not read the output from CloudWatch: {e}")
+        if read == 0:
+            yield stdout
+    if read == 0:
+        print("No output in CloudWatch yet; using the truncated output")
+
+def run_command(mc_command, server):
     """
     Runs a Minecraft server command on the active EC2 instance.
-    The command is executed via SSM Run Command.
+    The command is executed via SSM Run Command, or over RCON directly when RCON_TRANSPORT is 'direct'.
+    Returns the message, or a list of messages (pages) for the output of the command.
     """
+    from botocore.exceptions import ClientError
+
     try:
-        # Get fleet ID
-        fleet_id = get_fleet_id()
+        snapshot = get_server_snapshot(server)
 
-        if not fleet_id:
+        if not snapshot:
             return "Server is offline. No fleet ID found."
-        print("Fleed ID found!")
 
-        # Get instance ID from the fleet
-        fleet_instance_response = ec2_client.describe_fleet_instances(FleetId=fleet_id)
-        if 'ActiveInstances' not in fleet_instance_response or len(fleet_instance_response['ActiveInstances']) == 0:
+        if not snapshot.instance_id:
             return "No instances found in the fleet. Server might be starting or has stopped. Run `/status` for more information!"
-        print("Fleet has active instance!")
 
-        # Get instance ID and fetch IP and state
-        # Fetch instance details to get the public IP and launch time
-        instance_id = fleet_instance_response['ActiveInstances'][0]['InstanceId']
-        print(f"Instance ID: {instance_id}")
-        instance_response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance_details = instance_response['Reservations'][0]['Instances'][0]
-        instance_public_ip = instance_details.get('PublicIpAddress', 'N/A')
-        instance_state = instance_details['State']['Name']
+        instance_id = snapshot.instance_id
+        instance_public_ip = snapshot.public_ip
+        print(f"Instance ID: {instance_id}, Instance IP: {instance_public_ip}, Instance state: {snapshot.instance_state}")
 
-        print(f"Instance IP: {instance_public_ip}, Instance state: {instance_state}")
+        if snapshot.instance_state != 'running':
+            return "Failed to run command: Instance not running."
 
-        if instance_public_ip == 'N/A':
+        if not instance_public_ip:
             return "Failed to get instance public IP!"
-        
-        if instance_state != 'running':
-            return "Failed to run command: Instance not running."
             
-        # Check Minecraft server port only if instance is running and has a public IP
-        server_status = check_server_port(instance_public_ip, server_port)
+        # Check the Minecraft server only if instance is running and has a public IP
+        server_status = ping_server(instance_public_ip, server_port, SERVER_PING_TIMEOUT)['status']
 
         print(f"Server status: {server_status}")
 
         if server_status != 'ONLINE':
             return "Failed to run command: Minecraft server not available!"
 
-        # Get RCON password
-        rcon_password = get_rcon_password()
-
-        print(f"RCON password: {rcon_password}")
+        if RCON_TRANSPORT == 'direct':
+            print(f"Sending command over RCON to {instance_public_ip}: {mc_command}")
+            with RconClient(instance_public_ip, RCON_PORT, get_rcon_password(server), timeout=5) as rcon:
+                output = rcon.command(mc_command)
+            return paginate([output], f"Command `{mc_command}` executed. Output:", MAX_OUTPUT_PAGES)
 
-        # Command to be executed on the instance
-        ssm_command = [f"/usr/local/bin/mcrcon -H 127.0.0.1 -p \"{rcon_password}\" \"{mc_command}\""]
+        # The RCON client on the instance reads the password from its own environment file,
+        # so it never appears in the SSM command history or these logs
+        ssm_command = [f"python3 /opt/minecraft/rcon.py {shlex.quote(mc_command)}"]
 
         # Send the command via SSM
         print(f"Sending command to instance {instance_id}: {mc_command}")
-        response = ssm_client.send_command(
-            InstanceIds=[instance_id],
-            DocumentName='AWS-RunShellScript',
-            Parameters={'commands': ssm_command},
-            CloudWatchOutputConfig={
-                'CloudWatchOutputEnabled': True
-            }
-        )
-        
-        command_id = response['Command']['CommandId']
-        print(f"Command ID: {command_id}")
-
-        # Poll for command status to avoid long wait times
-        time.sleep(0.5)
-        status = "Pending"
-        retries = 0
-        max_retries = 4
-        while status in ['Pending', 'InProgress'] and retries < max_retries:
-            output_response = ssm_client.get_command_invocation(
-                CommandId=command_id,
-                InstanceId=instance_id
-            )
-            status = output_response['Status']
-            if status in ['Pending', 'InProgress']:
-                time.sleep(0.5)
-                retries += 1
-        print(f"Polled response {retries} time(s)")
-        if status in ['Pending', 'InProgress']:
+        output_response = run_instance_command(instance_id, ssm_command)
+        if output_response is None:
             return "Command timed out. Please check the SSM logs for more details."
 
         # Retrieve command status and output
         status = output_response['Status']
-        stdout = output_response['StandardOutputContent']
-        stripped_stdout = strip_ansi_codes(stdout)
-        print(f"Command output: {stripped_stdout}")
-        
-        return f"Command `{mc_command}` executed. Status: `{status}`\nOutput:```{stripped_stdout}```"
+        saved_to = f"CloudWatch log group `{COMMAND_LOG_GROUP}`, command `{output_response.get('CommandId', '')}`"
+        pages = paginate(command_output_chunks(output_response), f"Command `{mc_command}` executed. Status: `{status}`",
+                         MAX_OUTPUT_PAGES, saved_to=saved_to)
+        print(f"Command output: {len(output_response['StandardOutputContent'])} characters from SSM, {len(pages)} page(s)")
+        metrics.add('OutputPages', len(pages))
+        return pages
 
+    except RconError as e:
+        print(f"RCON command failed: {e}")
+        return f"Failed to run command over RCON: {e}"
     except ClientError as e:
         print(f"SSM command failed: {e}")
         return f"Failed to run command. Check IAM permissions and SSM Agent status. Error: {e}"
@@ -396,39 +738,269 @@ def run_command(mc_command):
         print(f"An unexpected error occurred: {e}")
         return f"An unexpected error occurred: {e}"
 
+def backup_world(server):
+    """
+    Backs up the world to S3 by running /opt/minecraft/world_backup.py on the instance. Only blocks that
+    changed since the last backup are uploaded, so this usually takes seconds.
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        snapshot = get_server_snapshot(server)
+        if not snapshot or snapshot.instance_state != 'running':
+            return "The server is not running. Its world was backed up when it last shut down."
+
+        print(f"Starting backup on instance {snapshot.instance_id}")
+        output_response = run_instance_command(snapshot.instance_id, ["python3 /opt/minecraft/world_backup.py backup"],
+                                               BACKUP_COMMAND_TIMEOUT)
+        if output_response is None:
+            return "Backup started and is still running on the server. Check the SSM logs for the result."
+
+        # The last line of the output is the human readable summary
+        output = output_response['StandardOutputContent'] or output_response.get('StandardErrorContent', '')
+        output_lines = output.strip().splitlines()
+        summary = output_lines[-1] if output_lines else "no output"
+        if output_response['Status'] != 'Success':
+            return f"Backup failed. Status: `{output_response['Status']}`\n```{summary}```"
+        return f"Backup complete.\n```{summary}```"
+
+    except ClientError as e:
+        print(f"SSM command failed: {e}")
+        return f"Failed to start the backup. Check IAM permissions and SSM Agent status. Error: {e}"
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return f"An unexpected error occurred: {e}"
+
+def server_performance(minutes, server):
+    """Reads the instance's tick performance samples with one SSM command and summarizes the last minutes."""
+    from botocore.exceptions import ClientError
+
+    try:
+        snapshot = get_server_snapshot(server)
+        if not snapshot or snapshot.instance_state != 'running':
+            return "The server is not running."
+
+        output_response = run_instance_command(snapshot.instance_id, [f"cat {PERF_FILE}"])
+        if output_response is None:
+            return "Reading the performance samples timed out. Please try again."
+        if output_response['Status'] != 'Success':
+            return "No performance samples yet. The sampler starts with the server; try again in a minute."
+
+        return format_perf_report(json.loads(output_response['StandardOutputContent']), minutes)
+
+    except ClientError as e:
+        print(f"SSM command failed: {e}")
+        return f"Failed to read the performance samples. Check IAM permissions and SSM Agent status. Error: {e}"
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return f"An unexpected error occurred: {e}"
+
 def help():
     """Returns a formatted list of all available commands."""
     return (
         "**Minecraft Bot Commands**\n\n"
+        "All commands take an optional `server` option to pick one of the managed servers.\n\n"
         "**`/start`**: Starts the Minecraft server instance in the existing fleet.\n"
         "**`/start_fleet`**: Creates a new EC2 Fleet and starts a new server.\n"
         "**`/stop_fleet`**: Stops and deletes the entire EC2 Fleet.\n"
-        "**`/status`**: Shows the current status of the fleet and server.\n"
+        "**`/status`**: Shows the current status of the fleet and server (`server:all` for an overview of every server).\n"
         "**`/run_command`**: Runs a Minecraft server command (e.g., `say Hello World!`).\n"
+        "**`/backup`**: Backs up the world to S3 (only changed blocks are uploaded).\n"
+        "**`/perf`**: Shows recent tick times (MSPT/TPS), players, heap and GC of the server.\n"
         "**`/help`**: Shows this help message."
     )
 
 
+def option_value(command_options, name, default=None):
+    """Returns the value of a slash command option, or default if it was not given."""
+    return next((option['value'] for option in command_options if option['name'] == name), default)
+
+
+def for_server(handler):
+    """
+    Wraps handler(options, server) as a command handler. The server comes from the optional 'server'
+    option and defaults to the first of SERVERS.
+    """
+    def run(command_options):
+        server = option_value(command_options, 'server', SERVERS[0])
+        if server not in SERVERS:
+            return f"Unknown server `{server}`. Servers: {', '.join(f'`{name}`' for name in SERVERS)}."
+        return handler(command_options, server)
+    return run
+
+
+def perf_command(command_options, server):
+    """Handler for /perf. The optional 'minutes' option sets the window (1-60, default 15)."""
+    minutes = option_value(command_options, 'minutes', 15)
+    return server_performance(max(1, min(60, int(minutes))), server)
+
+
+def run_minecraft_command(command_options, server):
+    """Handler for /command. The 'command' option is the Minecraft command to run."""
+    mc_command = option_value(command_options, 'command', "")
+    if mc_command == "":
+        return "Missing Minecraft command! Usage: `/command [minecraft_command]`"
+    return run_command(mc_command, server)
+
+
+def status_command(command_options):
+    """Handler for /status. 'server:all' shows an overview of every server."""
+    if option_value(command_options, 'server') == 'all':
+        return status_all()
+    return for_server(lambda options, server: status_fleet(server))(command_options)
+
+
+# Slash command registry: name -> {'handler': handler(options), 'restricted': bool, 'slow': bool}.
+# Restricted commands can only be run by AUTHORIZED_USERS. Slow commands are acknowledged with a
+# deferred response and finished in the background (see DEFERRED_MODE).
+COMMANDS = {}
+
+def register_command(name, handler, restricted=False, slow=False):
+    """
+    Adds a slash command to the router. handler receives the interaction options and returns the message
+    content, or a list of messages that are sent as the response and its follow-ups.
+    """
+    COMMANDS[name] = {'handler': handler, 'restricted': restricted, 'slow': slow}
+
+register_command('start', for_server(lambda options, server: start_minecraft_server(server)), slow=True)
+register_command('start_fleet', for_server(lambda options, server: start_fleet(server)), restricted=True, slow=True)
+register_command('stop_fleet', for_server(lambda options, server: stop_fleet(server)), restricted=True, slow=True)
+register_command('status', status_command, slow=True)
+register_command('command', for_server(run_minecraft_command), restricted=True, slow=True)
+register_command('backup', for_server(lambda options, server: backup_world(server)), restricted=True, slow=True)
+register_command('perf', for_server(perf_command), slow=True)
+register_command('help', lambda options: help())
+
+def dispatch_command(command, command_options):
+    """Runs a slash command and returns the message content to send back to Discord (a list of pages for long output)."""
+    fleet_resolver.begin_invocation()
+    metrics.set_command(command)
+
+    entry = COMMANDS.get(command)
+    if entry is None:
+        return "Unknown command. Use `/help` for list of available commands."
+    return entry['handler'](command_options)
+
+def webhook_request(method, url, content):
+    """Sends a message to an interaction webhook. A rate limited request is retried once after its Retry-After."""
+    import urllib.error
+    import urllib.request
+
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({'content': content}).encode(),
+        headers={'Content-Type': 'application/json', 'User-Agent': 'DiscordBot (AWSMinecraft, 1.0)'},
+        method=method
+    )
+    for attempt in range(2):
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            if e.code != 429 or attempt:
+                raise e
+            time.sleep(float(e.headers.get('Retry-After', '1')))
+
+def edit_original_response(application_id, interaction_token, content):
+    """Replaces the deferred "thinking..." message with the final content through the interaction webhook."""
+    return webhook_request('PATCH', f"{DISCORD_API_BASE}/webhooks/{application_id}/{interaction_token}/messages/@original", content)
+
+def send_followup_message(application_id, interaction_token, content):
+    """Posts another message in reply to the interaction, after the original response."""
+    return webhook_request('POST', f"{DISCORD_API_BASE}/webhooks/{application_id}/{interaction_token}", content)
+
+def first_page(message_content):
+    """
+    The message of a command result, which is either a message or a list of pages. An inline response
+    can only carry one message, so only the first page is kept, with a note about the rest.
+    """
+    if isinstance(message_content, str):
+        return message_content
+    if len(message_content) > 1:
+        return message_content[0] + f"\n_{len(message_content) - 1} more page(s) not shown._"
+    return message_content[0]
+
+def run_deferred_interaction(job):
+    """Worker side of a deferred command: runs the command and edits the original message with the result."""
+    started = time.time()
+    try:
+        message_content = dispatch_command(job['command'], job['options'])
+    except Exception as e:
+        print(f"Deferred command failed: {e}")
+        message_content = f"An unexpected error occurred: {e}"
+    print(f"Deferred command '{job['command']}' finished in {time.time() - started:.3f}s")
+
+    pages = [message_content] if isinstance(message_content, str) else message_content
+    try:
+        edit_original_response(job['application_id'], job['token'], pages[0])
+    except Exception as e:
+        print(f"Failed to edit original interaction response: {e}")
+        return
+    # Further pages of a long output follow as separate messages, in order
+    for page in pages[1:]:
+        try:
+            send_followup_message(job['application_id'], job['token'], page)
+        except Exception as e:
+            print(f"Failed to send a follow-up message: {e}")
+            return
+
+def defer_interaction(job, context):
+    """Hands a slow command to the background worker selected by DEFERRED_MODE."""
+    if DEFERRED_MODE == 'thread':
+        threading.Thread(target=run_deferred_interaction, args=(job,)).start()
+        return
+
+    function_name = getattr(context, 'function_name', None) or os.environ['AWS_LAMBDA_FUNCTION_NAME']
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'deferred_interaction': job}).encode()
+    )
+
+def interaction_response(response_type, content=None):
+    """Builds the API Gateway response carrying a Discord interaction response."""
+    body = {'type': response_type}
+    if content is not None:
+        body['data'] = {'content': content}
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(body)
+    }
+
 def lambda_handler(event, context):
     """Main handler for the Lambda function."""
+    # Asynchronous invocation from defer_interaction: finish the command and edit the message
+    if 'deferred_interaction' in event:
+        metrics.begin('worker')
+        try:
+            run_deferred_interaction(event['deferred_interaction'])
+        finally:
+            metrics.end()
+        return {'statusCode': 200}
+
+    metrics.begin('inline')
+    try:
+        return handle_interaction(event, context)
+    finally:
+        metrics.end()
+
+def handle_interaction(event, context):
+    """Verifies a Discord interaction and answers it, running or deferring the command."""
     try:
         # Discord security handshake
         signature = event['headers']['x-signature-ed25519']
         timestamp = event['headers']['x-signature-timestamp']
         body = event['body']
 
-        verify_key.verify(f'{timestamp}{body}'.encode(), bytes.fromhex(signature))
+        get_verify_key().verify(f'{timestamp}{body}'.encode(), bytes.fromhex(signature))
         print("Request verified!")
         
         body_json = json.loads(body)
 
         # Handle Discord's PING request
         if body_json['type'] == 1:
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'type': 1})
-            }
+            return interaction_response(1)
         
         # Handle slash command
         if body_json['type'] == 2:
@@ -437,49 +1009,25 @@ def lambda_handler(event, context):
             # The structure for a command with arguments is slightly different
             command_options = body_json['data'].get('options', [])
 
-            message_content = "Unknown command. Use `/help` for list of available commands."
+            entry = COMMANDS.get(command, {})
+            metrics.set_command(command)
 
-            # Commands restricted only to me
-            restricted_commands = ['start_fleet', 'stop_fleet', 'command']
+            if entry.get('restricted') and not is_authorized(user_id):
+                return interaction_response(4, "You are not authorized to run this command.")
 
-            
-            # Parse command
-            if command in restricted_commands and not is_authorized(user_id):
-                message_content = "You are not authorized to run this command."
-            else:
-                if command == 'start':
-                    message_content = start_minecraft_server()
-
-                elif command == 'start_fleet':
-                    message_content = start_fleet()
-
-                elif command == 'stop_fleet':
-                    message_content = stop_fleet()
-
-                elif command == 'status':
-                    message_content = status_fleet()
-
-                elif command == 'command':
-                    # Pass the command option value to the function
-                    mc_command = command_options[0]['value'] if command_options else ""
-                    if mc_command == "":
-                        message_content = "Missing Minecraft command! Usage: `/command [minecraft_command]`"
-                    else:    
-                        message_content = run_command(mc_command)
-                    
-                elif command == 'help':
-                    message_content = help()
-            
-            return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json'},
-                    'body': json.dumps({
-                        'type': 4,
-                        'data': {
-                            'content': message_content,
-                        }
-                    })
-                }
+            # Acknowledge slow commands immediately so Discord's 3 second deadline is never missed
+            if DEFERRED_MODE != 'off' and entry.get('slow'):
+                metrics.set_phase('ack')
+                defer_interaction({
+                    'command': command,
+                    'options': command_options,
+                    'application_id': body_json['application_id'],
+                    'token': body_json['token']
+                }, context)
+                print(f"Deferred command '{command}'")
+                return interaction_response(5)
+
+            return interaction_response(4, first_page(dispatch_command(command, command_options)))
 
     except (BadSignatureError, KeyError) as e:
         print(f"Signature verification failed or header missing: {e}")
@@ -0,0 +1,134 @@
+"""
+Per-command latency metrics in CloudWatch Embedded Metric Format (EMF).
+
+Each invocation that handles a slash command prints one EMF line with its end-to-end
+latency, cold/warm start, AWS call count and SSM poll count, plus one line per AWS
+operation with the duration of every call. CloudWatch Logs turns these lines into
+metrics without any extra API calls, so p50/p99 dashboards can be built per command.
+
+AWS calls are timed by hooking the boto3 clients passed to instrument_client, so the
+command code itself does not need to change.
+"""
+import json
+import os
+import threading
+import time
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MinecraftDiscordBot')
+
+_lock = threading.Lock()
+_cold_start = True
+_current = None
+
+
+class InvocationMetrics:
+    """Metrics collected while one invocation handles a command."""
+
+    def __init__(self, phase, cold_start):
+        self.phase = phase
+        self.cold_start = cold_start
+        self.command = None
+        self.started = time.perf_counter()
+        self.aws_calls = {}
+        self.counts = {}
+
+    def record_aws_call(self, operation, duration_ms):
+        with _lock:
+            self.aws_calls.setdefault(operation, []).append(round(duration_ms, 1))
+
+    def add(self, name, value=1):
+        with _lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def emf_lines(self):
+        """Builds the EMF log lines for this invocation."""
+        timestamp = int(time.time() * 1000)
+        latency_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        metrics = [
+            {'Name': 'Latency', 'Unit': 'Milliseconds'},
+            {'Name': 'ColdStart', 'Unit': 'Count'},
+            {'Name': 'AwsCallCount', 'Unit': 'Count'}
+        ] + [{'Name': name, 'Unit': 'Count'} for name in self.counts]
+        lines = [{
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Command', 'Phase']],
+                    'Metrics': metrics
+                }]
+            },
+            'Command': self.command,
+            'Phase': self.phase,
+            'Latency': latency_ms,
+            'ColdStart': int(self.cold_start),
+            'AwsCallCount': sum(len(durations) for durations in self.aws_calls.values()),
+            **self.counts
+        }]
+        for operation, durations in self.aws_calls.items():
+            lines.append({
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': NAMESPACE,
+                        'Dimensions': [['Command', 'Operation']],
+                        'Metrics': [{'Name': 'AwsCallDuration', 'Unit': 'Milliseconds'}]
+                    }]
+                },
+                'Command': self.command,
+                'Operation': operation,
+                'AwsCallDuration': durations
+            })
+        return lines
+
+
+def begin(phase):
+    """Starts collecting metrics for this invocation. phase is 'inline', 'ack' or 'worker'."""
+    global _cold_start, _current
+    _current = InvocationMetrics(phase, _cold_start)
+    _cold_start = False
+    return _current
+
+
+def set_command(command):
+    """Names the command the current invocation is handling. Invocations without one emit nothing."""
+    if _current is not None:
+        _current.command = command
+
+
+def set_phase(phase):
+    """Changes the phase of the current invocation, e.g. to 'ack' when the command is deferred."""
+    if _current is not None:
+        _current.phase = phase
+
+
+def add(name, value=1):
+    """Adds to a counter metric of the current invocation (e.g. 'SsmPolls')."""
+    if _current is not None:
+        _current.add(name, value)
+
+
+def end():
+    """Prints the EMF lines for the current invocation and stops collecting."""
+    global _current
+    metrics, _current = _current, None
+    if metrics is not None and metrics.command is not None:
+        for line in metrics.emf_lines():
+            print(json.dumps(line))
+
+
+def _before_call(context, **kwargs):
+    context['metrics_started'] = time.perf_counter()
+
+
+def _after_call(context, model, **kwargs):
+    started = context.get('metrics_started')
+    if started is not None and _current is not None:
+        _current.record_aws_call(model.name, (time.perf_counter() - started) * 1000)
+
+
+def instrument_client(client):
+    """Times every API call made through a boto3 client. Returns the client."""
+    client.meta.events.register('before-call.*.*', _before_call, unique_id='metrics-before-call')
+    client.meta.events.register('after-call.*.*', _after_call, unique_id='metrics-after-call')
+    return client
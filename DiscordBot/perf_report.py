@@ -0,0 +1,82 @@
+"""
+Formats the samples written by /opt/minecraft/perf_sampler.py on the instance for /perf.
+
+The sampler keeps a ring buffer of samples in /run/minecraft-perf/perf.json as
+{'interval': seconds, 'fields': [...], 'samples': [[value per field], ...]}. This module
+selects the requested window, computes percentiles and draws a sparkline of the tick time.
+"""
+import math
+import time
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+SPARKLINE_WIDTH = 40
+# One tick at 20 TPS. Sparklines are scaled to at least this, so a healthy server draws a low line.
+TICK_BUDGET_MS = 50.0
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile. values must not be empty. Kept in step with the copy in
+    ec2/scripts/restart_scheduler.py: the bot and the instance scripts are deployed separately.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def sparkline(values, width=SPARKLINE_WIDTH, floor_max=None):
+    """
+    Draws values as a line of block characters, at most width wide. When there are more values
+    than characters, each character shows the maximum of its group so short lag spikes stay visible.
+    """
+    if not values:
+        return ''
+    if len(values) > width:
+        step = len(values) / width
+        values = [max(values[int(i * step):int((i + 1) * step)]) for i in range(width)]
+    top = max(max(values), floor_max or 0) or 1
+    return ''.join(SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(value / top * len(SPARK_CHARS)))] for value in values)
+
+
+def columns(data, since):
+    """Returns {field: [values]} of the samples taken at or after since, skipping missing values per field."""
+    fields = data['fields']
+    rows = [row for row in data['samples'] if row[fields.index('t')] >= since]
+    result = {field: [row[i] for row in rows if row[i] is not None] for i, field in enumerate(fields)}
+    return result, rows
+
+
+def format_perf_report(data, minutes=15, now=None):
+    """Returns the /perf message for the last `minutes` of samples."""
+    now = now or time.time()
+    values, rows = columns(data, now - minutes * 60)
+    if not rows:
+        return (f"No performance samples from the last {minutes} minutes. "
+                "The sampler starts with the server; try again in a minute.")
+
+    lines = [f"**Server performance (last {minutes} min, {len(rows)} samples every {data['interval']:.0f}s):**"]
+    mspt = values['mspt']
+    if mspt:
+        lines.append(f"**MSPT:** p50 `{percentile(mspt, 50):.1f}` · p95 `{percentile(mspt, 95):.1f}` · "
+                     f"p99 `{percentile(mspt, 99):.1f}` · max `{max(mspt):.1f}` ms")
+        lines.append(f"`{sparkline(mspt, floor_max=TICK_BUDGET_MS)}` (0–{max(max(mspt), TICK_BUDGET_MS):.0f} ms)")
+    tps = values['tps']
+    if tps:
+        lines.append(f"**TPS:** min `{min(tps):.1f}` · avg `{sum(tps) / len(tps):.1f}` · now `{tps[-1]:.1f}`")
+    players = values['players']
+    if players:
+        lines.append(f"**Players:** now `{players[-1]}` · max `{max(players)}`")
+    if values['chunks']:
+        lines.append(f"**Loaded chunks:** now `{values['chunks'][-1]}` · max `{max(values['chunks'])}`")
+    if values['heap_mb']:
+        heap_max = f" / {values['heap_max_mb'][-1]}" if values['heap_max_mb'] else ""
+        lines.append(f"**Heap:** now `{values['heap_mb'][-1]}{heap_max} MB` · p95 `{percentile(values['heap_mb'], 95)} MB`")
+    if values['gc_ms']:
+        lines.append(f"**GC:** avg `{sum(values['gc_ms']) / len(values['gc_ms']):.0f} ms/min` · max `{max(values['gc_ms']):.0f} ms/min`")
+    if values['rss_mb']:
+        lines.append(f"**Process memory:** `{values['rss_mb'][-1]} MB`")
+
+    age = now - rows[-1][data['fields'].index('t')]
+    if age > 3 * data['interval']:
+        lines.append(f"\n**Warning:** the last sample is {age / 60:.0f} minutes old. The sampler or the server may have stopped.")
+    return '\n'.join(lines)
@@ -0,0 +1,152 @@
+"""
+Minecraft Server List Ping (the protocol behind the multiplayer server list).
+
+ping_server does the handshake, the status request and the ping/pong exchange over one
+connection and returns the player count, version, MOTD and round-trip latency, all
+within a single time budget.
+"""
+import json
+import socket
+import struct
+import time
+
+# Any protocol version works for a status request, -1 is the convention for "just pinging"
+PING_PROTOCOL_VERSION = -1
+
+
+class ServerPingError(Exception):
+    """Raised when the server accepts the connection but does not answer the ping correctly."""
+
+
+def encode_varint(value):
+    """Encodes an int as a protocol VarInt (negative values use their 32-bit two's complement)."""
+    value &= 0xFFFFFFFF
+    out = b''
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out += bytes([byte | 0x80])
+        else:
+            return out + bytes([byte])
+
+
+def encode_string(text):
+    """Encodes a protocol String: VarInt byte length followed by UTF-8 bytes."""
+    data = text.encode('utf-8')
+    return encode_varint(len(data)) + data
+
+
+def encode_packet(packet_id, payload=b''):
+    """Frames a packet: VarInt length, VarInt packet ID, payload."""
+    body = encode_varint(packet_id) + payload
+    return encode_varint(len(body)) + body
+
+
+def flatten_text(component):
+    """Turns a chat component (the MOTD can be a plain string or nested JSON) into plain text."""
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return ''.join(flatten_text(part) for part in component)
+    if isinstance(component, dict):
+        return component.get('text', '') + ''.join(flatten_text(part) for part in component.get('extra', []))
+    return ''
+
+
+class _Connection:
+    """Socket reader that enforces one deadline across every read."""
+
+    def __init__(self, sock, deadline):
+        self.sock = sock
+        self.deadline = deadline
+        self.buffer = b''
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            if self.sock is None:
+                raise ServerPingError("truncated packet")
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("server ping time budget exhausted")
+            self.sock.settimeout(remaining)
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ServerPingError("connection closed by the server")
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_varint(self):
+        value = 0
+        for shift in range(0, 35, 7):
+            byte = self.read(1)[0]
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+        raise ServerPingError("VarInt is too long")
+
+    def read_packet(self):
+        length = self.read_varint()
+        body = _Connection(None, self.deadline)
+        body.buffer = self.read(length)
+        return body.read_varint(), body
+
+
+def ping_server(host, port=25565, timeout=1.5):
+    """
+    Queries a Minecraft server with Server List Ping.
+
+    Returns a dict with status ('ONLINE', 'OFFLINE' or 'UNKNOWN'), players_online, players_max,
+    version, motd and latency_ms. When the port is open but the ping itself fails, status
+    is still 'ONLINE' and the details are None.
+    """
+    result = {
+        'status': 'UNKNOWN',
+        'players_online': None,
+        'players_max': None,
+        'version': None,
+        'motd': None,
+        'latency_ms': None
+    }
+    deadline = time.monotonic() + timeout
+
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    except (socket.timeout, ConnectionRefusedError):
+        result['status'] = 'OFFLINE'
+        return result
+    except OSError as e:
+        print(f"Error pinging server: {e}")
+        return result
+
+    result['status'] = 'ONLINE'
+    with sock:
+        try:
+            conn = _Connection(sock, deadline)
+            handshake = (encode_varint(PING_PROTOCOL_VERSION) + encode_string(host)
+                         + struct.pack('>H', port) + encode_varint(1))
+            sock.sendall(encode_packet(0x00, handshake) + encode_packet(0x00))
+
+            packet_id, body = conn.read_packet()
+            if packet_id != 0x00:
+                raise ServerPingError(f"unexpected status response packet {packet_id}")
+            status = json.loads(body.read(body.read_varint()).decode('utf-8'))
+
+            players = status.get('players', {})
+            result['players_online'] = players.get('online')
+            result['players_max'] = players.get('max')
+            result['version'] = status.get('version', {}).get('name')
+            result['motd'] = flatten_text(status.get('description', ''))
+
+            payload = int(time.time() * 1000)
+            sent = time.perf_counter()
+            sock.sendall(encode_packet(0x01, struct.pack('>q', payload)))
+            packet_id, body = conn.read_packet()
+            if packet_id != 0x01 or struct.unpack('>q', body.read(8))[0] != payload:
+                raise ServerPingError("invalid pong")
+            result['latency_ms'] = round((time.perf_counter() - sent) * 1000, 1)
+        except (OSError, ValueError, ServerPingError) as e:
+            print(f"Server list ping incomplete: {e}")
+
+    return result
@@ -0,0 +1,230 @@
+"""
+Ranks spot instance types by price/performance before /start_fleet creates the fleet.
+
+The fleet request in createFleet.json describes instance requirements and lets the
+allocation strategy pick any matching type, which is often not the best deal: a newer,
+faster type can be cheaper at the moment than an older one. SpotSelector scores each
+candidate type as
+
+    single-thread performance / (time-weighted spot price * interruption penalty)
+
+from the spot price history of the fleet's Availability Zone over a window, the
+interruption frequency bucket published by the Spot Instance Advisor, and a table of
+relative single-thread performance (the Minecraft server tick is mostly single-threaded).
+The request's overrides are then rewritten into one override per ranked type with
+priorities, and the spot allocation strategy is switched to capacity-optimized-prioritized
+so capacity still wins over rank when a type is about to run out.
+
+The price history and advisor data are cached for cache_ttl seconds across warm
+invocations. rank_instance_types() and apply_ranking() have no side effects, so they can
+be checked against recorded describe_spot_price_history responses.
+"""
+import copy
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+SPOT_ADVISOR_URL = 'https://spot-bid-advisor.s3.amazonaws.com/spot-advisor-data.json'
+
+# Relative single-thread performance by instance family, Graviton2 = 1.0 (rounded from public benchmarks)
+PERFORMANCE_SCORES = {
+    # Graviton2, Graviton3, Graviton4 (arm64, like the AMI in the README)
+    't4g': 1.0, 'm6g': 1.0, 'c6g': 1.0, 'r6g': 1.0, 'm6gd': 1.0, 'c6gd': 1.0, 'r6gd': 1.0, 'c6gn': 1.0,
+    'm7g': 1.25, 'c7g': 1.25, 'r7g': 1.25, 'm7gd': 1.25, 'c7gd': 1.25, 'r7gd': 1.25, 'c7gn': 1.25,
+    'm8g': 1.5, 'c8g': 1.5, 'r8g': 1.5,
+    # x86_64, for launch templates with an x86 AMI
+    't3': 0.95, 't3a': 0.8, 'm5': 0.95, 'c5': 1.05, 'm5a': 0.85, 'c5a': 1.0,
+    'm6i': 1.1, 'c6i': 1.15, 'm6a': 1.2, 'c6a': 1.2,
+    'm7i': 1.35, 'c7i': 1.35, 'm7a': 1.5, 'c7a': 1.5
+}
+# Price multiplier per Spot Instance Advisor interruption bucket (<5%, 5-10%, 10-15%, 15-20%, >20% per month)
+INTERRUPTION_PENALTIES = [1.0, 1.1, 1.25, 1.5, 2.0]
+# Used for types the advisor has no data for
+UNKNOWN_INTERRUPTION_PENALTY = 1.25
+PRIORITIZED_ALLOCATION_STRATEGY = 'capacity-optimized-prioritized'
+
+
+def performance_score(instance_type, scores=None):
+    """Returns the relative single-thread score of a type, or None if its family isn't known."""
+    family = instance_type.split('.')[0]
+    return (scores or PERFORMANCE_SCORES).get(family)
+
+
+def average_prices(price_history, window_start, now):
+    """
+    Returns {instance type: lowest time-weighted average price across Availability Zones} over the window.
+    Each history entry is a price change; it holds until the next change in the same zone.
+    """
+    changes = {}
+    for entry in price_history:
+        timestamp = entry['Timestamp']
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        key = (entry['InstanceType'], entry['AvailabilityZone'])
+        changes.setdefault(key, []).append((timestamp, float(entry['SpotPrice'])))
+
+    averages = {}
+    for (instance_type, _), points in changes.items():
+        points.sort()
+        weighted = 0.0
+        duration = 0.0
+        for i, (timestamp, price) in enumerate(points):
+            start = max(timestamp, window_start)
+            end = points[i + 1][0] if i + 1 < len(points) else now
+            seconds = (end - start).total_seconds()
+            if seconds > 0:
+                weighted += price * seconds
+                duration += seconds
+        # A zone whose only price change is at the end of the window still has a current price
+        average = weighted / duration if duration else points[-1][1]
+        averages[instance_type] = min(average, averages.get(instance_type, average))
+    return averages
+
+
+def rank_instance_types(candidates, price_history, advisor_data, region, window_start, now, scores=None):
+    """
+    Ranks candidate types, best price/performance first. Types without a price (not offered as
+    spot in the zone) or without a performance score are left out.
+    Returns a list of dicts with the type, its average price, interruption bucket and value.
+    """
+    prices = average_prices(price_history, window_start, now)
+    advice = (advisor_data or {}).get('spot_advisor', {}).get(region, {}).get('Linux', {})
+    ranked = []
+    for instance_type in candidates:
+        score = performance_score(instance_type, scores)
+        price = prices.get(instance_type)
+        if score is None or not price:
+            print(f"Skipping {instance_type}: {'no spot price' if score else 'no performance score'}")
+            continue
+        bucket = advice.get(instance_type, {}).get('r')
+        penalty = INTERRUPTION_PENALTIES[bucket] if bucket is not None else UNKNOWN_INTERRUPTION_PENALTY
+        ranked.append({
+            'instance_type': instance_type,
+            'price': round(price, 5),
+            'interruption_bucket': bucket,
+            'performance': score,
+            'value': round(score / (price * penalty), 3)
+        })
+    ranked.sort(key=lambda item: -item['value'])
+    return ranked
+
+
+def apply_ranking(fleet_config, ranked):
+    """
+    Returns a copy of a create_fleet request whose overrides list the ranked types by priority
+    (0 is the highest) in every subnet of the original overrides.
+    """
+    config = copy.deepcopy(fleet_config)
+    for launch_config in config['LaunchTemplateConfigs']:
+        subnets = [override.get('SubnetId') for override in launch_config.get('Overrides', [])] or [None]
+        overrides = []
+        for subnet_id in dict.fromkeys(subnets):
+            for priority, item in enumerate(ranked):
+                override = {'InstanceType': item['instance_type'], 'Priority': float(priority)}
+                if subnet_id:
+                    override['SubnetId'] = subnet_id
+                overrides.append(override)
+        launch_config['Overrides'] = overrides
+    config.setdefault('SpotOptions', {})['AllocationStrategy'] = PRIORITIZED_ALLOCATION_STRATEGY
+    return config
+
+
+def fetch_spot_advisor(url=SPOT_ADVISOR_URL, timeout=3):
+    """Downloads the Spot Instance Advisor data (interruption frequency per region and type)."""
+    # Imported here so the PING path does not pay for urllib
+    import urllib.request
+
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class SpotSelector:
+    """
+    Rewrites create_fleet requests to prefer the candidate types with the best price/performance.
+
+    Price history covers the last window_hours. It is cached together with the advisor data
+    for cache_ttl seconds, keyed by the candidate types and Availability Zone.
+    """
+
+    def __init__(self, ec2_client, executor, region, candidates, window_hours=24, cache_ttl=3600,
+                 advisor_loader=fetch_spot_advisor, scores=None, clock=None):
+        self.ec2_client = ec2_client
+        self.executor = executor
+        self.region = region
+        self.candidates = candidates
+        self.window = timedelta(hours=window_hours)
+        self.cache_ttl = cache_ttl
+        self.advisor_loader = advisor_loader
+        self.scores = scores
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self._subnet_zones = {}
+        self._cache = {}
+
+    @property
+    def enabled(self):
+        return bool(self.candidates)
+
+    def subnet_zone(self, subnet_id):
+        """Availability Zone of a subnet. Subnets never move, so this is cached for the container's lifetime."""
+        if subnet_id not in self._subnet_zones:
+            response = self.ec2_client.describe_subnets(SubnetIds=[subnet_id])
+            self._subnet_zones[subnet_id] = response['Subnets'][0]['AvailabilityZone']
+        return self._subnet_zones[subnet_id]
+
+    def price_history(self, zone, start):
+        kwargs = {
+            'InstanceTypes': self.candidates,
+            'ProductDescriptions': ['Linux/UNIX'],
+            'StartTime': start
+        }
+        if zone:
+            kwargs['AvailabilityZone'] = zone
+        history = []
+        while True:
+            response = self.ec2_client.describe_spot_price_history(**kwargs)
+            history.extend(response.get('SpotPriceHistory', []))
+            if not response.get('NextToken'):
+                return history
+            kwargs['NextToken'] = response['NextToken']
+
+    def _advisor_data(self):
+        try:
+            return self.advisor_loader()
+        except Exception as e:
+            # Interruption data is a refinement; rank on price and performance alone without it
+            print(f"Could not load the Spot Instance Advisor data: {e}")
+            return None
+
+    def market_data(self, zone):
+        """Returns (price history, advisor data, window start, as of) from the cache or from AWS."""
+        key = (tuple(self.candidates), zone)
+        cached = self._cache.get(key)
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            return cached[1]
+        now = self.clock()
+        window_start = now - self.window
+        # The price history and the advisor data are independent
+        advisor_future = self.executor.submit(self._advisor_data)
+        history = self.price_history(zone, window_start)
+        data = (history, advisor_future.result(), window_start, now)
+        self._cache[key] = (time.time(), data)
+        return data
+
+    def select(self, fleet_config):
+        """
+        Returns (fleet request to send, ranking). The request is unchanged if selection is
+        disabled or no candidate could be ranked.
+        """
+        if not self.enabled:
+            return fleet_config, []
+        subnets = [override['SubnetId'] for launch_config in fleet_config['LaunchTemplateConfigs']
+                   for override in launch_config.get('Overrides', []) if override.get('SubnetId')]
+        # Prices differ by zone; with subnets in several zones, the cheapest zone per type is used
+        zone = self.subnet_zone(subnets[0]) if len(set(subnets)) == 1 else None
+        history, advisor_data, window_start, now = self.market_data(zone)
+        ranked = rank_instance_types(self.candidates, history, advisor_data, self.region, window_start, now, self.scores)
+        if not ranked:
+            print("No candidate instance type could be ranked; using the fleet request as is")
+            return fleet_config, []
+        print(f"Spot ranking: {json.dumps(ranked)}")
+        return apply_ranking(fleet_config, ranked), ranked
@@ -0,0 +1,147 @@
+"""
+Benchmarks ec2/scripts/world_backup.py against an in-memory S3 stand-in (FakeS3).
+
+Builds a synthetic server directory of region files, then measures a full backup, a backup
+after a play session that touched a few chunks, a backup with nothing changed, a restore into
+an empty directory and a restore over an up-to-date directory. Restored files are compared
+with the originals, and the run fails (exit status 1) if they differ or if an incremental
+step transfers more than it should.
+
+Usage: python bench/backup_bench.py [--regions 24] [--region-mb 2] [--touched 3] [--s3-latency-ms 15]
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'ec2', 'scripts')]
+
+from fakes import FakeS3  # noqa: E402
+from world_backup import BackupStore, backup_world, restore_world  # noqa: E402
+
+SECTOR = 4096
+BUCKET = 'bench-backups'
+
+
+def make_world(root, regions, region_bytes, rng):
+    os.makedirs(os.path.join(root, 'world', 'region'))
+    os.makedirs(os.path.join(root, 'logs'))
+    for i in range(regions):
+        with open(os.path.join(root, 'world', 'region', f"r.{i % 6 - 3}.{i // 6 - 2}.mca"), 'wb') as f:
+            f.write(rng.randbytes(region_bytes))
+    with open(os.path.join(root, 'world', 'level.dat'), 'wb') as f:
+        f.write(rng.randbytes(SECTOR))
+    with open(os.path.join(root, 'server.properties'), 'w') as f:
+        f.write("rcon.port=25575\n")
+    with open(os.path.join(root, 'logs', 'latest.log'), 'w') as f:
+        f.write("not backed up\n")
+
+
+def play_session(root, touched, chunks_per_region, rng):
+    """Rewrites a few chunk sectors and the header of some region files, like a short session would."""
+    region_dir = os.path.join(root, 'world', 'region')
+    for name in rng.sample(sorted(os.listdir(region_dir)), touched):
+        path = os.path.join(region_dir, name)
+        sectors = os.path.getsize(path) // SECTOR
+        with open(path, 'r+b') as f:
+            f.write(rng.randbytes(2 * SECTOR))  # location and timestamp tables
+            for _ in range(chunks_per_region):
+                f.seek(rng.randrange(2, sectors - 2) * SECTOR)
+                f.write(rng.randbytes(2 * SECTOR))
+    with open(os.path.join(root, 'world', 'level.dat'), 'wb') as f:
+        f.write(rng.randbytes(SECTOR))
+
+
+def tree_digest(root, excludes=('logs',)):
+    digests = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if os.path.relpath(os.path.join(dirpath, d), root) not in excludes]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                digests[os.path.relpath(path, root)] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--regions', type=int, default=24)
+    parser.add_argument('--region-mb', type=float, default=2)
+    parser.add_argument('--touched', type=int, default=3, help="Region files changed by the play session")
+    parser.add_argument('--chunks', type=int, default=8, help="Chunks rewritten per touched region file")
+    parser.add_argument('--s3-latency-ms', type=float, default=15)
+    parser.add_argument('--block-kb', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(1234)
+    block_size = args.block_kb * 1024
+    region_bytes = int(args.region_mb * 1024 * 1024) // SECTOR * SECTOR
+    s3 = FakeS3(latency=args.s3_latency_ms / 1000)
+    store = BackupStore(s3, BUCKET)
+    workdir = tempfile.mkdtemp(prefix='backup-bench-')
+    failures = []
+    try:
+        world = os.path.join(workdir, 'server')
+        make_world(world, args.regions, region_bytes, rng)
+        world_mb = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(world) for f in fs) / 1e6
+        print(f"World: {args.regions} region files, {world_mb:.1f} MB, block size {args.block_kb} KiB, "
+              f"S3 latency {args.s3_latency_ms:.0f} ms, {args.workers} workers")
+        print(f"{'step':<22}{'seconds':>9}{'read MB':>9}{'moved MB':>9}{'blocks':>14}{'S3 calls':>10}")
+
+        def report(step, stats, transferred_key, calls_before):
+            moved = stats.get('bytes_uploaded', stats.get('blocks_downloaded', 0) * block_size) / 1e6
+            blocks = f"{stats.get(transferred_key)}/{stats['blocks']}"
+            print(f"{step:<22}{stats['seconds']:>9.2f}{stats.get('bytes_read', 0) / 1e6:>9.1f}{moved:>9.1f}"
+                  f"{blocks:>14}{len(s3.calls) - calls_before:>10}")
+
+        calls = len(s3.calls)
+        full = backup_world(store, world, block_size, args.workers, args.workers * 2)
+        report('full backup', full, 'blocks_uploaded', calls)
+
+        play_session(world, args.touched, args.chunks, rng)
+        calls = len(s3.calls)
+        incremental = backup_world(store, world, block_size, args.workers, args.workers * 2)
+        report('after play session', incremental, 'blocks_uploaded', calls)
+        # Each touched region: the header block plus at most one block per rewritten chunk (two if it straddles)
+        expected_max = args.touched * (1 + 2 * args.chunks) + 1
+        if incremental['blocks_uploaded'] > expected_max:
+            failures.append(f"incremental backup uploaded {incremental['blocks_uploaded']} blocks, expected at most {expected_max}")
+
+        calls = len(s3.calls)
+        unchanged = backup_world(store, world, block_size, args.workers, args.workers * 2)
+        report('nothing changed', unchanged, 'blocks_uploaded', calls)
+        if unchanged['bytes_read'] or unchanged['blocks_uploaded']:
+            failures.append("backup of an unchanged world read or uploaded data")
+
+        restored = os.path.join(workdir, 'restored')
+        os.makedirs(restored)
+        calls = len(s3.calls)
+        restore = restore_world(store, 'latest', restored, args.workers)
+        report('restore (empty dir)', restore, 'blocks_downloaded', calls)
+        if tree_digest(restored) != tree_digest(world):
+            failures.append("restored files differ from the world")
+
+        calls = len(s3.calls)
+        again = restore_world(store, 'latest', restored, args.workers)
+        report('restore (up to date)', again, 'blocks_downloaded', calls)
+        if again['blocks_downloaded']:
+            failures.append("restore over an up-to-date directory downloaded blocks")
+
+        stored_mb = s3.stored_bytes(BUCKET) / 1e6
+        print(f"Stored in S3 for 3 backups: {stored_mb:.1f} MB ({stored_mb / (3 * world_mb):.0%} of 3 full copies), "
+              f"manifest {incremental['manifest_bytes'] / 1024:.1f} KiB")
+    finally:
+        shutil.rmtree(workdir)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Pages large synthetic command outputs into Discord messages (DiscordBot/command_output.py).
+
+Each output is fed to the pager in randomly sized chunks, like CloudWatch log events or RCON
+fragments arrive. The bench checks that:
+  * every page fits Discord's 2000 character limit and holds exactly one code block,
+  * without a page cap nothing is lost: the pages hold the whole output minus its color codes,
+  * ANSI and § color codes are stripped the same however the chunks split them,
+  * with the page cap, reading stops early (only a few chunks or CloudWatch pages are fetched)
+    and the last page says where the full output is, and
+  * a deferred /command edits the original response with the first page and posts the rest
+    as follow-up messages, in order (against a local fake webhook).
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/command_output_bench.py [--seed 1]
+Requires boto3 and pynacl for the follow-up check (pip install boto3 pynacl).
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot'), os.path.join(ROOT, 'ec2', 'scripts'),
+                os.path.dirname(os.path.abspath(__file__))]
+
+from command_output import (DISCORD_MESSAGE_LIMIT, CODE_BLOCK, paginate, read_cloudwatch_output,  # noqa: E402
+                            strip_codes, strip_stream)
+from fakes import FakeWebhook  # noqa: E402
+
+COLORS = ['\x1b[0m', '\x1b[32m', '\x1b[1;31m', '\x1b[38;5;208m', '§a', '§l', '§r']
+
+
+def plugin_dump(rng, lines=5000):
+    """A plugin list with colored names, about 400 KB."""
+    return ''.join(f"{rng.choice(COLORS)}Plugin{i:05d}{COLORS[0]} v{i % 9}.{i % 17}.{i % 5} "
+                   f"by {rng.choice(COLORS)}author{i % 97}{COLORS[0]} - {'x' * rng.randint(10, 60)}\n" for i in range(lines))
+
+
+def outputs(rng):
+    return {
+        'plugins': plugin_dump(rng),
+        'datapacks_one_line': ', '.join(f"[file/pack_{i:04d} (world)]" for i in range(1200)),
+        'backticks': ''.join(f"say ```{i}``` and `{i}`\n" for i in range(800)),
+        'list': "There are 3 of a max of 20 players online: alice, bob, carol\n",
+        'empty': "",
+    }
+
+
+def random_chunks(text, rng, consumed=None):
+    """Splits text into chunks of 1 to 4096 characters. Counts the chunks read in consumed[0]."""
+    position = 0
+    while position < len(text):
+        size = rng.choice([1, 7, 64, 1000, 4096])
+        if consumed is not None:
+            consumed[0] += 1
+        yield text[position:position + size]
+        position += size
+
+
+def page_bodies(pages, header):
+    """The output text held by the pages, without the header, fences and notes."""
+    bodies = []
+    for index, page in enumerate(pages):
+        if index == 0 and header:
+            page = page[len(header) + 1:]
+        if CODE_BLOCK not in page:
+            continue
+        bodies.append(page.split(f"{CODE_BLOCK}\n", 1)[1].rsplit(f"\n{CODE_BLOCK}", 1)[0])
+    return bodies
+
+
+class FakeLogs:
+    """get_log_events over a list of lines, counting the calls."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.calls = 0
+
+    def get_log_events(self, logGroupName, logStreamName, startFromHead, limit, nextToken=None):
+        self.calls += 1
+        start = int(nextToken or 0)
+        return {'events': [{'message': line} for line in self.lines[start:start + limit]],
+                'nextForwardToken': str(start + len(self.lines[start:start + limit]))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    failures = []
+
+    def check(name, condition, detail):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}: {detail}")
+        if not condition:
+            failures.append(name)
+
+    header = "Command `plugins` executed. Status: `Success`"
+    for name, text in outputs(rng).items():
+        expected = re.sub(r'\s', '', strip_codes(text).replace(CODE_BLOCK, '``\u200b`'))
+        started = time.perf_counter()
+        pages = paginate(random_chunks(text, rng), header, max_pages=10000)
+        seconds = time.perf_counter() - started
+        fits = all(len(page) <= DISCORD_MESSAGE_LIMIT for page in pages)
+        one_block = all(page.count(CODE_BLOCK) == 2 for page in pages) if text else True
+        lossless = re.sub(r'\s', '', ''.join(page_bodies(pages, header))) == expected
+        check(f"{name} uncapped", fits and one_block and lossless,
+              f"{len(text) / 1000:.0f} KB -> {len(pages)} page(s) in {seconds * 1000:.1f} ms, "
+              f"max {max(map(len, pages))} chars, one code block each: {one_block}, lossless: {lossless}")
+
+    text = outputs(rng)['plugins']
+    whole = strip_codes(text)
+    splits_ok = all(''.join(strip_stream(random_chunks(text, random.Random(seed)))) == whole for seed in range(20))
+    check('streaming strip', splits_ok and '\x1b' not in whole and '§' not in whole,
+          "20 random chunkings strip to the same text as the whole output")
+
+    consumed = [0]
+    total_chunks = sum(1 for _ in random_chunks(text, random.Random(7)))
+    pages = paginate(random_chunks(text, random.Random(7), consumed), header, max_pages=5, saved_to='s3://example')
+    check('page cap', len(pages) == 5 and pages[-1].endswith('Full output: s3://example_') and consumed[0] < total_chunks / 10
+          and all(len(page) <= DISCORD_MESSAGE_LIMIT for page in pages),
+          f"5 pages after reading {consumed[0]} of {total_chunks} chunks")
+
+    logs = FakeLogs(text.splitlines())
+    pages = paginate(read_cloudwatch_output(logs, 'group', 'stream'), header, max_pages=5)
+    check('CloudWatch early stop', logs.calls <= 2 and len(pages) == 5,
+          f"{logs.calls} get_log_events call(s) for {len(logs.lines)} log lines")
+
+    os.environ.setdefault('DISCORD_PUBLIC_KEY', '00' * 32)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import lambda_function
+    long_pages = paginate([text], header, max_pages=4)
+    with FakeWebhook() as webhook:
+        lambda_function.DISCORD_API_BASE = webhook.api_base
+        lambda_function.dispatch_command = lambda command, options: long_pages
+        with contextlib.redirect_stdout(io.StringIO()):
+            lambda_function.run_deferred_interaction({'command': 'command', 'options': [], 'application_id': '1',
+                                                      'token': 'tok'})
+        methods = [method for method, _, _, _ in webhook.requests]
+        in_order = [content for _, _, content, _ in webhook.requests] == long_pages
+        check('follow-up messages', methods == ['PATCH', 'POST', 'POST', 'POST'] and in_order,
+              f"{', '.join(methods)}, pages in order: {in_order}")
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
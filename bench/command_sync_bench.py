@@ -0,0 +1,132 @@
+"""
+Syncs the bot's slash commands (DiscordBot/commandRegistration.py) with a local fake Discord API.
+
+The fake stores commands the way Discord returns them (ids, versions and other server-side fields
+added, "required": false left out) and enforces a rate limit bucket. The bench checks that:
+  * registering on a new application takes one GET and one bulk PUT,
+  * syncing again with nothing changed sends no writes,
+  * adding the per-server choices is one PUT that keeps every command's ID,
+  * the individual strategy only touches the commands that differ (POST, PATCH, DELETE),
+  * --dry-run sends no writes, and
+  * requests wait out X-RateLimit-Remaining: 0 instead of running into 429s, and a 429 is retried
+    after its Retry-After.
+It also prints the time the old one-POST-per-command registration (with a 1 second sleep each) would take.
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/command_sync_bench.py [--latency-ms 40] [-v]
+Requires requests (pip install requests).
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot'), os.path.dirname(os.path.abspath(__file__))]
+
+import commandRegistration as registration  # noqa: E402
+from fakes import FakeDiscordApi  # noqa: E402
+
+APP_ID = '200000000000000000'
+GUILD_ID = '300000000000000000'
+SERVERS = ['survival', 'creative']
+
+
+class Bench:
+    def __init__(self, latency, verbose):
+        self.latency = latency
+        self.verbose = verbose
+        self.failures = []
+
+    def check(self, name, condition, detail):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}: {detail}")
+        if not condition:
+            self.failures.append(name)
+
+    def sync(self, fake, desired, strategy='bulk', dry_run=False, guild_id=None):
+        """Runs one sync. Returns (plan, api, requests sent to the fake, seconds)."""
+        api = registration.DiscordApi(APP_ID, 'bench-token', guild_id=guild_id, api_base=fake.api_base)
+        before = len(fake.requests)
+        output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        started = time.perf_counter()
+        with output:
+            plan = registration.sync_commands(api, desired, strategy, dry_run)
+        return plan, api, fake.requests[before:], time.perf_counter() - started
+
+    def registered(self, fake, guild_id=None):
+        scope = f"/api/v10/applications/{APP_ID}" + (f"/guilds/{guild_id}" if guild_id else "") + "/commands"
+        return fake.commands.get(scope, {})
+
+
+def methods(requests):
+    return [method for method, _, _ in requests]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=40, help="Latency of every request to the fake API")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the sync output")
+    args = parser.parse_args()
+    bench = Bench(args.latency_ms / 1000, args.verbose)
+
+    single = registration.build_commands([])
+    multi = registration.build_commands(SERVERS)
+    legacy_seconds = len(single) * (args.latency_ms / 1000 + 1)
+
+    with FakeDiscordApi(latency=bench.latency, rate_limit=50) as fake:
+        plan, _, sent, seconds = bench.sync(fake, single)
+        bench.check('first sync', methods(sent) == ['GET', 'PUT'] and len(bench.registered(fake)) == len(single),
+                    f"{len(plan['create'])} commands created with {len(sent)} requests in {seconds * 1000:.0f} ms "
+                    f"(one POST each with a 1s sleep: ~{legacy_seconds:.1f} s)")
+
+        _, _, sent, seconds = bench.sync(fake, single)
+        bench.check('unchanged sync', methods(sent) == ['GET'],
+                    f"{len(sent)} request(s), no writes, in {seconds * 1000:.0f} ms")
+
+        ids = {command['name']: command_id for command_id, command in bench.registered(fake).items()}
+        plan, _, sent, _ = bench.sync(fake, multi)
+        new_ids = {command['name']: command_id for command_id, command in bench.registered(fake).items()}
+        bench.check('server choices added', methods(sent) == ['GET', 'PUT'] and ids == new_ids,
+                    f"{len(plan['update'])} changed commands in one PUT, IDs kept: {ids == new_ids}")
+
+        _, _, sent, _ = bench.sync(fake, multi)
+        bench.check('choices round trip', methods(sent) == ['GET'], "registered choices compare equal to the definitions")
+
+        edited = [dict(command) for command in multi if command['name'] != 'backup']
+        edited[0]['description'] = 'Starts the Minecraft server.'
+        edited.append({'name': 'players', 'type': 1, 'description': 'Lists the players online.'})
+        plan, _, sent, _ = bench.sync(fake, edited, dry_run=True)
+        bench.check('dry run', methods(sent) == ['GET'],
+                    f"would create {len(plan['create'])}, change {len(plan['update'])}, delete {len(plan['delete'])}; "
+                    f"sent {len(sent)} request(s)")
+
+        plan, _, sent, _ = bench.sync(fake, edited, strategy='individual')
+        names = sorted(command['name'] for command in bench.registered(fake).values())
+        bench.check('individual strategy', sorted(methods(sent)) == ['DELETE', 'GET', 'PATCH', 'POST'] and
+                    names == sorted(command['name'] for command in edited),
+                    f"{', '.join(methods(sent))}")
+
+    # A small bucket: 2 requests per 0.5 s, and one forced 429
+    with FakeDiscordApi(latency=bench.latency, rate_limit=2, rate_window=0.5) as fake:
+        plan, api, sent, seconds = bench.sync(fake, single, strategy='individual', guild_id=GUILD_ID)
+        statuses = [status for _, _, status in sent]
+        bench.check('rate limit headers', 429 not in statuses and len(bench.registered(fake, GUILD_ID)) == len(single),
+                    f"{len(sent)} requests in {seconds:.2f} s, waited {api.waited:.2f} s, {statuses.count(429)} 429s")
+
+        fake.force_429 = 1
+        edited = [dict(command) for command in single]
+        edited[1]['description'] = 'Creates a new EC2 Fleet.'
+        _, api, sent, _ = bench.sync(fake, edited, strategy='individual', guild_id=GUILD_ID)
+        bench.check('retry after 429', api.rate_limited == 1 and [s for _, _, s in sent][-1] == 200,
+                    f"{api.rate_limited} rate limited response retried, {len(sent)} requests")
+
+    if bench.failures:
+        print(f"\n{len(bench.failures)} check(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Checks the deferred path of slow slash commands against fake AWS and a stubbed Discord webhook.
+
+Every slow command (DEFERRED_MODE=lambda) is sent through lambda_handler as a signed
+interaction, cold (lambda_function re-imported first) and warm. The bench checks that:
+  * the type 5 deferred response comes back within Discord's 3 second deadline, even when
+    the command itself takes longer (--command-ms), and only invokes the worker,
+  * the asynchronous self-invocation carries the command, options and interaction token,
+  * the worker, run from that payload, PATCHes the original response on the webhook with the
+    command's result, and
+  * fast and unauthorized commands are answered inline without invoking the worker.
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/deferred_bench.py [--latency-ms 30] [--command-ms 3500] [--deadline-ms 3000]
+Requires boto3 and pynacl (pip install boto3 pynacl).
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from unittest import mock
+
+import boto3
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot'), os.path.join(ROOT, 'ec2', 'scripts'),
+                os.path.dirname(os.path.abspath(__file__))]
+
+from fakes import FakeAwsAccount, FakeMinecraftServer, FakeRconServer, FakeWebhook  # noqa: E402
+from handler_bench import (ADMIN_USER, BOT_MODULES, PLAYER_USER, RCON_PASSWORD, command_event,  # noqa: E402
+                           instance_command_output, running_server, stopped_server)
+
+FUNCTION_NAME = 'minecraft-discord-bot'
+
+# name -> (event factory, account setup)
+SLOW_COMMANDS = {
+    'status': (lambda: command_event('status'), running_server),
+    'start': (lambda: command_event('start'), stopped_server),
+    'command': (lambda: command_event('command', [{'name': 'command', 'value': 'list'}]), running_server),
+}
+
+
+def load_bot(minecraft_port, rcon_port):
+    """Imports lambda_function afresh, like a cold start."""
+    for name in BOT_MODULES:
+        sys.modules.pop(name, None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = importlib.import_module('lambda_function')
+    module.server_port = minecraft_port
+    module.RCON_PORT = rcon_port
+    module.AUTHORIZED_USERS = [ADMIN_USER]
+    module.STATUS_CACHE_TTL = 0
+    return module
+
+
+def invoke(module, event):
+    """Runs lambda_handler quietly. Returns (response, milliseconds)."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = module.lambda_handler(event, None)
+    return response, (time.perf_counter() - started) * 1000
+
+
+def response_type(response):
+    return json.loads(response['body'])['type'] if response.get('body', '').startswith('{') else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=30, help="Injected latency per AWS call")
+    parser.add_argument('--command-ms', type=float, default=3500,
+                        help="Time an SSM Run Command takes on the instance (longer than the deadline on purpose)")
+    parser.add_argument('--webhook-ms', type=float, default=50, help="Latency of the fake webhook")
+    parser.add_argument('--deadline-ms', type=float, default=3000, help="Discord's deadline for the first response")
+    args = parser.parse_args()
+    failures = []
+
+    def check(name, condition, detail):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}: {detail}")
+        if not condition:
+            failures.append(name)
+
+    account = FakeAwsAccount(latency=args.latency_ms / 1000, command_duration=args.command_ms / 1000,
+                             command_output=instance_command_output)
+    mock.patch.object(boto3, 'client', side_effect=account.client).start()
+    mock.patch.dict(os.environ, {'DEFERRED_MODE': 'lambda', 'AWS_LAMBDA_FUNCTION_NAME': FUNCTION_NAME}).start()
+    os.chdir(os.path.join(ROOT, 'awsInfra'))
+
+    with FakeMinecraftServer(players_online=2, motd='bench') as minecraft, \
+            FakeRconServer(password=RCON_PASSWORD) as rcon, FakeWebhook(latency=args.webhook_ms / 1000) as webhook:
+        module = None
+        for command, (make_event, setup) in SLOW_COMMANDS.items():
+            for mode in ('cold', 'warm'):
+                setup(account)
+                if mode == 'cold' or module is None:
+                    module = load_bot(minecraft.port, rcon.port)
+                module.DISCORD_API_BASE = webhook.api_base
+                event = make_event()
+                calls_before = len(account.calls)
+                response, ack_ms = invoke(module, event)
+                ack_calls = account.calls[calls_before:]
+                deferred = response_type(response) == 5
+                worker_only = all(call.startswith('ssm.') for call in ack_calls[:-1]) and ack_calls[-1:] == ['lambda.invoke']
+                check(f"{command}/{mode} ack", deferred and ack_ms < args.deadline_ms and worker_only,
+                      f"type {response_type(response)} in {ack_ms:.0f} ms (deadline {args.deadline_ms:.0f} ms), "
+                      f"AWS calls: {', '.join(ack_calls) or 'none'}")
+
+                body = json.loads(event['body'])
+                job = account.invocations[-1]['deferred_interaction'] if account.invocations else {}
+                check(f"{command}/{mode} payload", job.get('command') == command and job.get('token') == body['token']
+                      and job.get('application_id') == body['application_id'] and job.get('options') == body['data']['options'],
+                      f"self-invocation of {FUNCTION_NAME} with {sorted(job)}")
+
+                before = len(webhook.requests)
+                _, worker_ms = invoke(module, account.invocations[-1])
+                sent = webhook.requests[before:]
+                expected_path = f"/api/v10/webhooks/{body['application_id']}/{body['token']}/messages/@original"
+                edited = [content for method, path, content, _ in sent if method == 'PATCH' and path == expected_path]
+                check(f"{command}/{mode} webhook", len(edited) == 1 and edited[0] and 'error occurred' not in edited[0],
+                      f"worker took {worker_ms:.0f} ms, PATCHed @original: {edited[0][:60]!r}" if edited
+                      else f"worker took {worker_ms:.0f} ms, no PATCH of @original")
+
+        running_server(account)
+        invocations = len(account.invocations)
+        for name, event in [('help', command_event('help')), ('unauthorized', command_event('stop_fleet', user_id=PLAYER_USER))]:
+            response, ms = invoke(module, event)
+            check(f"{name} inline", response_type(response) == 4 and len(account.invocations) == invocations,
+                  f"type {response_type(response)} in {ms:.0f} ms, no worker invoked")
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
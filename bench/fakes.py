@@ -0,0 +1,621 @@
+"""
+Local stand-ins for the network services the bot talks to, for benchmarks and manual testing.
+
+FakeRconServer speaks the RCON protocol the way the vanilla Minecraft server does: it
+parses one packet per read of up to 1460 bytes (dropping the rest of the read), splits long
+responses into 4096 byte fragments and answers unknown packet types with an "Unknown request"
+packet. FakeMinecraftServer answers Server List Ping status requests.
+FakeAwsAccount stands in for the EC2, SSM, CloudWatch Logs and Lambda APIs the bot calls, with injected
+latency and throttling, and FakeS3 for the bucket used by the world backups.
+FakeDiscordApi serves the application command endpoints used by commandRegistration.py,
+with Discord's rate limit headers, and FakeWebhook the interaction webhook deferred commands
+answer through.
+"""
+import io
+import itertools
+import json
+import re
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+RCON_FRAGMENT_SIZE = 4096
+# The vanilla server's RCON thread reads into a buffer of this size and parses one packet from each read
+RCON_READ_SIZE = 1460
+
+
+class FakeRconServer:
+    """
+    Threaded RCON server on 127.0.0.1. Commands are answered by handler(command) -> str,
+    after an optional per-command delay in seconds. Like the vanilla server, each read of up to
+    1460 bytes is parsed as exactly one packet: anything after it in the same read is dropped
+    (counted in dropped_packets), and a read of fewer than 10 bytes closes the connection.
+    """
+
+    def __init__(self, password='password', handler=None, delay=0.0):
+        self.password = password
+        self.handler = handler or (lambda command: f"ran {command}")
+        self.delay = delay
+        self.commands = []
+        self.connections = 0
+        self.dropped_packets = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen()
+        self.port = self._sock.getsockname()[1]
+        self._closed = False
+
+    def __enter__(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._closed = True
+        self._sock.close()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _send(conn, request_id, packet_type, payload):
+        body = struct.pack('<ii', request_id, packet_type) + payload.encode('utf-8') + b'\x00\x00'
+        conn.sendall(struct.pack('<i', len(body)) + body)
+
+    def _serve(self, conn):
+        authenticated = False
+        with conn:
+            try:
+                while True:
+                    data = conn.recv(RCON_READ_SIZE)
+                    if len(data) < 10:
+                        return
+                    (length,) = struct.unpack('<i', data[:4])
+                    body = data[4:4 + length]
+                    if len(data) > 4 + length:
+                        self.dropped_packets += 1
+                    request_id, packet_type = struct.unpack('<ii', body[:8])
+                    payload = body[8:-2].decode('utf-8')
+
+                    if packet_type == 3:
+                        authenticated = payload == self.password
+                        self._send(conn, request_id if authenticated else -1, 2, '')
+                    elif packet_type == 2 and authenticated:
+                        self.commands.append(payload)
+                        if self.delay:
+                            time.sleep(self.delay)
+                        response = self.handler(payload)
+                        encoded = response.encode('utf-8')
+                        offsets = range(0, max(len(encoded), 1), RCON_FRAGMENT_SIZE)
+                        for offset in offsets:
+                            fragment = encoded[offset:offset + RCON_FRAGMENT_SIZE].decode('utf-8', errors='ignore')
+                            self._send(conn, request_id, 0, fragment)
+                    elif authenticated:
+                        self._send(conn, request_id, 0, f"Unknown request {packet_type:x}")
+                    else:
+                        return
+            except (ConnectionError, OSError):
+                return
+
+
+def _recv_exactly(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("client closed the connection")
+        data += chunk
+    return data
+
+
+def _read_varint(conn):
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = conn.recv(1)
+        if not byte:
+            raise ConnectionError("client closed the connection")
+        value |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return value
+    raise ValueError("VarInt is too long")
+
+
+def _varint(value):
+    out = b''
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out += bytes([byte | 0x80])
+        else:
+            return out + bytes([byte])
+
+
+class FakeMinecraftServer:
+    """
+    Threaded Server List Ping responder on 127.0.0.1. Answers status requests with the
+    given player counts, version and MOTD after an optional delay in seconds.
+    """
+
+    def __init__(self, players_online=0, players_max=20, version='1.21.1', motd='A Minecraft Server', delay=0.0):
+        self.status = {
+            'version': {'name': version, 'protocol': 767},
+            'players': {'online': players_online, 'max': players_max},
+            'description': {'text': motd}
+        }
+        self.delay = delay
+        self.pings = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen()
+        self.port = self._sock.getsockname()[1]
+        self._closed = False
+
+    def __enter__(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._closed = True
+        self._sock.close()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                while True:
+                    length = _read_varint(conn)
+                    body = _recv_exactly(conn, length)
+                    packet_id = body[0]
+                    if packet_id == 0x00 and length > 1:
+                        continue  # handshake
+                    if packet_id == 0x00:
+                        self.pings += 1
+                        if self.delay:
+                            time.sleep(self.delay)
+                        data = json.dumps(self.status).encode('utf-8')
+                        payload = b'\x00' + _varint(len(data)) + data
+                    else:
+                        payload = body  # pong echoes the ping
+                    conn.sendall(_varint(len(payload)) + payload)
+            except (ConnectionError, OSError, ValueError, IndexError):
+                return
+
+
+def _client_error(code, operation, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message or code}}, operation)
+
+
+class FakeAwsClient:
+    """
+    boto3-like client for one service of a FakeAwsAccount. Fires the same before-call and
+    after-call events as a real client, so botocore event hooks (metrics.instrument_client) work.
+    """
+
+    def __init__(self, account, service):
+        self.account = account
+        self.service = service
+        self.meta = SimpleNamespace(events=HierarchicalEmitter(), service_model=SimpleNamespace(service_name=service))
+
+    def __getattr__(self, operation):
+        handler = getattr(self.account, f"_{operation}", None)
+        if handler is None:
+            raise AttributeError(f"{self.service} client has no operation {operation}")
+
+        def call(**kwargs):
+            model = SimpleNamespace(name=''.join(word.title() for word in operation.split('_')))
+            context = {}
+            self.meta.events.emit(f'before-call.{self.service}.{model.name}', model=model, params=kwargs, context=context)
+            response = self.account.call(self.service, operation, handler, kwargs)
+            self.meta.events.emit(f'after-call.{self.service}.{model.name}', model=model, parsed=response, context=context)
+            return response
+        return call
+
+
+class FakeAwsAccount:
+    """
+    In-memory EC2 fleets and instances, SSM parameters and Run Command invocations, and Lambda
+    async invokes. Every call sleeps for latency seconds. With throttle_every=N, every Nth call is
+    throttled once and pays throttle_backoff plus a second round trip, like a botocore retry.
+    SSM commands finish command_duration seconds after send_command with command_output(command).
+    """
+
+    def __init__(self, latency=0.0, throttle_every=0, throttle_backoff=0.05, command_duration=0.3, command_output=None):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.throttle_backoff = throttle_backoff
+        self.command_duration = command_duration
+        self.command_output = command_output or (lambda command: "There are 0 of a max of 20 players online: ")
+        self.calls = []
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.reset()
+
+    def reset(self, parameters=None):
+        """Clears all resources. Call counters are kept."""
+        self.parameters = dict(parameters or {})
+        self.fleets = {}
+        self.instances = {}
+        self.addresses = {}
+        self.commands = {}
+        self.log_streams = {}
+        self.invocations = []
+
+    def client(self, service, **kwargs):
+        return FakeAwsClient(self, service)
+
+    def add_instance(self, instance_id, state='running', public_ip='127.0.0.1', hibernation=False, tags=None):
+        self.instances[instance_id] = {
+            'InstanceId': instance_id,
+            'State': {'Name': state},
+            'PublicIpAddress': public_ip if state == 'running' else None,
+            'InstanceType': 't4g.medium',
+            'LaunchTime': '2026-01-01T00:00:00+00:00',
+            'InstanceLifecycle': 'spot',
+            'HibernationOptions': {'Configured': hibernation},
+            'Tags': [{'Key': key, 'Value': value} for key, value in (tags or {}).items()]
+        }
+
+    def add_fleet(self, fleet_id, state='active', capacity=1, instance_ids=()):
+        self.fleets[fleet_id] = {'state': state, 'capacity': capacity, 'instances': list(instance_ids)}
+        for instance_id in instance_ids:
+            # EC2 Fleet tags the instances it launches
+            if instance_id in self.instances:
+                self.instances[instance_id]['Tags'].append({'Key': 'aws:ec2:fleet-id', 'Value': fleet_id})
+
+    def call(self, service, operation, handler, kwargs):
+        with self._lock:
+            self.calls.append(f"{service}.{operation}")
+            throttled = self.throttle_every and len(self.calls) % self.throttle_every == 0
+            if throttled:
+                self.throttled += 1
+        if throttled:
+            time.sleep(self.latency + self.throttle_backoff)
+        time.sleep(self.latency)
+        return handler(**kwargs)
+
+    # SSM
+
+    def _get_parameters(self, Names, WithDecryption=False):
+        return {
+            'Parameters': [{'Name': name, 'Value': self.parameters[name]} for name in Names if name in self.parameters],
+            'InvalidParameters': [name for name in Names if name not in self.parameters]
+        }
+
+    def _put_parameter(self, Name, Value, Type='String', Overwrite=False):
+        self.parameters[Name] = Value
+        return {'Version': 1}
+
+    def _send_command(self, InstanceIds, DocumentName, Parameters, **kwargs):
+        command_id = f"cmd-{next(self._ids):08d}"
+        self.commands[command_id] = (time.monotonic(), Parameters['commands'][0])
+        return {'Command': {'CommandId': command_id}}
+
+    def _get_command_invocation(self, CommandId, InstanceId):
+        if CommandId not in self.commands:
+            raise _client_error('InvocationDoesNotExist', 'GetCommandInvocation')
+        sent_at, command = self.commands[CommandId]
+        response = {'CommandId': CommandId, 'InstanceId': InstanceId}
+        if time.monotonic() - sent_at < self.command_duration:
+            return {**response, 'Status': 'InProgress', 'StandardOutputContent': ''}
+        # Like SSM, only the first 24,000 characters; the full output goes to CloudWatch Logs
+        output = self.command_output(command)
+        self.log_streams[f"{CommandId}/{InstanceId}/aws-runShellScript/stdout"] = output.splitlines()
+        return {**response, 'Status': 'Success', 'StandardOutputContent': output[:24000]}
+
+    # CloudWatch Logs
+
+    def _get_log_events(self, logGroupName, logStreamName, startFromHead=False, limit=10000, nextToken=None):
+        if logStreamName not in self.log_streams:
+            raise _client_error('ResourceNotFoundException', 'GetLogEvents')
+        lines = self.log_streams[logStreamName]
+        start = int(nextToken.split('/')[1]) if nextToken else 0
+        events = [{'timestamp': 0, 'message': line} for line in lines[start:start + limit]]
+        return {'events': events, 'nextForwardToken': f"f/{start + len(events)}"}
+
+    # EC2
+
+    def _describe_fleets(self, FleetIds):
+        fleets = []
+        for fleet_id in FleetIds:
+            if fleet_id in self.fleets:
+                fleet = self.fleets[fleet_id]
+                fleets.append({
+                    'FleetId': fleet_id,
+                    'FleetState': fleet['state'],
+                    'TargetCapacitySpecification': {'TotalTargetCapacity': fleet['capacity']}
+                })
+        return {'Fleets': fleets}
+
+    def _describe_fleet_instances(self, FleetId):
+        if FleetId not in self.fleets:
+            raise _client_error('InvalidFleetId.NotFound', 'DescribeFleetInstances')
+        return {'ActiveInstances': [{'InstanceId': instance_id} for instance_id in self.fleets[FleetId]['instances']]}
+
+    def _describe_instances(self, InstanceIds=None, Filters=None, NextToken=None):
+        if InstanceIds is None:
+            instances = list(self.instances.values())
+        else:
+            missing = [instance_id for instance_id in InstanceIds if instance_id not in self.instances]
+            if missing:
+                raise _client_error('InvalidInstanceID.NotFound', 'DescribeInstances')
+            instances = [self.instances[instance_id] for instance_id in InstanceIds]
+        for instance_filter in Filters or []:
+            if instance_filter['Name'] == 'instance-state-name':
+                instances = [i for i in instances if i['State']['Name'] in instance_filter['Values']]
+            elif instance_filter['Name'].startswith('tag:'):
+                key = instance_filter['Name'][4:]
+                instances = [i for i in instances
+                             if any(t['Key'] == key and t['Value'] in instance_filter['Values'] for t in i['Tags'])]
+        return {'Reservations': [{'Instances': instances}] if instances else []}
+
+    def _describe_addresses(self, AllocationIds):
+        return {'Addresses': [{'AllocationId': allocation_id, 'PublicIp': self.addresses.get(allocation_id, '203.0.113.10')}
+                              for allocation_id in AllocationIds]}
+
+    def _modify_fleet(self, FleetId, TargetCapacitySpecification, **kwargs):
+        self.fleets[FleetId]['capacity'] = TargetCapacitySpecification['TotalTargetCapacity']
+        return {'Return': True}
+
+    def _create_fleet(self, **config):
+        fleet_id = f"fleet-{next(self._ids):08d}-0000-0000-0000-000000000000"
+        self.add_fleet(fleet_id, state='submitted', capacity=config['TargetCapacitySpecification']['TotalTargetCapacity'])
+        return {'FleetId': fleet_id}
+
+    def _delete_fleets(self, FleetIds, TerminateInstances):
+        for fleet_id in FleetIds:
+            self.fleets[fleet_id]['state'] = 'deleted_terminating'
+        return {'SuccessfulFleetDeletions': [{'FleetId': fleet_id} for fleet_id in FleetIds]}
+
+    def _start_instances(self, InstanceIds):
+        for instance_id in InstanceIds:
+            self.instances[instance_id]['State'] = {'Name': 'pending'}
+        return {'StartingInstances': [{'InstanceId': instance_id} for instance_id in InstanceIds]}
+
+    def _stop_instances(self, InstanceIds, Hibernate=False):
+        for instance_id in InstanceIds:
+            self.instances[instance_id]['State'] = {'Name': 'stopping'}
+        return {'StoppingInstances': [{'InstanceId': instance_id} for instance_id in InstanceIds]}
+
+    # Lambda
+
+    def _invoke(self, FunctionName, InvocationType='RequestResponse', Payload=b''):
+        self.invocations.append(json.loads(Payload))
+        return {'StatusCode': 202}
+
+
+class FakeS3:
+    """
+    In-memory stand-in for the S3 calls used by ec2/scripts/world_backup.py (put_object,
+    get_object, list_objects_v2), with an optional per-call latency in seconds.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls.append(name)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body):
+        self._call('put_object')
+        with self._lock:
+            self.objects[(Bucket, Key)] = bytes(Body)
+        return {'ETag': f'"{len(Body)}"'}
+
+    def get_object(self, Bucket, Key):
+        self._call('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise _client_error('NoSuchKey', 'GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000):
+        self._call('list_objects_v2')
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {'Contents': [{'Key': key, 'Size': len(self.objects[(Bucket, key)])} for key in page],
+                    'IsTruncated': start + MaxKeys < len(keys)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def stored_bytes(self, Bucket, Prefix=''):
+        return sum(len(body) for (bucket, key), body in self.objects.items() if bucket == Bucket and key.startswith(Prefix))
+
+
+class FakeDiscordApi:
+    """
+    Threaded HTTP server on 127.0.0.1 with Discord's application command endpoints (global and guild):
+    GET and bulk-overwrite PUT on .../commands, POST to create, PATCH and DELETE on .../commands/{id}.
+    Stored commands come back the way Discord returns them, with id, version and the other server-side
+    fields added and options' "required": false left out.
+
+    All requests share one rate limit bucket of rate_limit requests per rate_window seconds, reported
+    in X-RateLimit-* headers. Requests over the limit, and the next force_429 requests, get a 429
+    with Retry-After. Every request waits latency seconds. api_base is the URL to pass as DISCORD_API_BASE.
+    """
+
+    def __init__(self, latency=0.0, rate_limit=5, rate_window=1.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.force_429 = 0
+        self.commands = {}  # scope (path up to /commands) -> {id: command}
+        self.requests = []  # (method, path, status)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1_000_000_000_000_000_000)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, headers, payload = fake._request(self.command, self.path, body)
+                data = b'' if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = _handle
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.api_base = f"http://127.0.0.1:{self._server.server_address[1]}/api/v10"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def writes(self):
+        """Number of requests that changed (or tried to change) the commands."""
+        return sum(1 for method, _, _ in self.requests if method != 'GET')
+
+    def _rate_limit(self):
+        """Counts the request against the bucket. Returns (headers, seconds to wait if over the limit)."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.rate_window:
+                self._window_start, self._window_count = now, 0
+            reset_after = max(0.0, self.rate_window - (now - self._window_start))
+            if self.force_429:
+                self.force_429 -= 1
+                return {}, reset_after or self.rate_window
+            if self._window_count >= self.rate_limit:
+                return {}, reset_after
+            self._window_count += 1
+            return {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(self.rate_limit - self._window_count),
+                'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+                'X-RateLimit-Bucket': 'application-commands'
+            }, 0
+
+    def _stored(self, command, command_id, scope):
+        stored = json.loads(json.dumps(command))
+        for option in stored.get('options', []):
+            if not option.get('required'):
+                option.pop('required', None)
+        application_id = scope.split('/')[3]
+        stored.update({'id': command_id, 'application_id': application_id, 'version': str(next(self._ids)),
+                       'default_member_permissions': None, 'dm_permission': True, 'nsfw': False,
+                       'type': command.get('type', 1), 'integration_types': [0], 'contexts': None})
+        return stored
+
+    def _request(self, method, path, body):
+        time.sleep(self.latency)
+        headers, retry_after = self._rate_limit()
+        if retry_after:
+            self.requests.append((method, path, 429))
+            return 429, {'Retry-After': f"{retry_after:.3f}"}, {'message': 'You are being rate limited.',
+                                                                   'retry_after': retry_after, 'global': False}
+        match = re.match(r'^(/api/v10/applications/\d+(?:/guilds/\d+)?/commands)(?:/(\d+))?$', path)
+        if not match:
+            self.requests.append((method, path, 404))
+            return 404, headers, {'message': '404: Not Found'}
+        scope, command_id = match.groups()
+        with self._lock:
+            commands = self.commands.setdefault(scope, {})
+            status, payload = 200, None
+            if method == 'GET' and not command_id:
+                payload = list(commands.values())
+            elif method == 'PUT' and not command_id:
+                by_name = {command['name']: command_id for command_id, command in commands.items()}
+                replaced = {}
+                for command in body:
+                    new_id = by_name.get(command['name']) or str(next(self._ids))
+                    replaced[new_id] = self._stored(command, new_id, scope)
+                self.commands[scope] = replaced
+                payload = list(replaced.values())
+            elif method == 'POST' and not command_id:
+                existing = next((i for i, command in commands.items() if command['name'] == body['name']), None)
+                new_id = existing or str(next(self._ids))
+                commands[new_id] = payload = self._stored(body, new_id, scope)
+                status = 200 if existing else 201
+            elif method == 'PATCH' and command_id in commands:
+                commands[command_id] = payload = self._stored({**commands[command_id], **body}, command_id, scope)
+            elif method == 'DELETE' and command_id in commands:
+                del commands[command_id]
+                status = 204
+            else:
+                status, payload = 404, {'message': 'Unknown application command', 'code': 10063}
+            self.requests.append((method, path, status))
+        return status, headers, payload
+
+
+class FakeWebhook:
+    """
+    Threaded HTTP server on 127.0.0.1 standing in for the interaction webhook endpoints (PATCH
+    .../messages/@original and follow-up POSTs). Records (method, path, content, arrival time in
+    time.perf_counter() seconds). Every request waits latency seconds. api_base is the URL to
+    pass as DISCORD_API_BASE.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(fake.latency)
+                fake.requests.append((self.command, self.path, body['content'], time.perf_counter()))
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            do_PATCH = do_POST = _handle
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.api_base = f"http://127.0.0.1:{self._server.server_address[1]}/api/v10"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
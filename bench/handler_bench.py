@@ -0,0 +1,360 @@
+"""
+End-to-end benchmark of lambda_handler against fake AWS, Discord and Minecraft services.
+
+Every scenario sends a Discord interaction signed with a throwaway Ed25519 key through
+lambda_handler, the same way API Gateway does. EC2, SSM and Lambda are served by
+FakeAwsAccount (injected per-call latency and optional throttling), and the instance's public
+IP points at local FakeMinecraftServer and FakeRconServer instances. Commands run inline
+(DEFERRED_MODE=off) so the measured time is the full work of the command.
+
+Each scenario is measured cold (lambda_function re-imported before the request, so module
+init with its SSM call is included) and warm (the same module serving request after request).
+Python, boto3 and pynacl imports are not part of the cold numbers.
+
+The report lists p50/p95/p99 latency and AWS calls per invocation. With --baseline, the run
+fails (exit status 1) when a scenario's p50 or p95 gets slower than the baseline by more
+than --tolerance (plus --slack-ms), or when it makes more AWS calls.
+
+Usage:
+    python bench/handler_bench.py                       # compare against bench/handler_baseline.json
+    python bench/handler_bench.py --write-baseline      # record a new baseline
+    python bench/handler_bench.py --scenario status --warm-runs 50 --throttle-every 7
+Requires boto3 and pynacl (pip install boto3 pynacl).
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from unittest import mock
+
+import boto3
+from nacl.signing import SigningKey
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot'), os.path.join(ROOT, 'ec2', 'scripts')]
+
+from fakes import FakeAwsAccount, FakeMinecraftServer, FakeRconServer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'handler_baseline.json')
+# Modules re-imported for every cold start
+BOT_MODULES = ['lambda_function', 'metrics', 'fleet_state', 'server_ping', 'rcon', 'status_cache', 'servers',
+               'command_output']
+
+# Fixed seed so the signed payloads are reproducible. Never use this key for a real application.
+SIGNING_KEY = SigningKey(b'minecraft-bot-benchmark-key-0001')
+ADMIN_USER = '100000000000000001'
+PLAYER_USER = '100000000000000002'
+FLEET_ID = 'fleet-00000000-0000-0000-0000-000000000000'
+INSTANCE_ID = 'i-0123456789abcdef0'
+EIP_ALLOCATION_ID = 'eipalloc-0a1b2c3d'
+RCON_PASSWORD = 'benchmark'
+
+
+def signed_event(body, timestamp='1700000000', key=SIGNING_KEY):
+    """Builds the API Gateway event for an interaction body signed like Discord does."""
+    body = json.dumps(body)
+    signature = key.sign(f'{timestamp}{body}'.encode()).signature.hex()
+    return {
+        'headers': {'x-signature-ed25519': signature, 'x-signature-timestamp': timestamp},
+        'body': body
+    }
+
+
+def command_event(command, options=None, user_id=ADMIN_USER):
+    return signed_event({
+        'type': 2,
+        'application_id': '200000000000000000',
+        'token': 'benchmark-interaction-token',
+        'member': {'user': {'id': user_id}},
+        'data': {'name': command, 'options': options or []}
+    })
+
+
+def base_parameters():
+    return {
+        '/minecraft/discord_public_key': SIGNING_KEY.verify_key.encode().hex(),
+        '/minecraft/fleet_id': FLEET_ID,
+        '/minecraft/eip_allocation_id': EIP_ALLOCATION_ID,
+        '/minecraft/rcon_password': RCON_PASSWORD
+    }
+
+
+def running_server(account):
+    account.reset(base_parameters())
+    account.add_instance(INSTANCE_ID, tags={'minecraft:jvm-profile': 'g1-aikar-small, 3040 MB heap (3800 MB, 2 vCPU)'})
+    account.add_fleet(FLEET_ID, capacity=1, instance_ids=[INSTANCE_ID])
+
+
+def stopped_server(account):
+    account.reset(base_parameters())
+    account.add_fleet(FLEET_ID, capacity=0)
+
+
+def deleted_fleet(account):
+    account.reset(base_parameters())
+    account.add_fleet(FLEET_ID, state='deleted', capacity=0)
+
+
+def several_servers(count):
+    """Account setup for `count` servers under their own SSM namespaces. Every fourth one is stopped."""
+    def setup(account):
+        parameters = {'/minecraft/discord_public_key': SIGNING_KEY.verify_key.encode().hex()}
+        for index in range(count):
+            server, fleet_id = f"world{index}", f"fleet-{index:08d}-0000-0000-0000-000000000000"
+            parameters.update({
+                f"/minecraft/{server}/fleet_id": fleet_id,
+                f"/minecraft/{server}/eip_allocation_id": f"eipalloc-{index:08x}",
+                f"/minecraft/{server}/rcon_password": RCON_PASSWORD
+            })
+        account.reset(parameters)
+        for index in range(count):
+            fleet_id = f"fleet-{index:08d}-0000-0000-0000-000000000000"
+            if index % 4 == 3:
+                account.add_fleet(fleet_id, capacity=0)
+                continue
+            instance_id = f"i-{index:017x}"
+            account.add_instance(instance_id, tags={'minecraft:server': f"world{index}"})
+            account.add_fleet(fleet_id, capacity=1, instance_ids=[instance_id])
+    return setup
+
+
+def servers_env(count):
+    return {'SERVERS': ','.join(f"world{index}" for index in range(count))}
+
+
+# Public key passed through the environment instead of SSM
+ENV_PUBLIC_KEY = {'DISCORD_PUBLIC_KEY': SIGNING_KEY.verify_key.encode().hex()}
+
+# name -> (event factory, account setup, lambda_function attributes to override[, environment variables])
+SCENARIOS = {
+    'ping': (lambda: signed_event({'type': 1}), running_server, {}),
+    'ping_env_key': (lambda: signed_event({'type': 1}), running_server, {}, ENV_PUBLIC_KEY),
+    'bad_signature': (lambda: signed_event({'type': 1}, key=SigningKey(b'not-the-bots-key-000000000000000')), running_server, {}),
+    'bad_signature_env_key': (lambda: signed_event({'type': 1}, key=SigningKey(b'not-the-bots-key-000000000000000')),
+                              running_server, {}, ENV_PUBLIC_KEY),
+    'help': (lambda: command_event('help'), running_server, {}),
+    'status': (lambda: command_event('status'), running_server, {'STATUS_CACHE_TTL': 0}),
+    # Warm requests within the TTL are answered from the shared status cache (the in-memory store here)
+    'status_cached': (lambda: command_event('status'), running_server, {'STATUS_CACHE_TTL': 10}),
+    # Overview of several servers: batched describe calls and parallel pings, so 12 servers take about as long as 4
+    'status_all_4': (lambda: command_event('status', [{'name': 'server', 'value': 'all'}]), several_servers(4), {},
+                     servers_env(4)),
+    'status_all_12': (lambda: command_event('status', [{'name': 'server', 'value': 'all'}]), several_servers(12), {},
+                      servers_env(12)),
+    'status_other_server': (lambda: command_event('status', [{'name': 'server', 'value': 'world2'}]), several_servers(4),
+                            {'STATUS_CACHE_TTL': 0}, servers_env(4)),
+    'start': (lambda: command_event('start'), stopped_server, {}),
+    'start_fleet': (lambda: command_event('start_fleet'), deleted_fleet, {}),
+    'stop_fleet': (lambda: command_event('stop_fleet'), running_server, {}),
+    'command_ssm': (lambda: command_event('command', [{'name': 'command', 'value': 'list'}]), running_server,
+                    {'RCON_TRANSPORT': 'ssm'}),
+    'command_direct': (lambda: command_event('command', [{'name': 'command', 'value': 'list'}]), running_server,
+                       {'RCON_TRANSPORT': 'direct'}),
+    'command_large_output': (lambda: command_event('command', [{'name': 'command', 'value': 'datapack list'}]),
+                             running_server, {'RCON_TRANSPORT': 'ssm'}),
+    'backup': (lambda: command_event('backup'), running_server, {}),
+    'perf': (lambda: command_event('perf', [{'name': 'minutes', 'value': 30}]), running_server, {}),
+    'unauthorized': (lambda: command_event('stop_fleet', user_id=PLAYER_USER), running_server, {}),
+}
+
+
+def instance_command_output(command):
+    """Output of the SSM Run Commands the bot sends to the instance."""
+    if 'world_backup.py' in command:
+        return ("{}\nBackup 20260101T000000Z: 812 files, 950.2 MB (790 unchanged), "
+                "uploaded 31/3822 blocks (7.9 MB) in 2.4s\n")
+    if 'perf.json' in command:
+        now = int(time.time())
+        fields = ['t', 'tps', 'mspt', 'mspt_p95', 'players', 'chunks', 'heap_mb', 'heap_max_mb', 'gc_ms', 'rss_mb']
+        samples = [[now - 15 * (239 - i), 20.0, 6.0 + i % 7, 9.5, 3, None, 1400 + i, 3040, 40.0, 3600] for i in range(240)]
+        return json.dumps({'v': 1, 'interval': 15, 'source': 'tick query', 'fields': fields, 'samples': samples},
+                          separators=(',', ':'))
+    if 'datapack' in command:
+        # Far over the 24,000 characters SSM returns: read from CloudWatch until the page cap
+        return ''.join(f"\x1b[32m[{i:04d}]\x1b[0m file/bench_pack_{i:04d} (world) enabled with features\n" for i in range(3000))
+    return "There are 0 of a max of 20 players online: "
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Bench:
+    """Runs scenarios against a fresh or warm lambda_function wired to the fakes."""
+
+    def __init__(self, account, minecraft_port, rcon_port, verbose=False):
+        self.account = account
+        self.minecraft_port = minecraft_port
+        self.rcon_port = rcon_port
+        self.verbose = verbose
+        self.module = None
+
+    def output(self):
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def load(self):
+        """(Re)imports lambda_function with boto3 clients from the fake account, like a cold start."""
+        for name in BOT_MODULES:
+            sys.modules.pop(name, None)
+        with self.output():
+            module = importlib.import_module('lambda_function')
+        module.server_port = self.minecraft_port
+        module.RCON_PORT = self.rcon_port
+        module.AUTHORIZED_USERS = [ADMIN_USER]
+        self.module = module
+
+    def invoke(self, scenario, cold):
+        """Runs one request. Returns (milliseconds, AWS calls, status code)."""
+        make_event, setup, overrides, *env = SCENARIOS[scenario]
+        setup(self.account)
+        event = make_event()
+        calls_before = len(self.account.calls)
+
+        with mock.patch.dict(os.environ, env[0] if env else {}):
+            started = time.perf_counter()
+            if cold or self.module is None:
+                self.load()
+            for name, value in overrides.items():
+                setattr(self.module, name, value)
+            with self.output():
+                response = self.module.lambda_handler(event, None)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        if self.verbose:
+            print(f"Response: {response}")
+        return elapsed_ms, len(self.account.calls) - calls_before, response['statusCode']
+
+    def measure(self, scenario, cold, runs):
+        durations, calls, statuses = [], [], set()
+        if not cold:
+            # Prime the module and its caches before measuring warm requests
+            self.invoke(scenario, cold=False)
+        for _ in range(runs):
+            elapsed_ms, call_count, status = self.invoke(scenario, cold)
+            durations.append(elapsed_ms)
+            calls.append(call_count)
+            statuses.add(status)
+        durations.sort()
+        return {
+            'runs': runs,
+            'p50': round(percentile(durations, 50), 1),
+            'p95': round(percentile(durations, 95), 1),
+            'p99': round(percentile(durations, 99), 1),
+            'aws_calls': round(sum(calls) / runs, 2),
+            'status_codes': sorted(statuses)
+        }
+
+
+def compare(results, baseline, tolerance, slack_ms):
+    """Returns the list of regressions of results against the baseline results."""
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for field in ['p50', 'p95']:
+            limit = expected[field] * (1 + tolerance) + slack_ms
+            if result[field] > limit:
+                regressions.append(f"{key}: {field} {result[field]:.1f} ms > {limit:.1f} ms (baseline {expected[field]:.1f} ms)")
+        if result['aws_calls'] > expected['aws_calls']:
+            regressions.append(f"{key}: {result['aws_calls']} AWS calls > baseline {expected['aws_calls']}")
+        if result['status_codes'] != expected['status_codes']:
+            regressions.append(f"{key}: status codes {result['status_codes']} != baseline {expected['status_codes']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Run only these scenarios (repeatable)")
+    parser.add_argument('--warm-runs', type=int, default=20)
+    parser.add_argument('--cold-runs', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=30, help="Injected latency per AWS call")
+    parser.add_argument('--throttle-every', type=int, default=0, help="Throttle every Nth AWS call once (0 disables)")
+    parser.add_argument('--throttle-backoff-ms', type=float, default=50, help="Retry backoff paid by a throttled call")
+    parser.add_argument('--command-ms', type=float, default=300, help="Time an SSM Run Command takes on the instance")
+    parser.add_argument('--ping-ms', type=float, default=20, help="Server List Ping delay of the fake Minecraft server")
+    parser.add_argument('--rcon-ms', type=float, default=10, help="Command delay of the fake RCON server")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument('--write-baseline', action='store_true', help="Save the results as the new baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown before failing")
+    parser.add_argument('--slack-ms', type=float, default=15, help="Allowed absolute slowdown on top of --tolerance")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's own log output")
+    args = parser.parse_args()
+
+    settings = {
+        'latency_ms': args.latency_ms,
+        'throttle_every': args.throttle_every,
+        'throttle_backoff_ms': args.throttle_backoff_ms,
+        'command_ms': args.command_ms,
+        'ping_ms': args.ping_ms,
+        'rcon_ms': args.rcon_ms
+    }
+    args.baseline = os.path.abspath(args.baseline)
+    args.json = args.json and os.path.abspath(args.json)
+    os.environ['DEFERRED_MODE'] = 'off'
+    # start_fleet reads createFleet.json from the working directory, like it does in the Lambda package
+    os.chdir(os.path.join(ROOT, 'awsInfra'))
+
+    account = FakeAwsAccount(
+        latency=args.latency_ms / 1000,
+        throttle_every=args.throttle_every,
+        throttle_backoff=args.throttle_backoff_ms / 1000,
+        command_duration=args.command_ms / 1000,
+        command_output=instance_command_output
+    )
+    # The bot creates its clients on first use, so every boto3.client call of the run goes to the fake account
+    mock.patch.object(boto3, 'client', side_effect=account.client).start()
+    scenarios = args.scenario or list(SCENARIOS)
+    results = {}
+    with FakeMinecraftServer(players_online=2, motd='bench', delay=args.ping_ms / 1000) as minecraft, \
+            FakeRconServer(password=RCON_PASSWORD, delay=args.rcon_ms / 1000) as rcon:
+        bench = Bench(account, minecraft.port, rcon.port, args.verbose)
+        print(f"{'scenario':<28}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'AWS calls':>11}  status")
+        for scenario in scenarios:
+            for mode, cold, runs in [('cold', True, args.cold_runs), ('warm', False, args.warm_runs)]:
+                result = bench.measure(scenario, cold, runs)
+                key = f"{scenario}/{mode}"
+                results[key] = result
+                print(f"{key:<28}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                      f"{result['aws_calls']:>11}  {','.join(map(str, result['status_codes']))}")
+    if account.throttled:
+        print(f"Throttled calls: {account.throttled} of {len(account.calls)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+
+    if args.write_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}. Run with --write-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings:
+        print(f"Baseline was recorded with different settings ({baseline['settings']}). Not comparing.")
+        return 1
+
+    regressions = compare(results, baseline['results'], args.tolerance, args.slack_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        return 1
+    print(f"No regressions against {os.path.relpath(args.baseline, ROOT)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Import-time check for the Lambda package (python -X importtime).
+
+Imports lambda_function in a fresh interpreter with DISCORD_PUBLIC_KEY set, answers a signed
+PING and a request with a bad signature, and fails (exit status 1) if:
+  * boto3 or botocore was imported by then (those paths must not touch AWS), or
+  * the cumulative import time of lambda_function is above --budget-ms.
+
+The best of --runs interpreters is used, and the modules with the highest self time are listed.
+
+Usage: python bench/import_time.py [--budget-ms 120] [--runs 5] [--top 10]
+Requires pynacl (pip install pynacl). boto3 is not needed.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FORBIDDEN_MODULES = ['boto3', 'botocore']
+
+# Runs in the child interpreter. lambda_function is imported first so its import is measured alone.
+CHILD_SCRIPT = """
+import json, sys
+import lambda_function
+from nacl.signing import SigningKey
+
+key = SigningKey(bytes.fromhex(sys.argv[1]))
+def event(signing_key):
+    body = json.dumps({'type': 1})
+    signature = signing_key.sign(('1700000000' + body).encode()).signature.hex()
+    return {'headers': {'x-signature-ed25519': signature, 'x-signature-timestamp': '1700000000'}, 'body': body}
+
+ping = lambda_function.lambda_handler(event(key), None)
+rejected = lambda_function.lambda_handler(event(SigningKey(bytes(32))), None)
+print('RESULT ' + json.dumps({
+    'ping': ping['statusCode'],
+    'rejected': rejected['statusCode'],
+    'modules': sorted(sys.modules)
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Parses -X importtime output into {module: (self_us, cumulative_us)}."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def run_once():
+    seed = bytes(range(32))
+    from nacl.signing import SigningKey
+    public_key = SigningKey(seed).verify_key.encode().hex()
+    env = {
+        **os.environ,
+        'DISCORD_PUBLIC_KEY': public_key,
+        'PYTHONPATH': os.pathsep.join([os.path.join(ROOT, 'DiscordBot'), os.path.join(ROOT, 'ec2', 'scripts')]),
+        'PYTHONDONTWRITEBYTECODE': '1'
+    }
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT, seed.hex()],
+                             env=env, capture_output=True, text=True, check=True)
+    result_line = next(line for line in process.stdout.splitlines() if line.startswith('RESULT '))
+    return json.loads(result_line[len('RESULT '):]), parse_importtime(process.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=120, help="Maximum cumulative import time of lambda_function")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="Number of slowest modules to list")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        result, times = run_once()
+        if best is None or times['lambda_function'][1] < best[1]['lambda_function'][1]:
+            best = (result, times)
+    result, times = best
+
+    cumulative_ms = times['lambda_function'][1] / 1000
+    print(f"lambda_function import: {cumulative_ms:.1f} ms cumulative (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("Slowest modules by self time:")
+    for name, (self_us, _) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:7.1f} ms  {name}")
+
+    failures = []
+    if result['ping'] != 200 or result['rejected'] != 401:
+        failures.append(f"unexpected status codes: PING {result['ping']}, bad signature {result['rejected']}")
+    loaded = [name for name in result['modules'] if name.split('.')[0] in FORBIDDEN_MODULES]
+    if loaded:
+        failures.append(f"PING/401 paths imported {', '.join(sorted({name.split('.')[0] for name in loaded}))}")
+    if cumulative_ms > args.budget_ms:
+        failures.append(f"import took {cumulative_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Benchmarks ec2/scripts/perf_sampler.py against a local fake RCON server and renders /perf.
+
+The fake server answers vanilla `tick query`, Paper `tps`/`mspt`/`paper chunkinfo` or
+Forge `forge tps` (--flavor), with an optional per-command delay, and its tick times
+include a lag spike. The bench:
+  * times one sample over the sampler's persistent connection against running the same
+    commands as separate `rcon.py` calls would (one connection each), and checks that the
+    server, which like vanilla parses one packet per read, never had to drop a packet,
+  * fills the ring buffer, checks that it stays at its fixed size and that the published
+    file fits in the SSM output limit the bot reads it through, and
+  * renders the /perf message from the file (percentiles and sparkline).
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/perf_sampler_bench.py [--flavor vanilla|paper|forge] [--samples 300] [--rcon-delay-ms 2]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot'), os.path.join(ROOT, 'ec2', 'scripts')]
+
+from fakes import FakeRconServer  # noqa: E402
+from perf_report import format_perf_report  # noqa: E402
+from perf_sampler import PerfSampler, parse_perf_counters  # noqa: E402
+from rcon import RconClient  # noqa: E402
+
+PASSWORD = 'bench-password'
+# get_command_invocation returns at most this many characters of standard output
+SSM_OUTPUT_LIMIT = 24000
+UNKNOWN = "Unknown or incomplete command, see below for error"
+
+
+class FakeTicks:
+    """Tick times of a server with a lag spike between two sample numbers."""
+
+    def __init__(self, flavor, rng, spike=(120, 130)):
+        self.flavor = flavor
+        self.rng = rng
+        self.spike = spike
+        self.samples = 0
+
+    def mspt(self):
+        low, high = self.spike
+        return self.rng.uniform(70, 140) if low <= self.samples < high else self.rng.uniform(4, 12)
+
+    def answer(self, command):
+        if command == 'list':
+            self.samples += 1
+            return f"There are {min(self.samples // 40, 5)} of a max of 20 players online: "
+        mspt = self.mspt()
+        if self.flavor == 'vanilla' and command == 'tick query':
+            return (f"The game is running normallyTarget tick rate: 20.0 per second.Average time per tick: {mspt:.1f}ms "
+                    f"(Target: 50.0ms)Percentiles: P50: {mspt:.1f}ms P95: {mspt * 1.4:.1f}ms P99: {mspt * 2:.1f}ms, sample: 100")
+        if self.flavor == 'paper':
+            if command == 'tps':
+                return f"§6TPS from last 1m, 5m, 15m: §a{min(20.0, 1000 / mspt):.2f}, §a20.0, §a20.0"
+            if command == 'mspt':
+                return (f"§6Server tick times §e(§7avg§e/§7min§e/§7max§e)§6 from last 5s§7,§6 10s§7,§6 1m§e:\n"
+                        f"§6◴ §a{mspt:.1f}§7/§a{mspt / 2:.1f}§7/§a{mspt * 1.5:.1f}§e, §a5.0§7/§a1.0§7/§a9.0")
+            if command == 'paper chunkinfo *':
+                return f"Chunks in §aworld§r: Total: §a{900 + self.samples * 3}§r Inactive: 0 Full: 400"
+        if self.flavor == 'forge' and command == 'forge tps':
+            return f"Overall: Mean tick time: {mspt:.3f} ms. Mean TPS: {min(20.0, 1000 / mspt):.3f}"
+        return UNKNOWN
+
+
+def fake_jvm(pid, heap=[600]):
+    heap[0] = (heap[0] + 37) % 2400 + 300
+    counters = (f"sun.os.hrt.frequency=1000000000\nsun.gc.collector.0.time={int(time.time() * 1e7)}\n"
+                f"sun.gc.generation.0.space.0.used={heap[0] * 2**20}\nsun.gc.generation.0.maxCapacity={3040 * 2**20}\n")
+    stats = parse_perf_counters(counters)
+    stats['rss_mb'] = 3600
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--flavor', choices=['vanilla', 'paper', 'forge'], default='vanilla')
+    parser.add_argument('--samples', type=int, default=300)
+    parser.add_argument('--size', type=int, default=240, help="Ring buffer size")
+    parser.add_argument('--rcon-delay-ms', type=float, default=2, help="Server-side delay per RCON command")
+    args = parser.parse_args()
+
+    rng = random.Random(99)
+    ticks = FakeTicks(args.flavor, rng)
+    workdir = tempfile.mkdtemp(prefix='perf-bench-')
+    failures = []
+    try:
+        with FakeRconServer(PASSWORD, ticks.answer, delay=args.rcon_delay_ms / 1000) as server:
+            clock = [1_800_000_000.0]
+            sampler = PerfSampler(lambda: RconClient('127.0.0.1', server.port, PASSWORD), interval=15, size=args.size,
+                                  jvm_every=4, pid_lookup=lambda: 4242, jvm_lookup=fake_jvm, clock=lambda: clock[0])
+            path = os.path.join(workdir, 'perf.json')
+            started = time.perf_counter()
+            for _ in range(args.samples):
+                sampler.sample()
+                sampler.save(path)
+                clock[0] += 15
+            per_sample_ms = (time.perf_counter() - started) * 1000 / args.samples
+            commands = sampler.tick_source[0] + ['list'] + (['paper chunkinfo *'] if sampler.paper else [])
+
+            # The same commands the way separate `python3 rcon.py <command>` runs would send them
+            started = time.perf_counter()
+            for _ in range(20):
+                for command in commands:
+                    with RconClient('127.0.0.1', server.port, PASSWORD) as rcon:
+                        rcon.command(command)
+            separate_ms = (time.perf_counter() - started) * 1000 / 20
+
+        print(f"{args.flavor} server, tick source: {' + '.join(sampler.tick_source[0])}, {server.connections} RCON connections")
+        print(f"{'sample, persistent connection':<32}{per_sample_ms:>8.2f} ms (includes writing the file)")
+        print(f"{'same commands, one connection each':<32}{separate_ms:>8.2f} ms")
+
+        if server.dropped_packets:
+            failures.append(f"the server dropped {server.dropped_packets} packets that arrived in the same read as another")
+
+        size = os.path.getsize(path)
+        with open(path) as f:
+            data = json.load(f)
+        print(f"perf.json: {len(data['samples'])} samples, {size / 1024:.1f} KiB (SSM output limit {SSM_OUTPUT_LIMIT / 1000:.0f} kB)")
+        if len(data['samples']) != min(args.samples, args.size):
+            failures.append(f"ring buffer holds {len(data['samples'])} samples, expected {min(args.samples, args.size)}")
+        if size > SSM_OUTPUT_LIMIT:
+            failures.append(f"perf.json is {size} bytes, over the SSM output limit")
+        # The fake RCON server counts the sampler's connection plus one per separate command
+        if server.connections != 1 + 20 * len(commands):
+            failures.append(f"sampler opened {server.connections - 20 * len(commands)} RCON connections, expected 1")
+
+        print()
+        report = format_perf_report(data, 60, now=clock[0])
+        print(report)
+        if 'MSPT' not in report or '█' not in report:
+            failures.append("/perf report is missing the MSPT percentiles or the lag spike in the sparkline")
+    finally:
+        shutil.rmtree(workdir)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
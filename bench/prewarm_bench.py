@@ -0,0 +1,212 @@
+"""
+Checks the prewarm order and budgets of ec2/scripts/world_prewarm.py on a synthetic world.
+
+Builds a server directory with a named world (level-name in server.properties), a level.dat
+with the spawn after other tags, region, entities and poi files of random sizes and
+modification times, and separate nether and end directories the way Spigot and Paper keep
+them. The bench checks that:
+  * the spawn is read from level.dat, in the old SpawnX/SpawnZ and the newer spawn.pos layout,
+  * the overworld regions around the spawn come first, nearest first, each region file before
+    its entities and poi files, and the nether region at the same coordinates does not,
+  * every other file follows, newest first, with empty and unrelated files left out,
+  * the I/O budget cuts the plan at exactly that many bytes, keeping its order,
+  * prewarming reads every planned byte, and stops close to the time budget when reads are slow.
+It also times planning a large world. Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/prewarm_bench.py [--regions 10] [--seed 1]
+"""
+import argparse
+import gzip
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'ec2', 'scripts')]
+
+import world_prewarm  # noqa: E402
+from world_prewarm import REGION_BLOCKS, plan_prewarm, prewarm, read_spawn, world_dirs  # noqa: E402
+
+SPAWN = (-700, 300)
+
+
+def nbt_name(name):
+    encoded = name.encode()
+    return struct.pack('>H', len(encoded)) + encoded
+
+
+def nbt_tag(tag_type, name, payload):
+    return bytes([tag_type]) + nbt_name(name) + payload
+
+
+def write_level_dat(world, spawn, layout):
+    """Writes a gzipped level.dat whose Data compound holds the spawn after tags that have to be skipped."""
+    skipped = (nbt_tag(8, 'LevelName', nbt_name('bench')) + nbt_tag(4, 'Time', struct.pack('>q', 123456)) +
+               nbt_tag(9, 'ServerBrands', bytes([8]) + struct.pack('>i', 2) + nbt_name('vanilla') + nbt_name('paper')) +
+               nbt_tag(10, 'WorldGenSettings', nbt_tag(4, 'seed', struct.pack('>q', 42)) + b'\0'))
+    if layout == 'legacy':
+        spawn_tags = nbt_tag(3, 'SpawnX', struct.pack('>i', spawn[0])) + nbt_tag(3, 'SpawnY', struct.pack('>i', 64)) + \
+            nbt_tag(3, 'SpawnZ', struct.pack('>i', spawn[1]))
+    else:
+        spawn_tags = nbt_tag(10, 'spawn', nbt_tag(8, 'dimension', nbt_name('minecraft:overworld')) +
+                             nbt_tag(11, 'pos', struct.pack('>4i', 3, spawn[0], 64, spawn[1])) + b'\0')
+    data = nbt_tag(10, 'Data', nbt_tag(3, 'DataVersion', struct.pack('>i', 3955)) + skipped + spawn_tags + b'\0')
+    with open(os.path.join(world, 'level.dat'), 'wb') as f:
+        f.write(gzip.compress(nbt_tag(10, '', data + b'\0')))
+
+
+def make_server(server_dir, regions, rng, layout='legacy'):
+    """Writes the synthetic server. Returns {path: (size, mtime)} of the files that should be prewarmed."""
+    with open(os.path.join(server_dir, 'server.properties'), 'w') as f:
+        f.write("#Minecraft server properties\nmotd=bench\nlevel-name=bench_world\n")
+    world = os.path.join(server_dir, 'bench_world')
+    dimensions = [world, os.path.join(world + '_nether', 'DIM-1'), os.path.join(world + '_the_end', 'DIM1')]
+    expected = {}
+    now = time.time()
+    for dimension in dimensions:
+        for data_dir in ('region', 'entities', 'poi'):
+            os.makedirs(os.path.join(dimension, data_dir))
+        for x in range(-regions // 2 - 2, regions // 2 - 2):
+            for z in range(-regions // 2, regions // 2):
+                for data_dir in ('region', 'entities', 'poi'):
+                    if data_dir != 'region' and rng.random() < 0.3:
+                        continue
+                    path = os.path.join(dimension, data_dir, f"r.{x}.{z}.mca")
+                    size = rng.choice([8192, 8192, 65536, rng.randrange(8192, 400_000)])
+                    with open(path, 'wb') as f:
+                        f.write(os.urandom(size))
+                    mtime = now - rng.uniform(0, 90 * 86400)
+                    os.utime(path, (mtime, mtime))
+                    expected[path] = (size, mtime)
+        # Empty region files (the game leaves them behind) and other files are never read
+        open(os.path.join(dimension, 'region', 'r.99.99.mca'), 'wb').close()
+        with open(os.path.join(dimension, 'region', 'r.0.0.mca.tmp'), 'wb') as f:
+            f.write(b'x' * 8192)
+    write_level_dat(world, SPAWN, layout)
+    return expected
+
+
+def spawn_distance(path, spawn):
+    x, z = (int(part) for part in os.path.basename(path).split('.')[1:3])
+    return max(abs(x - spawn[0] // REGION_BLOCKS), abs(z - spawn[1] // REGION_BLOCKS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--regions', type=int, default=10, help="Regions per side of every dimension")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    failures = []
+
+    def check(name, condition, detail):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}: {detail}")
+        if not condition:
+            failures.append(name)
+
+    base = tempfile.mkdtemp(prefix='prewarm-bench-')
+    try:
+        server_dir = os.path.join(base, 'server')
+        os.makedirs(server_dir)
+        expected = make_server(server_dir, args.regions, rng)
+        dirs = world_dirs(server_dir)
+        world = dirs[0]
+        check('world directories', [os.path.basename(path) for path in dirs] ==
+              ['bench_world', 'bench_world_nether', 'bench_world_the_end'], ', '.join(map(os.path.basename, dirs)))
+
+        new_layout = os.path.join(base, 'new_layout')
+        os.makedirs(new_layout)
+        write_level_dat(new_layout, (1000, -1000), 'pos')
+        spawns = (read_spawn(world), read_spawn(new_layout))
+        check('spawn from level.dat', spawns == (SPAWN, (1000, -1000)), f"SpawnX/SpawnZ {spawns[0]}, spawn.pos {spawns[1]}")
+
+        started = time.perf_counter()
+        plan = plan_prewarm(dirs, spawn_radius=1)
+        plan_ms = (time.perf_counter() - started) * 1000
+        paths = [path for path, _, _ in plan]
+        spawn_entries = [(path, reason) for path, _, reason in plan if reason == 'spawn']
+        leading = paths[:len(spawn_entries)]
+        distances = [spawn_distance(path, SPAWN) for path in leading]
+        in_overworld = all(os.path.dirname(os.path.dirname(path)) == world for path in leading)
+        # Every entities or poi file comes after the region file of the same region
+        region_first = all(leading.index(os.path.join(world, 'region', os.path.basename(path))) < index
+                           for index, path in enumerate(leading) if os.path.basename(os.path.dirname(path)) != 'region')
+        expected_spawn = sum(1 for path in expected
+                             if os.path.dirname(os.path.dirname(path)) == world and spawn_distance(path, SPAWN) <= 1)
+        check('spawn regions first', [reason for _, _, reason in plan[:len(spawn_entries)]] == ['spawn'] * len(spawn_entries)
+              and len(spawn_entries) == expected_spawn and distances == sorted(distances) and distances[0] == 0
+              and in_overworld and region_first,
+              f"{len(spawn_entries)} files within 1 region of the spawn, distances {distances[0]}..{distances[-1]}")
+
+        rest = [expected[path][1] for path in paths[len(spawn_entries):]]
+        check('then newest first', rest == sorted(rest, reverse=True) and sorted(paths) == sorted(expected)
+              and [length for _, length, _ in plan] == [expected[path][0] for path in paths],
+              f"{len(rest)} more files by modification time, {len(plan)} of {len(expected)} expected files planned, "
+              f"planned in {plan_ms:.1f} ms")
+
+        total = sum(length for _, length, _ in plan)
+        budget = total // 3 + 12345
+        budgeted = plan_prewarm(dirs, spawn_radius=1, budget_bytes=budget)
+        prefix = [path for path, _, _ in budgeted] == paths[:len(budgeted)]
+        check('I/O budget', sum(length for _, length, _ in budgeted) == budget and prefix,
+              f"{budget / 1e6:.2f} of {total / 1e6:.2f} MB -> {len(budgeted)} files, order kept: {prefix}")
+
+        stats = prewarm(plan, budget_seconds=60, workers=8)
+        check('reads everything', stats['bytes'] == total and stats['files'] == len(plan) and stats['complete'],
+              f"{stats['files']} files, {stats['bytes'] / 1e6:.1f} MB in {stats['seconds']:.2f}s "
+              f"({stats['spawn_files']} around the spawn; page cache, not a cold volume)")
+
+        stats = prewarm(budgeted, budget_seconds=60, workers=8)
+        check('reads the I/O budget', stats['bytes'] == budget and stats['complete'],
+              f"{stats['bytes'] / 1e6:.2f} MB read")
+
+        # Slow every file down to 20 ms so the time budget runs out part way
+        read_file = world_prewarm.prewarm_file
+
+        def slow_file(path, length, deadline, buffer):
+            time.sleep(0.02)
+            return read_file(path, length, deadline, buffer)
+
+        world_prewarm.prewarm_file = slow_file
+        try:
+            stats = prewarm(plan, budget_seconds=0.2, workers=4)
+        finally:
+            world_prewarm.prewarm_file = read_file
+        check('time budget', not stats['complete'] and 0 < stats['files'] < len(plan) and stats['seconds'] < 0.5,
+              f"stopped after {stats['seconds']:.2f}s with {stats['files']} of {len(plan)} files read")
+
+        output = subprocess.run([sys.executable, os.path.join(ROOT, 'ec2', 'scripts', 'world_prewarm.py'),
+                                 '--server-dir', server_dir, '--budget-mb', '1'], capture_output=True, text=True)
+        check('command line', output.returncode == 0 and 'Prewarmed' in output.stdout and '1.0 MB' in output.stdout,
+              output.stdout.strip().splitlines()[-1] if output.stdout.strip() else output.stderr.strip())
+
+        # A large world (about 25,000 files): planning must stay well below the time budget
+        large = os.path.join(base, 'large')
+        os.makedirs(large)
+        region_dir = os.path.join(large, 'world', 'region')
+        os.makedirs(region_dir)
+        for x in range(-80, 80):
+            for z in range(-80, 80):
+                with open(os.path.join(region_dir, f"r.{x}.{z}.mca"), 'wb') as f:
+                    f.write(b'\0')
+        started = time.perf_counter()
+        large_plan = plan_prewarm(world_dirs(large), spawn=(0, 0), spawn_radius=2)
+        seconds = time.perf_counter() - started
+        check('planning a large world', len(large_plan) == 160 * 160 and seconds < 2,
+              f"{len(large_plan)} files planned in {seconds * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(base)
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Benchmarks and checks ec2/scripts/region_pruner.py on synthetic Anvil region files.
+
+Builds a world of region files (with matching entities/ region files) whose chunks hold
+block-state sections and a random InhabitedTime, some in the pre-1.18 'Level' layout, then:
+  * times the early-exit InhabitedTime scan against inflating and walking every chunk fully,
+  * times the analysis with one worker and with the process pool,
+  * runs a dry run (no file may change) and a real prune, and
+  * checks that exactly the chunks below the threshold were dropped from the region and
+    entities files, that the kept chunks are byte-identical, and that pruning refuses to run
+    while another process holds session.lock.
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/region_bench.py [--regions 16] [--chunks 300] [--threshold 1200] [--workers 4]
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'ec2', 'scripts')]
+
+import region_pruner  # noqa: E402
+from region_pruner import (SECTOR_SIZE, PrunerError, analyze_world, find_regions, read_header,  # noqa: E402
+                           read_inhabited_time)
+
+HOLD_LOCK_SCRIPT = """
+import fcntl, sys, time
+with open(sys.argv[1], 'rb+') as f:
+    fcntl.lockf(f, fcntl.LOCK_EX)
+    print('locked', flush=True)
+    time.sleep(60)
+"""
+
+
+def nbt_name(name):
+    encoded = name.encode()
+    return struct.pack('>H', len(encoded)) + encoded
+
+
+def nbt_tag(tag_type, name, payload):
+    return bytes([tag_type]) + nbt_name(name) + payload
+
+
+def chunk_nbt(x, z, inhabited, sections, legacy, rng):
+    """Encodes a chunk roughly the way the game does, with InhabitedTime at a random position among its tags."""
+    section_payloads = []
+    for y in range(sections):
+        palette = nbt_tag(9, 'palette', bytes([10]) + struct.pack('>i', 2) + (
+            nbt_tag(8, 'Name', nbt_name('minecraft:stone')) + b'\0' + nbt_tag(8, 'Name', nbt_name('minecraft:air')) + b'\0'))
+        # Mostly-repeating block data compresses like real terrain does
+        longs = bytes(rng.choice((0, 0, 0, 0x11)) for _ in range(256 * 8))
+        states = nbt_tag(10, 'block_states', palette + nbt_tag(12, 'data', struct.pack('>i', 256) + longs) + b'\0')
+        section_payloads.append(nbt_tag(1, 'Y', struct.pack('>b', y - 4)) + states + b'\0')
+    tags = [nbt_tag(3, 'xPos', struct.pack('>i', x)), nbt_tag(3, 'zPos', struct.pack('>i', z)),
+            nbt_tag(8, 'Status', nbt_name('minecraft:full')),
+            nbt_tag(9, 'sections', bytes([10]) + struct.pack('>i', sections) + b''.join(section_payloads))]
+    tags.insert(rng.randrange(len(tags) + 1), nbt_tag(4, 'InhabitedTime', struct.pack('>q', inhabited)))
+    body = b''.join(tags) + b'\0'
+    if legacy:
+        body = nbt_tag(10, 'Level', body) + b'\0'
+    return nbt_tag(10, '', nbt_tag(3, 'DataVersion', struct.pack('>i', 3955)) + body)
+
+
+def write_region(path, chunks):
+    """Writes {index: (compression, payload)} as an Anvil region file."""
+    locations = [0] * 1024
+    data = bytearray()
+    for index, (compression, payload) in sorted(chunks.items()):
+        record = struct.pack('>IB', len(payload) + 1, compression) + payload
+        sectors = -(-len(record) // SECTOR_SIZE)
+        locations[index] = ((2 + len(data) // SECTOR_SIZE) << 8) | sectors
+        data += record.ljust(sectors * SECTOR_SIZE, b'\0')
+    with open(path, 'wb') as f:
+        f.write(struct.pack('>1024I', *locations))
+        f.write(struct.pack('>1024I', *[1700000000 if location else 0 for location in locations]))
+        f.write(data)
+
+
+def make_world(world, regions, chunks_per_region, rng):
+    """Returns {(region name, chunk index): InhabitedTime} for the world it writes."""
+    expected = {}
+    for data_dir in ('region', 'entities'):
+        os.makedirs(os.path.join(world, data_dir))
+    for r in range(regions):
+        name = f"r.{r % 4 - 2}.{r // 4 - 2}.mca"
+        chunks, entities = {}, {}
+        for index in rng.sample(range(1024), chunks_per_region):
+            # Most generated chunks were only flown past; a few are where players live
+            inhabited = rng.choice((0, 0, 0, rng.randrange(1, 1200), rng.randrange(1200, 2_000_000)))
+            payload = chunk_nbt(index % 32, index // 32, inhabited, rng.randrange(4, 12), rng.random() < 0.2, rng)
+            chunks[index] = (2, zlib.compress(payload))
+            entities[index] = (2, zlib.compress(nbt_tag(10, '', nbt_tag(9, 'Entities', bytes([10]) + struct.pack('>i', 0)) + b'\0')))
+            expected[(name, index)] = inhabited
+        write_region(os.path.join(world, 'region', name), chunks)
+        write_region(os.path.join(world, 'entities', name), entities)
+    with open(os.path.join(world, 'session.lock'), 'wb') as f:
+        f.write(b'\xe2\x98\x83')
+    return expected
+
+
+def chunk_records(path):
+    """Returns {chunk index: raw chunk record} of a region file."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        data = f.read()
+    locations, _ = read_header(data)
+    records = {}
+    for index, (sector, count) in enumerate(locations):
+        if sector:
+            (length,) = struct.unpack_from('>I', data, sector * SECTOR_SIZE)
+            records[index] = data[sector * SECTOR_SIZE:sector * SECTOR_SIZE + 4 + length]
+    return records
+
+
+def full_decode_scan(regions):
+    """The baseline: inflate every chunk completely and walk all of its tags."""
+    for path in regions:
+        for record in chunk_records(path).values():
+            payload = zlib.decompress(record[5:])
+            reader = region_pruner.InflateReader(payload, region_pruner.COMPRESSION_NONE)
+            reader.read(1)
+            reader.skip(reader.unpack(region_pruner.USHORT))
+            region_pruner.skip_payload(reader, region_pruner.TAG_COMPOUND)
+
+
+def early_exit_scan(regions):
+    for path in regions:
+        for record in chunk_records(path).values():
+            read_inhabited_time(record[5:], record[4])
+
+
+def tree_digest(root):
+    digests = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            with open(os.path.join(dirpath, name), 'rb') as f:
+                digests[os.path.relpath(os.path.join(dirpath, name), root)] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--regions', type=int, default=16)
+    parser.add_argument('--chunks', type=int, default=300, help="Generated chunks per region file")
+    parser.add_argument('--threshold', type=int, default=1200, help="Prune chunks below this InhabitedTime")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(4321)
+    workdir = tempfile.mkdtemp(prefix='region-bench-')
+    failures = []
+    try:
+        world = os.path.join(workdir, 'world')
+        expected = make_world(world, args.regions, args.chunks, rng)
+        regions = find_regions(world)
+        region_dir = os.path.join(world, 'region')
+        entities_dir = os.path.join(world, 'entities')
+        world_mb = sum(os.path.getsize(path) for path in regions) / 1e6
+        print(f"World: {len(regions)} region files, {len(expected)} chunks, {world_mb:.1f} MB of region data")
+
+        _, full_seconds = timed(full_decode_scan, regions)
+        _, early_seconds = timed(early_exit_scan, regions)
+        print(f"{'full decode scan':<26}{full_seconds:>8.2f} s")
+        print(f"{'early-exit scan':<26}{early_seconds:>8.2f} s  ({full_seconds / early_seconds:.1f}x faster)")
+
+        _, single_seconds = timed(analyze_world, world, workers=1)
+        _, pool_seconds = timed(analyze_world, world, workers=args.workers)
+        print(f"{'analyze, 1 worker':<26}{single_seconds:>8.2f} s")
+        print(f"{f'analyze, {args.workers} workers':<26}{pool_seconds:>8.2f} s")
+
+        before = tree_digest(world)
+        kept_records = {name: chunk_records(os.path.join(region_dir, name)) for name in os.listdir(region_dir)}
+        prunable = {key for key, inhabited in expected.items() if inhabited < args.threshold}
+
+        dry_run = analyze_world(world, args.threshold, dry_run=True, workers=args.workers)
+        if sum(stats['prunable'] for stats in dry_run) != len(prunable):
+            failures.append(f"dry run found {sum(stats['prunable'] for stats in dry_run)} prunable chunks, expected {len(prunable)}")
+        if tree_digest(world) != before:
+            failures.append("dry run changed files")
+
+        holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK_SCRIPT, os.path.join(world, 'session.lock')],
+                                  stdout=subprocess.PIPE, text=True)
+        try:
+            holder.stdout.readline()
+            analyze_world(world, args.threshold, dry_run=False, workers=args.workers)
+            failures.append("pruning ran while session.lock was held")
+        except PrunerError:
+            pass
+        finally:
+            holder.kill()
+            holder.wait()
+        if tree_digest(world) != before:
+            failures.append("refused prune changed files")
+
+        results, prune_seconds = timed(analyze_world, world, args.threshold, dry_run=False, workers=args.workers)
+        pruned_mb = sum(os.path.getsize(path) for path in find_regions(world)) / 1e6
+        print(f"{'prune':<26}{prune_seconds:>8.2f} s  {len(prunable)} chunks dropped, "
+              f"{world_mb:.1f} MB -> {pruned_mb:.1f} MB of region data")
+        print(region_pruner.format_report(results, args.threshold, False).splitlines()[-1])
+
+        for name, records in kept_records.items():
+            remaining = chunk_records(os.path.join(region_dir, name))
+            entities = chunk_records(os.path.join(entities_dir, name))
+            want = {index for index in records if (name, index) not in prunable}
+            if set(remaining) != want or set(entities) != want:
+                failures.append(f"{name}: kept chunks do not match the threshold")
+            if any(remaining[index] != records[index] for index in want & set(remaining)):
+                failures.append(f"{name}: a kept chunk changed")
+        rescan = analyze_world(world, args.threshold, dry_run=True, workers=args.workers)
+        if any(stats['prunable'] for stats in rescan):
+            failures.append("chunks below the threshold remain after pruning")
+    finally:
+        shutil.rmtree(workdir)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Replays recorded /run/minecraft-perf/perf.json traces (bench/fixtures/perf_trace_*.json, one
+sample a minute over one server run) through the restart scheduler's RestartPolicy, checking
+every minute the way ec2/scripts/restart_scheduler.py does on the instance.
+
+Each trace has an expected outcome:
+  * healthy: a 5-minute lag spike on an otherwise fast server must not restart it,
+  * mspt_creep: tick times creeping up as entities accumulate restart it once the median is over budget,
+  * heap_leak: the heap left after GC growing to the maximum restarts it while ticks are still fast,
+  * heap_leak_g1: the same trace with heap_max_mb taken from a G1 PerfCounter dump
+    (bench/fixtures/perfcounter_g1.txt) the way perf_sampler.py reads it, which must still restart,
+  * busy_lag: lag with 6 players online is deferred until they log off, and
+  * busy_forced: lag with players online all evening is restarted anyway after the maximum deferral.
+Fails (exit status 1) if any outcome differs.
+
+Usage: python bench/restart_policy_replay.py [-v]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'ec2', 'scripts'))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+from perf_sampler import parse_perf_counters  # noqa: E402
+from restart_scheduler import RestartPolicy, replay  # noqa: E402
+
+# trace: (restarts?, words in a reason, (earliest, latest) restart minute, other checks on the decisions)
+EXPECTED = {
+    'healthy': (False, None, None, None),
+    'mspt_creep': (True, 'tick time', (200, 280), None),
+    'heap_leak': (True, 'heap after GC', (240, 300), None),
+    'heap_leak_g1': (True, 'heap after GC', (240, 300), None),
+    'busy_lag': (True, 'tick time', (145, 160), 'deferred, then restarted with at most 1 player online'),
+    'busy_forced': (True, 'TPS', (180, 200), 'restarted with players online after the maximum deferral'),
+}
+
+
+def load_trace(name):
+    """Loads a trace. heap_leak_g1 is heap_leak with its heap maximum replaced by the one parsed from the G1 dump."""
+    with open(os.path.join(FIXTURES, f"perf_trace_{name.replace('_g1', '')}.json")) as f:
+        data = json.load(f)
+    if name.endswith('_g1'):
+        with open(os.path.join(FIXTURES, 'perfcounter_g1.txt')) as f:
+            heap_max = parse_perf_counters(f.read())['heap_max_mb']
+        column = data['fields'].index('heap_max_mb')
+        for row in data['samples']:
+            row[column] = heap_max
+    return data
+
+
+def check_extra(name, decisions, policy):
+    actions = [decision.action for _, decision in decisions]
+    last = decisions[-1][1]
+    if name == 'busy_lag':
+        return 'defer' in actions and last.metrics['players'] <= policy.max_players
+    if name == 'busy_forced':
+        return last.metrics['players'] > policy.max_players and \
+            last.metrics['unhealthy_for_s'] >= policy.sustain + policy.max_defer
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print every decision change")
+    args = parser.parse_args()
+
+    failures = []
+    checks = 0
+    elapsed = 0.0
+    print(f"{'trace':<14}{'outcome':<10}{'minute':>7}{'players':>9}  reasons")
+    for name, (restarts, reason, window, extra) in EXPECTED.items():
+        data = load_trace(name)
+        policy = RestartPolicy()
+        started = time.perf_counter()
+        decisions = list(replay(policy, data))
+        elapsed += time.perf_counter() - started
+        checks += len(decisions)
+
+        start = data['samples'][0][0]
+        if args.verbose:
+            previous = None
+            for t, decision in decisions:
+                if decision.action != previous:
+                    print(f"  {(t - start) / 60:>5.0f} min  {json.dumps(decision.to_dict())}")
+                    previous = decision.action
+        t, last = decisions[-1]
+        minute = (t - start) / 60
+        restarted = last.action == 'restart'
+        print(f"{name:<14}{last.action:<10}{minute:>7.0f}{str(last.metrics.get('players', '')):>9}  {'; '.join(last.reasons)}")
+
+        if restarted != restarts:
+            failures.append(f"{name}: expected {'a restart' if restarts else 'no restart'}, got {last.action}")
+            continue
+        if not restarted:
+            continue
+        if reason not in ' '.join(last.reasons):
+            failures.append(f"{name}: expected a restart for '{reason}', got {last.reasons}")
+        if not window[0] <= minute <= window[1]:
+            failures.append(f"{name}: restarted at minute {minute:.0f}, expected between {window[0]} and {window[1]}")
+        if extra and not check_extra(name, decisions, policy):
+            failures.append(f"{name}: expected it to be {extra}")
+
+    print(f"\n{checks} checks in {elapsed * 1000:.1f} ms ({elapsed * 1e6 / checks:.0f} µs per check)")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
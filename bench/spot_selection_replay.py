@@ -0,0 +1,179 @@
+"""
+Replays recorded describe_spot_price_history responses through DiscordBot/spot_selection.py.
+
+Uses bench/fixtures/spot_price_history.json (paginated responses for two Availability Zones)
+and bench/fixtures/spot_advisor.json (Spot Instance Advisor interruption buckets) to:
+  * print the ranking of the candidate types in one zone and across zones,
+  * check that the rewritten createFleet.json request lists the ranked types by priority
+    in the original subnet with capacity-optimized-prioritized allocation,
+  * check that a second /start_fleet within the cache TTL makes no AWS calls, and that
+    selection still works without advisor data and is skipped without candidates, and
+  * time a selection against a stub EC2 client with --latency-ms per call, uncached and cached.
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/spot_selection_replay.py [--latency-ms 40]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot')]
+
+from spot_selection import PRIORITIZED_ALLOCATION_STRATEGY, SpotSelector, apply_ranking, rank_instance_types  # noqa: E402
+
+CANDIDATES = ['t4g.medium', 'c6g.large', 'c7g.large', 'c8g.large', 'm8g.large', 'x2gd.medium']
+# t4g.medium stays the best value in us-east-1a even with its 6-hour price spike averaged in, and c7g.large
+# ranks above the slightly cheaper c6g.large because it is faster. m8g.large has no recorded prices and
+# x2gd has no performance score, so both are left out.
+EXPECTED_ORDER = ['t4g.medium', 'c7g.large', 'c8g.large', 'c6g.large']
+
+
+class RecordedEc2Client:
+    """Answers describe_subnets and describe_spot_price_history from the fixture, with a fixed latency per call."""
+
+    def __init__(self, fixture, latency):
+        self.fixture = fixture
+        self.latency = latency
+        self.calls = []
+
+    def _call(self, name):
+        self.calls.append(name)
+        time.sleep(self.latency)
+
+    def describe_subnets(self, SubnetIds):
+        self._call('describe_subnets')
+        return {'Subnets': [{'SubnetId': subnet_id, 'AvailabilityZone': self.fixture['subnets'][subnet_id]}
+                            for subnet_id in SubnetIds]}
+
+    def describe_spot_price_history(self, InstanceTypes, ProductDescriptions, StartTime, AvailabilityZone=None, NextToken=None):
+        self._call('describe_spot_price_history')
+        zones = [AvailabilityZone] if AvailabilityZone else sorted(self.fixture['responses'])
+        pages = [page for zone in zones for page in self.fixture['responses'][zone]]
+        index = 0 if not NextToken else next(i for i, page in enumerate(pages) if page['NextToken'] == NextToken) + 1
+        page = dict(pages[index])
+        if index + 1 < len(pages) and not page['NextToken']:
+            # Chain the zones' pages together like one paginated response
+            page['NextToken'] = f"zone-{index}"
+            pages[index]['NextToken'] = page['NextToken']
+        page['SpotPriceHistory'] = [entry for entry in page['SpotPriceHistory'] if entry['InstanceType'] in InstanceTypes]
+        return page
+
+
+def load_json(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+def fleet_request(subnets):
+    with open(os.path.join(ROOT, 'awsInfra', 'createFleet.json')) as f:
+        config = json.load(f)
+    template_override = config['LaunchTemplateConfigs'][0]['Overrides'][0]
+    config['LaunchTemplateConfigs'][0]['Overrides'] = [dict(template_override, SubnetId=subnet) for subnet in subnets]
+    return config
+
+
+def all_history(fixture):
+    return [entry for pages in fixture['responses'].values() for page in pages for entry in page['SpotPriceHistory']]
+
+
+def print_ranking(title, ranked):
+    print(title)
+    print(f"  {'type':<14}{'$/h':>9}{'interrupt':>11}{'perf':>7}{'value':>9}")
+    for item in ranked:
+        bucket = item['interruption_bucket']
+        print(f"  {item['instance_type']:<14}{item['price']:>9.4f}{'?' if bucket is None else bucket:>11}"
+              f"{item['performance']:>7.2f}{item['value']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=40, help="Latency of every stub EC2 call")
+    args = parser.parse_args()
+
+    fixture = load_json('spot_price_history.json')
+    advisor = load_json('spot_advisor.json')
+    recorded_at = datetime.fromisoformat(fixture['recorded_at'])
+    window_start = recorded_at - timedelta(hours=24)
+    subnet_a, subnet_b = sorted(fixture['subnets'])
+    failures = []
+
+    zone_a = [entry for entry in all_history(fixture) if entry['AvailabilityZone'] == 'us-east-1a']
+    ranked = rank_instance_types(CANDIDATES, zone_a, advisor, fixture['region'], window_start, recorded_at)
+    print_ranking("Ranking in us-east-1a (24 h window):", ranked)
+    if [item['instance_type'] for item in ranked] != EXPECTED_ORDER:
+        failures.append(f"ranking {[item['instance_type'] for item in ranked]}, expected {EXPECTED_ORDER}")
+    print_ranking("Ranking across both zones:",
+                  rank_instance_types(CANDIDATES, all_history(fixture), advisor, fixture['region'], window_start, recorded_at))
+
+    original = fleet_request([subnet_a])
+    snapshot = json.dumps(original, sort_keys=True)
+    rewritten = apply_ranking(original, ranked)
+    overrides = rewritten['LaunchTemplateConfigs'][0]['Overrides']
+    expected_overrides = [{'InstanceType': t, 'Priority': float(i), 'SubnetId': subnet_a} for i, t in enumerate(EXPECTED_ORDER)]
+    if overrides != expected_overrides:
+        failures.append(f"rewritten overrides {overrides}")
+    if rewritten['SpotOptions']['AllocationStrategy'] != PRIORITIZED_ALLOCATION_STRATEGY:
+        failures.append("allocation strategy was not switched to capacity-optimized-prioritized")
+    if json.dumps(original, sort_keys=True) != snapshot:
+        failures.append("apply_ranking changed the original request")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        client = RecordedEc2Client(fixture, args.latency_ms / 1000)
+        advisor_loads = []
+
+        def load_advisor():
+            advisor_loads.append(1)
+            time.sleep(args.latency_ms / 1000)
+            return advisor
+
+        selector = SpotSelector(client, executor, fixture['region'], CANDIDATES, advisor_loader=load_advisor,
+                                clock=lambda: recorded_at)
+        started = time.perf_counter()
+        config, first = selector.select(fleet_request([subnet_a]))
+        uncached_ms = (time.perf_counter() - started) * 1000
+        uncached_calls = len(client.calls)
+        started = time.perf_counter()
+        _, second = selector.select(fleet_request([subnet_a]))
+        cached_ms = (time.perf_counter() - started) * 1000
+        print(f"select(): {uncached_ms:.1f} ms with {uncached_calls} EC2 calls and {len(advisor_loads)} advisor download, "
+              f"{cached_ms:.1f} ms with {len(client.calls) - uncached_calls} calls when cached")
+        if config['LaunchTemplateConfigs'][0]['Overrides'] != expected_overrides or first != ranked:
+            failures.append("SpotSelector did not produce the expected request")
+        if len(client.calls) != uncached_calls or len(advisor_loads) != 1 or second != first:
+            failures.append("second selection within the cache TTL called AWS again")
+
+        def failing_advisor():
+            raise OSError("network unreachable")
+
+        blind = SpotSelector(RecordedEc2Client(fixture, 0), executor, fixture['region'], CANDIDATES,
+                             advisor_loader=failing_advisor, clock=lambda: recorded_at)
+        _, without_advisor = blind.select(fleet_request([subnet_a]))
+        if len(without_advisor) != len(EXPECTED_ORDER) or any(item['interruption_bucket'] is not None for item in without_advisor):
+            failures.append("selection without advisor data did not fall back to price and performance")
+
+        spread = SpotSelector(RecordedEc2Client(fixture, 0), executor, fixture['region'], CANDIDATES,
+                              advisor_loader=lambda: advisor, clock=lambda: recorded_at)
+        config, _ = spread.select(fleet_request([subnet_a, subnet_b]))
+        if len(config['LaunchTemplateConfigs'][0]['Overrides']) != 2 * len(EXPECTED_ORDER) or 'describe_subnets' in spread.ec2_client.calls:
+            failures.append("multi-zone request was not ranked across zones")
+
+        disabled = SpotSelector(RecordedEc2Client(fixture, 0), executor, fixture['region'], [])
+        request = fleet_request([subnet_a])
+        if disabled.select(request) != (request, []) or disabled.ec2_client.calls:
+            failures.append("selection without candidates changed the request or called AWS")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
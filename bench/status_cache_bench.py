@@ -0,0 +1,189 @@
+"""
+Benchmarks the shared /status cache (ec2/scripts/status_cache.py) under concurrent requests.
+
+Every simulated Lambda invocation runs on its own thread with its own StatusCache, and all of
+them share one MemoryStatusStore whose operations are slowed down to a DynamoDB round trip
+(--store-ms). The refresh stands in for status_fleet's describe calls and server ping (--refresh-ms).
+The bench checks that:
+  * a burst of concurrent /status requests on an empty cache runs a single refresh,
+  * a second burst within the TTL runs none,
+  * the requests that wait for that refresh read the store only a few times each, also while
+    a slow refresh (--slow-refresh-ms, a throttled describe call) keeps them waiting,
+  * an invalidation while a refresh is in flight keeps that refresh's result out of the cache, and
+  * when the refreshing invocation fails, a waiting one takes over instead of every request failing.
+Fails (exit status 1) if any check does not hold.
+
+Usage: python bench/status_cache_bench.py [--requests 8] [--refresh-ms 400] [--store-ms 5] [--max-reads 8]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'ec2', 'scripts'))
+
+from status_cache import MemoryStatusStore, StatusCache, STATUS_KEY  # noqa: E402
+
+TTL = 10
+
+
+class SlowStore:
+    """Wraps a store so every operation takes a network round trip, counting the operations by name."""
+
+    def __init__(self, store, latency):
+        self.store = store
+        self.latency = latency
+        self.operations = 0
+        self.counts = {}
+
+    def __getattr__(self, name):
+        operation = getattr(self.store, name)
+
+        def call(*args):
+            self.operations += 1
+            self.counts[name] = self.counts.get(name, 0) + 1
+            time.sleep(self.latency)
+            return operation(*args)
+        return call
+
+
+class FakeStatus:
+    """Builds a numbered status message in refresh_ms, like status_fleet's AWS calls and ping."""
+
+    def __init__(self, refresh_ms):
+        self.refresh_ms = refresh_ms
+        self.refreshes = 0
+        self.fail_next = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.refreshes += 1
+            number = self.refreshes
+            fail, self.fail_next = self.fail_next, False
+        time.sleep(self.refresh_ms / 1000)
+        if fail:
+            raise RuntimeError("describe_fleets throttled")
+        return f"status #{number}"
+
+
+def burst(store, status, requests):
+    """
+    Runs concurrent /status requests, through the cache unless store is None.
+    Returns [(milliseconds, value or exception, source, store reads)].
+    """
+    results = [None] * requests
+    barrier = threading.Barrier(requests)
+
+    def invoke(i):
+        # Counts this request's own store operations on top of the shared store
+        counted = SlowStore(store, 0)
+        cache = StatusCache(counted)
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            if store is None:
+                value, source = status(), 'uncached'
+            else:
+                value, _, source = cache.get(STATUS_KEY, status, TTL)
+        except Exception as e:
+            value, source = e, 'error'
+        results[i] = ((time.perf_counter() - started) * 1000, value, source, counted.counts.get('get', 0))
+
+    threads = [threading.Thread(target=invoke, args=(i,)) for i in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summary(results):
+    durations = sorted(result[0] for result in results)
+    sources = {}
+    for _, _, source, _ in results:
+        sources[source] = sources.get(source, 0) + 1
+    return (f"p50 {durations[len(durations) // 2]:>6.0f} ms  max {durations[-1]:>6.0f} ms  "
+            f"{', '.join(f'{count} {source}' for source, count in sorted(sources.items()))}")
+
+
+def waiter_reads(results):
+    """Store reads of the requests that got their value from another request's refresh."""
+    return [reads for _, _, source, reads in results if source == 'coalesced']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=8, help="Concurrent /status requests per burst")
+    parser.add_argument('--refresh-ms', type=float, default=400, help="Time to build the status uncached")
+    parser.add_argument('--store-ms', type=float, default=5, help="Round trip of one cache store operation")
+    parser.add_argument('--slow-refresh-ms', type=float, default=3000, help="A refresh slowed down by throttling")
+    parser.add_argument('--max-reads', type=int, default=8, help="Store reads allowed per waiting request")
+    args = parser.parse_args()
+    failures = []
+
+    status = FakeStatus(args.refresh_ms)
+    store = SlowStore(MemoryStatusStore(), args.store_ms / 1000)
+    print(f"{args.requests} concurrent /status requests, {args.refresh_ms:.0f} ms refresh, {args.store_ms:.0f} ms per store operation\n")
+
+    uncached = burst(None, status, args.requests)
+    print(f"{'no cache':<24}{summary(uncached)}  ({status.refreshes} refreshes)")
+
+    status.refreshes = 0
+    cold = burst(store, status, args.requests)
+    print(f"{'empty cache':<24}{summary(cold)}  ({status.refreshes} refresh)")
+    if status.refreshes != 1:
+        failures.append(f"a burst on an empty cache ran {status.refreshes} refreshes, expected 1")
+    if len({value for _, value, _, _ in cold}) != 1:
+        failures.append("requests in the same burst saw different results")
+
+    before = status.refreshes
+    warm = burst(store, status, args.requests)
+    print(f"{'within the TTL':<24}{summary(warm)}  ({status.refreshes - before} refreshes)")
+    if status.refreshes != before:
+        failures.append("a burst within the TTL refreshed the status")
+
+    # Waiters back off while a slow refresh runs instead of reading the store every 100 ms
+    store.store.invalidate(STATUS_KEY)
+    status.refresh_ms, refresh_ms = args.slow_refresh_ms, status.refresh_ms
+    slow = burst(store, status, args.requests)
+    status.refresh_ms = refresh_ms
+    print(f"{'slow refresh':<24}{summary(slow)}")
+    for name, results in (('empty cache', cold), ('slow refresh', slow)):
+        reads = waiter_reads(results)
+        print(f"{'':<24}{name}: {len(reads)} waiters, at most {max(reads, default=0)} store reads each")
+        if not reads or max(reads) > args.max_reads:
+            failures.append(f"{name}: waiting requests read the store up to {max(reads, default=0)} times each, "
+                            f"expected at most {args.max_reads}")
+
+    # /start invalidates while a /status refresh (which saw the server stopped) is still running
+    store.store.invalidate(STATUS_KEY)
+    slow_refresh = threading.Thread(target=lambda: StatusCache(store).get(STATUS_KEY, status, TTL))
+    slow_refresh.start()
+    time.sleep(args.refresh_ms / 2000)
+    StatusCache(store).invalidate(STATUS_KEY)
+    slow_refresh.join()
+    value, _, source = StatusCache(store).get(STATUS_KEY, status, TTL)
+    print(f"{'invalidated mid-refresh':<24}next request: {source} ({value})")
+    if source != 'refresh':
+        failures.append(f"the result of a refresh that started before an invalidation was cached ({source})")
+
+    # The refreshing invocation is throttled; a waiting one takes the lease over
+    store.store.invalidate(STATUS_KEY)
+    status.fail_next = True
+    failed = burst(store, status, args.requests)
+    errors = sum(1 for _, value, _, _ in failed if isinstance(value, Exception))
+    print(f"{'refresher fails':<24}{summary(failed)}")
+    if errors != 1:
+        failures.append(f"{errors} requests failed when the refreshing one did, expected only that one")
+
+    print(f"\nStore operations: {store.operations}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Benchmarks /status against stubbed EC2/SSM clients with injected latency.
+
+The serial time is the sum of every call status_fleet makes, which is what the old
+one-after-another implementation paid. The measured time should be close to the
+longest dependent chain instead (describe_fleet_instances -> describe_instances -> server list ping).
+
+Usage: python bench/status_fanout.py [--latency-ms 80] [--probe-ms 150] [--runs 10]
+Requires boto3 and pynacl (pip install boto3 pynacl).
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import boto3
+from botocore.hooks import HierarchicalEmitter
+from nacl.signing import SigningKey
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'DiscordBot'), os.path.join(ROOT, 'ec2', 'scripts')]
+
+FLEET_ID = 'fleet-00000000-0000-0000-0000-000000000000'
+INSTANCE_ID = 'i-0123456789abcdef0'
+PUBLIC_KEY = SigningKey.generate().verify_key.encode().hex()
+
+
+class LatencyStubClient:
+    """Answers the boto3 calls status_fleet makes with canned responses after a fixed delay."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = []
+        # Fires the same before-call/after-call events as a real client, so metrics.instrument_client works
+        self.meta = SimpleNamespace(events=HierarchicalEmitter())
+
+    def _respond(self, name, response):
+        self.calls.append(name)
+        model = SimpleNamespace(name=''.join(word.title() for word in name.split('_')))
+        context = {}
+        self.meta.events.emit(f'before-call.stub.{model.name}', model=model, params={}, context=context)
+        time.sleep(self.latency)
+        self.meta.events.emit(f'after-call.stub.{model.name}', model=model, parsed=response, context=context)
+        return response
+
+    def get_parameters(self, Names, WithDecryption=False):
+        values = {
+            '/minecraft/discord_public_key': PUBLIC_KEY,
+            '/minecraft/fleet_id': FLEET_ID,
+            '/minecraft/eip_allocation_id': 'eipalloc-0a1b2c3d',
+            '/minecraft/rcon_password': 'hunter2'
+        }
+        return self._respond('get_parameters', {
+            'Parameters': [{'Name': name, 'Value': values[name]} for name in Names if name in values],
+            'InvalidParameters': [name for name in Names if name not in values]
+        })
+
+    def describe_addresses(self, AllocationIds):
+        return self._respond('describe_addresses', {'Addresses': [{'PublicIp': '203.0.113.10'}]})
+
+    def describe_fleets(self, FleetIds):
+        return self._respond('describe_fleets', {'Fleets': [{
+            'FleetId': FleetIds[0],
+            'FleetState': 'active',
+            'TargetCapacitySpecification': {'TotalTargetCapacity': 1}
+        }]})
+
+    def describe_fleet_instances(self, FleetId):
+        return self._respond('describe_fleet_instances', {'ActiveInstances': [{'InstanceId': INSTANCE_ID}]})
+
+    def describe_instances(self, InstanceIds):
+        return self._respond('describe_instances', {'Reservations': [{'Instances': [{
+            'InstanceId': InstanceIds[0],
+            'State': {'Name': 'running'},
+            'PublicIpAddress': '203.0.113.10',
+            'LaunchTime': '2026-01-01T00:00:00+00:00',
+            'InstanceType': 't4g.medium',
+            'InstanceLifecycle': 'spot'
+        }]}]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=80, help="Injected latency per AWS call")
+    parser.add_argument('--probe-ms', type=float, default=150, help="Injected latency of the Minecraft server list ping")
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    client = LatencyStubClient(args.latency_ms / 1000)
+    # Clients are created on first use, so the patch stays in place for the whole run
+    mock.patch.object(boto3, 'client', return_value=client).start()
+    import lambda_function
+    # Measures the full chain on every run; bench/status_cache_bench.py covers the shared cache
+    lambda_function.STATUS_CACHE_TTL = 0
+
+    def probe(ip, port, timeout=1.5):
+        time.sleep(args.probe_ms / 1000)
+        return {'status': 'ONLINE', 'players_online': 2, 'players_max': 20, 'version': '1.21.1', 'motd': 'bench', 'latency_ms': args.probe_ms}
+
+    durations = []
+    with mock.patch.object(lambda_function, 'ping_server', probe):
+        for _ in range(args.runs):
+            client.calls.clear()
+            started = time.perf_counter()
+            lambda_function.dispatch_command('status', [])
+            durations.append((time.perf_counter() - started) * 1000)
+
+    aws_calls = len(client.calls)
+    serial_ms = aws_calls * args.latency_ms + args.probe_ms
+    measured_ms = sorted(durations)[len(durations) // 2]
+    print(f"AWS calls per /status: {aws_calls} ({', '.join(client.calls)})")
+    print(f"Serial estimate: {serial_ms:.0f} ms")
+    print(f"Measured median: {measured_ms:.0f} ms")
+    print(f"Speedup: {serial_ms / measured_ms:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Boot agent for the Minecraft server instance, run by ec2/user_dat_script.sh.
+
+Prepares the instance before the Minecraft service starts: reads the instance identity
+from IMDS and the server (world) it runs from its minecraft:server tag, fetches every SSM
+parameter of that server in one batch, then attaches and mounts the world
+volume while the Elastic IP is associated and the environment file is written. Waits use
+short backoff instead of fixed sleeps, ownership is only fixed where it is wrong, and every
+step is timed. The timing report is printed and saved to /opt/minecraft/boot_report.json.
+"""
+import argparse
+import json
+import os
+import pwd
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import boto3
+
+from imds import load_instance_identity
+from rcon import ENV_FILE
+from servers import DEFAULT_SERVER, SERVER_TAG, parameter_name
+from world_backup import DEFAULT_PREFIX
+
+REPORT_FILE = '/opt/minecraft/boot_report.json'
+
+
+class BootError(Exception):
+    """Raised when a boot step cannot complete. The agent exits non-zero so the user data stops."""
+
+
+class StepTimer:
+    """Records the start offset and duration of every boot step. Safe to use from several threads."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.steps = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        start = time.monotonic()
+        outcome = 'ok'
+        try:
+            yield
+        except Exception:
+            outcome = 'failed'
+            raise
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self.steps.append({
+                    'step': name,
+                    'start_s': round(start - self.started, 3),
+                    'duration_s': round(end - start, 3),
+                    'thread': threading.current_thread().name,
+                    'outcome': outcome
+                })
+            print(f"[{end - self.started:7.3f}s] {name}: {outcome} in {end - start:.3f}s", flush=True)
+
+    def report(self):
+        """Returns the steps in start order plus the total wall time."""
+        return {
+            'total_s': round(time.monotonic() - self.started, 3),
+            'steps': sorted(self.steps, key=lambda step: step['start_s'])
+        }
+
+
+def fetch_parameters(ssm_client, names, optional=()):
+    """Fetches SSM parameters in one batch. Raises BootError if any of names (but not optional) is missing."""
+    response = ssm_client.get_parameters(Names=list(names) + list(optional), WithDecryption=True)
+    missing = [name for name in response.get('InvalidParameters', []) if name not in optional]
+    if missing:
+        raise BootError(f"Missing SSM parameters: {', '.join(missing)}. Check IAM permissions.")
+    return {parameter['Name']: parameter['Value'] for parameter in response['Parameters']}
+
+
+def find_volume(ec2_client, tag_key, tag_value):
+    """Returns the ID of the world volume with the given tag."""
+    response = ec2_client.describe_volumes(Filters=[{'Name': f"tag:{tag_key}", 'Values': [tag_value]}])
+    if not response['Volumes']:
+        raise BootError(f"Could not find an EBS volume tagged {tag_key}={tag_value}")
+    return response['Volumes'][0]['VolumeId']
+
+
+def wait_for_path(path, timeout, initial_delay=0.05, max_delay=0.5):
+    """Waits for a path (the attached block device) to appear, backing off from initial_delay to max_delay."""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while not os.path.exists(path):
+        if time.monotonic() >= deadline:
+            raise BootError(f"{path} did not appear within {timeout}s")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def fix_ownership(root, user):
+    """
+    Gives user ownership of everything under root, only touching entries that are wrong.
+    Returns the number of entries changed (0 on a normal boot, so no metadata is written).
+    """
+    account = pwd.getpwnam(user)
+    uid, gid = account.pw_uid, account.pw_gid
+    changed = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        # os.walk lists symlinks to directories in dirnames without descending into them
+        links = [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]
+        for path in [dirpath] + [os.path.join(dirpath, name) for name in filenames + links]:
+            stat = os.lstat(path)
+            if stat.st_uid != uid or stat.st_gid != gid:
+                os.lchown(path, uid, gid)
+                changed += 1
+    return changed
+
+
+def persist_mount(device, mount_point):
+    """
+    Adds the world volume to /etc/fstab so it is mounted again when a stopped standby instance starts.
+    User data only runs on the first boot, and the volume stays attached while the instance is stopped.
+    """
+    def blkid(tag):
+        return subprocess.run(['/usr/sbin/blkid', '-s', tag, '-o', 'value', device],
+                              check=True, capture_output=True, text=True).stdout.strip()
+
+    # The filesystem the mount step detected, so a volume that is not XFS mounts again too
+    uuid, fs_type = blkid('UUID'), blkid('TYPE') or 'auto'
+    entry = f"UUID={uuid} {mount_point} {fs_type} defaults,nofail 0 2\n"
+    with open('/etc/fstab') as f:
+        if any(line.split()[:2] == [f"UUID={uuid}", mount_point] for line in f if line.strip()):
+            return
+    with open('/etc/fstab', 'a') as f:
+        f.write(entry)
+
+
+def prepare_volume(ec2_client, timer, instance_id, args, tag_value):
+    """Finds, attaches and mounts the world volume, then fixes ownership where needed."""
+    with timer.step('find_volume'):
+        volume_id = find_volume(ec2_client, args.volume_tag_key, tag_value)
+        print(f"Found EBS volume {volume_id}")
+
+    with timer.step('wait_volume_available'):
+        ec2_client.get_waiter('volume_available').wait(
+            VolumeIds=[volume_id],
+            WaiterConfig={'Delay': 1, 'MaxAttempts': args.volume_timeout}
+        )
+
+    with timer.step('attach_volume'):
+        ec2_client.attach_volume(VolumeId=volume_id, InstanceId=instance_id, Device=args.device)
+        wait_for_path(args.device, timeout=args.volume_timeout)
+
+    with timer.step('mount'):
+        os.makedirs(args.mount_point, exist_ok=True)
+        subprocess.run(['/usr/bin/mount', args.device, args.mount_point], check=True)
+
+    if args.persist_mount:
+        with timer.step('persist_mount'):
+            persist_mount(args.device, args.mount_point)
+
+    with timer.step('fix_ownership'):
+        changed = fix_ownership(args.mount_point, args.user)
+        print(f"Fixed ownership of {changed} entries under {args.mount_point}")
+
+
+def instance_server(ec2_client, instance_id):
+    """Name of the server this instance runs, from the minecraft:server tag /start_fleet puts on fleet instances."""
+    response = ec2_client.describe_instances(InstanceIds=[instance_id])
+    tags = response['Reservations'][0]['Instances'][0].get('Tags', [])
+    return next((tag['Value'] for tag in tags if tag['Key'] == SERVER_TAG), DEFAULT_SERVER)
+
+
+def associate_eip(ec2_client, timer, instance_id, allocation_id):
+    with timer.step('associate_eip'):
+        ec2_client.associate_address(InstanceId=instance_id, AllocationId=allocation_id)
+
+
+def write_env_file(timer, values, user):
+    """
+    Writes the environment file read by the systemd units and the scripts in /opt/minecraft. It holds the
+    RCON password, so it is owned by root and only readable by the group of user, whom the scripts run as.
+    """
+    with timer.step('write_env_file'):
+        os.makedirs(os.path.dirname(ENV_FILE), exist_ok=True)
+        fd = os.open(ENV_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o640)
+        with os.fdopen(fd, 'w') as f:
+            # Also applies to a file left by an earlier boot, which O_CREAT does not change
+            os.fchown(f.fileno(), 0, pwd.getpwnam(user).pw_gid)
+            os.fchmod(f.fileno(), 0o640)
+            for key, value in values.items():
+                f.write(f"{key}={value}\n")
+
+
+def run(args, timer):
+    with timer.step('imds_identity'):
+        instance_id, region = load_instance_identity()
+        print(f"Instance {instance_id} in {region}")
+
+    ec2_client = boto3.client('ec2', region_name=region)
+    ssm_client = boto3.client('ssm', region_name=region)
+
+    with timer.step('instance_server'):
+        server = instance_server(ec2_client, instance_id)
+        print(f"Running server {server}")
+
+    names = {name: parameter_name(server, name) for name in ['rcon_password', 'eip_allocation_id', 'volume_tag_value']}
+    with timer.step('fetch_parameters'):
+        parameters = fetch_parameters(ssm_client, list(names.values()),
+                                      optional=['/minecraft/backup_bucket', '/minecraft/status_cache_table'])
+
+    env_values = {'SERVER_NAME': server, 'RCON_PASSWORD': parameters[names['rcon_password']]}
+    if '/minecraft/backup_bucket' in parameters:
+        env_values['BACKUP_BUCKET'] = parameters['/minecraft/backup_bucket']
+        if server != DEFAULT_SERVER:
+            # Worlds share the bucket, each under its own prefix
+            env_values['BACKUP_PREFIX'] = f"{DEFAULT_PREFIX}-{server}"
+    if '/minecraft/status_cache_table' in parameters:
+        env_values['STATUS_CACHE_TABLE'] = parameters['/minecraft/status_cache_table']
+
+    # The volume chain, the EIP association and the environment file don't depend on each other
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix='boot') as executor:
+        futures = [
+            executor.submit(prepare_volume, ec2_client, timer, instance_id, args, parameters[names['volume_tag_value']]),
+            executor.submit(associate_eip, ec2_client, timer, instance_id, parameters[names['eip_allocation_id']]),
+            executor.submit(write_env_file, timer, env_values, args.user)
+        ]
+        for future in futures:
+            future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare the instance before the Minecraft service starts.")
+    parser.add_argument('--volume-tag-key', default='minecraft-server')
+    parser.add_argument('--mount-point', default='/minecraft')
+    parser.add_argument('--device', default='/dev/sdb')
+    parser.add_argument('--user', default='ec2-user', help="Owner of the world files")
+    parser.add_argument('--volume-timeout', type=int, default=120, help="Seconds to wait for the volume")
+    parser.add_argument('--persist-mount', action='store_true',
+                        help="Add the volume to /etc/fstab (fast-resume standby instances that are stopped and started)")
+    args = parser.parse_args()
+
+    timer = StepTimer()
+    status = 0
+    try:
+        run(args, timer)
+    except Exception as e:
+        print(f"FATAL: {e}", file=sys.stderr)
+        status = 1
+
+    report = timer.report()
+    print(f"Boot agent finished in {report['total_s']:.3f}s")
+    try:
+        with open(REPORT_FILE, 'w') as f:
+            json.dump(report, f, indent=2)
+    except OSError as e:
+        print(f"Could not save boot report: {e}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Idle auto-shutdown daemon for the Minecraft server.
+
+Follows logs/latest.log to see players join and leave as it happens, keeps one RCON
+connection open to confirm the player count before acting, and looks up the instance ID,
+region and fleet ID once at startup. When the server has been empty for
+IDLE_TIMEOUT_MINUTES, the world is backed up to S3 if a backup bucket is configured (see
+world_backup.py), then the fleet's target capacity is set to 0 (or, with SHUTDOWN_MODE=stop,
+the standby instance is stopped or hibernated) within a few seconds, and the bot's cached
+/status result is dropped (see status_cache.py).
+
+Configured through environment variables (see the minecraft-shutdown.service unit in
+ec2/user_dat_script.sh): RCON_PASSWORD, IDLE_TIMEOUT_MINUTES, SERVER_DIR, SHUTDOWN_MODE,
+BACKUP_BUCKET, BACKUP_ON_IDLE_SHUTDOWN, STATUS_CACHE_TABLE, SERVER_NAME.
+"""
+import os
+import re
+import sys
+import time
+
+from imds import load_instance_identity
+from rcon import RconClient, RconError, load_env_file
+from servers import DEFAULT_SERVER
+from status_cache import DynamoStatusStore, status_key
+from world_backup import backup_server, create_store, format_stats
+
+JOIN_REGEX = re.compile(r'\]: (\w{1,16}) joined the game')
+LEAVE_REGEX = re.compile(r'\]: (\w{1,16}) left the game')
+SERVER_STARTED_REGEX = re.compile(r'\]: Done \([\d.]+s\)!')
+LIST_REGEX = re.compile(r'There are (\d+)')
+
+
+def parse_player_list(list_output):
+    """
+    Parses the output of the 'list' command ("There are 2 of a max of 20 players online: Alex, Steve").
+    Returns (player count, list of names), or (None, []) if it can't be parsed.
+    """
+    match = LIST_REGEX.search(list_output)
+    if not match:
+        return None, []
+    names = list_output.split(':', 1)[1] if ':' in list_output else ''
+    return int(match.group(1)), [name.strip() for name in names.split(',') if name.strip()]
+
+
+class PlayerTracker:
+    """Keeps the set of online players up to date from server log lines."""
+
+    def __init__(self):
+        self.players = set()
+
+    def reset(self, players=()):
+        self.players = set(players)
+
+    def handle_line(self, line):
+        """Updates the player set from one log line. Returns True if the set changed."""
+        match = JOIN_REGEX.search(line)
+        if match:
+            self.players.add(match.group(1))
+            return True
+        match = LEAVE_REGEX.search(line)
+        if match:
+            self.players.discard(match.group(1))
+            return True
+        if SERVER_STARTED_REGEX.search(line):
+            # A fresh server process has nobody online
+            self.reset()
+            return True
+        return False
+
+    @property
+    def count(self):
+        return len(self.players)
+
+
+class LogTailer:
+    """
+    Follows a log file like 'tail -F': yields new complete lines and reopens the file when the
+    server rotates it (new inode or the file shrinking).
+    """
+
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self.from_start = from_start
+        self.file = None
+        self.inode = None
+        self.partial = ''
+        # Open right away so only lines written from now on are reported
+        if not self._open():
+            self.from_start = True
+
+    def _open(self):
+        try:
+            self.file = open(self.path, 'r', encoding='utf-8', errors='replace')
+        except FileNotFoundError:
+            self.file = None
+            return False
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        if not self.from_start:
+            self.file.seek(0, os.SEEK_END)
+        self.partial = ''
+        return True
+
+    def rotated(self):
+        """True if the file at self.path is no longer the file being read."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self.inode or stat.st_size < self.file.tell()
+
+    def read_lines(self):
+        """Returns the complete lines written since the last call (possibly none)."""
+        if self.file is None:
+            if not self._open():
+                return []
+            # Only the very first open may skip existing content; rotated files are read from the start
+            self.from_start = True
+        elif self.rotated():
+            self.file.close()
+            if not self._open():
+                return []
+
+        data = self.partial + self.file.read()
+        lines = data.split('\n')
+        self.partial = lines.pop()
+        return lines
+
+
+class IdleMonitor:
+    """
+    Decides when the server has been idle long enough and triggers the shutdown action.
+    rcon_factory() returns a new, unconnected RconClient (see RconClient), which the monitor connects.
+    """
+
+    def __init__(self, tailer, rcon_factory, shutdown_action, idle_timeout, clock=time.monotonic):
+        self.tailer = tailer
+        self.tracker = PlayerTracker()
+        self.rcon_factory = rcon_factory
+        self.rcon = None
+        self.shutdown_action = shutdown_action
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.idle_since = None
+
+    def rcon_player_list(self):
+        """Asks the server for (player count, names) over the persistent RCON connection. (None, []) if unavailable."""
+        for _ in range(2):
+            try:
+                if self.rcon is None:
+                    self.rcon = self.rcon_factory()
+                    self.rcon.connect()
+                return parse_player_list(self.rcon.command('list'))
+            except RconError as e:
+                print(f"RCON unavailable: {e}")
+                if self.rcon is not None:
+                    self.rcon.close()
+                self.rcon = None
+        return None, []
+
+    def sync_with_server(self):
+        """Replaces the log-derived count with the server's own when they disagree. Returns the RCON count."""
+        count, names = self.rcon_player_list()
+        if count is not None and count != self.tracker.count:
+            print(f"Log tracking saw {self.tracker.count} player(s), server reports {count}. Trusting the server.")
+            # Fall back to placeholder names if the server didn't list them, the count is what matters for idling
+            self.tracker.reset(names if len(names) == count else (f"player{i}" for i in range(count)))
+        return count
+
+    def update_idle_state(self):
+        now = self.clock()
+        if self.tracker.count > 0:
+            if self.idle_since is not None:
+                print(f"{self.tracker.count} player(s) online. Resetting idle timer.")
+            self.idle_since = None
+        elif self.idle_since is None:
+            print(f"Server is empty. Shutting down in {self.idle_timeout:.0f}s unless someone joins.")
+            self.idle_since = now
+
+    def step(self):
+        """Processes new log lines and returns True once the shutdown action has been triggered."""
+        changed = False
+        for line in self.tailer.read_lines():
+            changed = self.tracker.handle_line(line) or changed
+        if changed:
+            print(f"Players online: {self.tracker.count}")
+        self.update_idle_state()
+
+        if self.idle_since is not None and self.clock() - self.idle_since >= self.idle_timeout:
+            # Confirm over RCON before acting, log parsing could have missed a join
+            count = self.sync_with_server()
+            if count == 0:
+                print(f"Server has been idle for {self.idle_timeout:.0f}s. Shutting down.")
+                self.shutdown_action()
+                return True
+            if count is None:
+                print("Could not confirm the player count over RCON. Postponing shutdown.")
+            self.idle_since = self.clock()
+            self.update_idle_state()
+        return False
+
+    def run(self, poll_interval=1.0, keep_running=False):
+        """
+        Waits for the server to accept RCON, then watches it until the shutdown action fires.
+        With keep_running, monitoring starts over after the shutdown action, so a standby instance
+        resumed from hibernation (with this process still alive) is watched again.
+        """
+        while True:
+            while self.sync_with_server() is None:
+                print("Waiting for Minecraft RCON to be available...")
+                time.sleep(10)
+            print(f"RCON is available. Players online: {self.tracker.count}")
+            self.idle_since = None
+            self.update_idle_state()
+
+            while not self.step():
+                time.sleep(poll_interval)
+            if not keep_running:
+                return
+
+
+class FleetShutdown:
+    """Shutdown action that sets the instance's EC2 Fleet target capacity to 0."""
+
+    def __init__(self, ec2_client, fleet_id):
+        self.ec2_client = ec2_client
+        self.fleet_id = fleet_id
+
+    def __call__(self):
+        print(f"Setting target capacity of fleet {self.fleet_id} to 0...")
+        self.ec2_client.modify_fleet(FleetId=self.fleet_id, TargetCapacitySpecification={'TotalTargetCapacity': 0})
+
+
+class InstanceStop:
+    """
+    Shutdown action for the fast-resume standby instance: stops it (hibernating when the instance
+    supports it) so /start can resume it with start_instances instead of launching a new one.
+    """
+
+    def __init__(self, ec2_client, instance_id, hibernate):
+        self.ec2_client = ec2_client
+        self.instance_id = instance_id
+        self.hibernate = hibernate
+
+    def __call__(self):
+        print(f"{'Hibernating' if self.hibernate else 'Stopping'} instance {self.instance_id}...")
+        self.ec2_client.stop_instances(InstanceIds=[self.instance_id], Hibernate=self.hibernate)
+
+
+class BackupBeforeShutdown:
+    """
+    Wraps a shutdown action so the world is backed up to S3 first. A failed backup is logged
+    and never keeps the instance running.
+    """
+
+    def __init__(self, backup, shutdown_action):
+        self.backup = backup
+        self.shutdown_action = shutdown_action
+
+    def __call__(self):
+        print("Backing up the world before shutting down...")
+        try:
+            print(format_stats(self.backup()))
+        except Exception as e:
+            print(f"Backup failed, shutting down anyway: {e}")
+        self.shutdown_action()
+
+
+class InvalidateStatusAfter:
+    """
+    Wraps a shutdown action so the bot's shared /status result is dropped right after it, instead of
+    showing a running server until it expires. A failure is logged and never fails the shutdown.
+    """
+
+    def __init__(self, store, key, shutdown_action):
+        self.store = store
+        self.key = key
+        self.shutdown_action = shutdown_action
+
+    def __call__(self):
+        self.shutdown_action()
+        try:
+            self.store.invalidate(self.key)
+        except Exception as e:
+            print(f"Could not invalidate the status cache: {e}")
+
+
+def describe_self(ec2_client, instance_id):
+    """Returns (fleet ID from the aws:ec2:fleet-id tag or None, whether hibernation is configured)."""
+    response = ec2_client.describe_instances(InstanceIds=[instance_id])
+    details = response['Reservations'][0]['Instances'][0]
+    tags = details.get('Tags', [])
+    fleet_id = next((tag['Value'] for tag in tags if tag['Key'] == 'aws:ec2:fleet-id'), None)
+    return fleet_id, details.get('HibernationOptions', {}).get('Configured', False)
+
+
+def main():
+    import boto3
+
+    env = {**load_env_file(), **os.environ}
+    idle_timeout = float(env.get('IDLE_TIMEOUT_MINUTES', '10')) * 60
+    server_dir = env.get('SERVER_DIR', '/minecraft/server')
+    # 'fleet' drops the fleet capacity to 0, 'stop' stops (or hibernates) this standby instance
+    shutdown_mode = env.get('SHUTDOWN_MODE', 'fleet')
+    password = env.get('RCON_PASSWORD')
+    if not password:
+        print("FATAL: RCON_PASSWORD is not set.", file=sys.stderr)
+        return 1
+
+    # Everything the shutdown path needs is looked up once, now
+    instance_id, region = load_instance_identity()
+    ec2_client = boto3.client('ec2', region_name=region)
+    fleet_id, hibernation = describe_self(ec2_client, instance_id)
+    print(f"Instance {instance_id} in {region}, fleet {fleet_id}, hibernation {hibernation}, shutdown mode {shutdown_mode}")
+
+    if shutdown_mode == 'stop':
+        shutdown_action = InstanceStop(ec2_client, instance_id, hibernation)
+    elif fleet_id:
+        shutdown_action = FleetShutdown(ec2_client, fleet_id)
+    else:
+        print("FATAL: Could not find EC2 Fleet ID.", file=sys.stderr)
+        return 1
+
+    if env.get('BACKUP_BUCKET') and env.get('BACKUP_ON_IDLE_SHUTDOWN', 'true') != 'false':
+        store = create_store(env, region=region)
+        shutdown_action = BackupBeforeShutdown(lambda: backup_server(store, server_dir, env), shutdown_action)
+        print(f"World will be backed up to s3://{store.bucket}/{store.prefix} before shutting down")
+
+    if env.get('STATUS_CACHE_TABLE'):
+        status_store = DynamoStatusStore(boto3.client('dynamodb', region_name=region), env['STATUS_CACHE_TABLE'])
+        shutdown_action = InvalidateStatusAfter(status_store, status_key(env.get('SERVER_NAME', DEFAULT_SERVER)), shutdown_action)
+
+    monitor = IdleMonitor(
+        LogTailer(os.path.join(server_dir, 'logs', 'latest.log')),
+        lambda: RconClient('127.0.0.1', int(env.get('RCON_PORT', '25575')), password),
+        shutdown_action,
+        idle_timeout
+    )
+    monitor.run(keep_running=shutdown_mode == 'stop')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
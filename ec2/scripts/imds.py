@@ -0,0 +1,25 @@
+"""Helpers for the EC2 instance metadata service (IMDSv2), shared by the scripts in /opt/minecraft."""
+import urllib.request
+
+IMDS_URL = 'http://169.254.169.254/latest'
+
+
+def imds_token(timeout=2):
+    """Gets an IMDSv2 session token."""
+    request = urllib.request.Request(f"{IMDS_URL}/api/token", method='PUT',
+                                     headers={'X-aws-ec2-metadata-token-ttl-seconds': '300'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def imds_get(path, token, timeout=2):
+    """Reads a value from the instance metadata service."""
+    request = urllib.request.Request(f"{IMDS_URL}/meta-data/{path}", headers={'X-aws-ec2-metadata-token': token})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def load_instance_identity():
+    """Returns (instance_id, region) from the instance metadata service."""
+    token = imds_token()
+    return imds_get('instance-id', token), imds_get('placement/region', token)
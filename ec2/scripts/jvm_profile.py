@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Picks JVM launch flags for the Minecraft server from the instance's memory and vCPU count.
+
+The fleet can launch any instance type that matches its instance requirements, so a fixed
+heap is either too big for the smallest types or wastes memory on the larger ones. At boot,
+ec2/user_dat_script.sh runs this script, which sizes the heap from /proc/meminfo (leaving
+room for the OS, the SSM agent and the idle monitor), chooses G1 with Aikar's flags or
+generational ZGC for large heaps, and writes the resulting command to a systemd drop-in
+for minecraft.service. The chosen profile is saved to /opt/minecraft/jvm_profile.json and
+tagged on the instance so /status can show it.
+
+select_profile() has no side effects, so profiles can be checked for any instance size:
+
+    python3 jvm_profile.py --memory-mb 7800 --vcpus 2 --print
+"""
+import json
+import os
+import sys
+
+DROP_IN_FILE = '/etc/systemd/system/minecraft.service.d/jvm-profile.conf'
+PROFILE_FILE = '/opt/minecraft/jvm_profile.json'
+# Instance tag read by the Discord bot's /status command
+PROFILE_TAG = 'minecraft:jvm-profile'
+DEFAULT_JAR_ARGS = '-jar server.jar nogui'
+
+# Memory kept for everything that isn't the Java heap (metaspace, thread stacks, the OS and other services)
+MIN_RESERVED_MB = 640
+RESERVED_FRACTION = 0.2
+MIN_HEAP_MB = 512
+# Above about 32 GB the JVM can't use compressed object pointers, so a bigger heap holds less
+MAX_HEAP_MB = 31744
+HEAP_ALIGNMENT_MB = 32
+# ZGC needs a large heap and spare cores for its concurrent threads to beat G1
+ZGC_MIN_HEAP_MB = 16384
+ZGC_MIN_VCPUS = 4
+# Aikar's flags switch to their large-heap variant above 12 GB
+G1_LARGE_HEAP_MB = 12288
+# Pre-touching the whole heap makes startup slower; above this size it costs more than it saves
+PRETOUCH_MAX_HEAP_MB = 8192
+
+AIKAR_COMMON_FLAGS = [
+    '-XX:+ParallelRefProcEnabled', '-XX:MaxGCPauseMillis=200', '-XX:+UnlockExperimentalVMOptions',
+    '-XX:+DisableExplicitGC', '-XX:G1HeapWastePercent=5', '-XX:G1MixedGCCountTarget=4',
+    '-XX:G1MixedGCLiveThresholdPercent=90', '-XX:G1RSetUpdatingPauseTimePercent=5', '-XX:SurvivorRatio=32',
+    '-XX:+PerfDisableSharedMem', '-XX:MaxTenuringThreshold=1',
+    '-Dusing.aikars.flags=https://mcflags.emc.gs', '-Daikars.new.flags=true'
+]
+AIKAR_SIZE_FLAGS = {
+    'small': ['-XX:G1NewSizePercent=30', '-XX:G1MaxNewSizePercent=40', '-XX:G1HeapRegionSize=8M',
+              '-XX:G1ReservePercent=20', '-XX:InitiatingHeapOccupancyPercent=15'],
+    'large': ['-XX:G1NewSizePercent=40', '-XX:G1MaxNewSizePercent=50', '-XX:G1HeapRegionSize=16M',
+              '-XX:G1ReservePercent=15', '-XX:InitiatingHeapOccupancyPercent=20']
+}
+ZGC_FLAGS = ['-XX:+ZGenerational', '-XX:+DisableExplicitGC', '-XX:+PerfDisableSharedMem']
+
+
+class JvmProfile:
+    """A heap size, a garbage collector and the JVM flags that go with them."""
+
+    def __init__(self, name, heap_mb, gc, flags, memory_mb, vcpus):
+        self.name = name
+        self.heap_mb = heap_mb
+        self.gc = gc
+        self.flags = flags
+        self.memory_mb = memory_mb
+        self.vcpus = vcpus
+
+    def jvm_args(self):
+        return [f"-Xms{self.heap_mb}M", f"-Xmx{self.heap_mb}M"] + self.flags
+
+    def command(self, java='java', jar_args=DEFAULT_JAR_ARGS):
+        return ' '.join([java] + self.jvm_args() + [jar_args])
+
+    def summary(self):
+        """Short description for the instance tag and /status."""
+        return f"{self.name}, {self.heap_mb} MB heap ({self.memory_mb} MB, {self.vcpus} vCPU)"
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'heap_mb': self.heap_mb,
+            'gc': self.gc,
+            'memory_mb': self.memory_mb,
+            'vcpus': self.vcpus,
+            'jvm_args': self.jvm_args()
+        }
+
+
+def heap_size_mb(memory_mb):
+    """Heap for a machine with memory_mb of usable memory, aligned down to HEAP_ALIGNMENT_MB."""
+    reserved = max(MIN_RESERVED_MB, int(memory_mb * RESERVED_FRACTION))
+    heap = (memory_mb - reserved) // HEAP_ALIGNMENT_MB * HEAP_ALIGNMENT_MB
+    return min(MAX_HEAP_MB, max(MIN_HEAP_MB, heap))
+
+
+def select_profile(memory_mb, vcpus):
+    """Returns the JvmProfile for a machine with memory_mb of total memory and vcpus CPUs."""
+    heap_mb = heap_size_mb(memory_mb)
+    pretouch = ['-XX:+AlwaysPreTouch'] if heap_mb <= PRETOUCH_MAX_HEAP_MB else []
+
+    if heap_mb >= ZGC_MIN_HEAP_MB and vcpus >= ZGC_MIN_VCPUS:
+        return JvmProfile('zgc', heap_mb, 'ZGC', ['-XX:+UseZGC'] + ZGC_FLAGS + pretouch, memory_mb, vcpus)
+
+    size = 'large' if heap_mb > G1_LARGE_HEAP_MB else 'small'
+    flags = ['-XX:+UseG1GC'] + AIKAR_COMMON_FLAGS + AIKAR_SIZE_FLAGS[size] + pretouch
+    # A single vCPU can't run G1's concurrent work next to the server threads without stalling them
+    if vcpus < 2:
+        flags.append('-XX:ParallelGCThreads=1')
+    return JvmProfile(f"g1-aikar-{size}", heap_mb, 'G1', flags, memory_mb, vcpus)
+
+
+def read_memory_mb(meminfo='/proc/meminfo'):
+    """Total memory in MiB as the kernel sees it (a little less than the instance type's nominal memory)."""
+    with open(meminfo) as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1]) // 1024
+    raise ValueError(f"MemTotal not found in {meminfo}")
+
+
+def read_vcpus():
+    return len(os.sched_getaffinity(0))
+
+
+def write_drop_in(profile, java, jar_args, path=DROP_IN_FILE):
+    """Overrides ExecStart of minecraft.service with the profile's command. Takes effect after daemon-reload."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(
+            "# Written at boot by /opt/minecraft/jvm_profile.py\n"
+            "[Service]\n"
+            f"Environment=JVM_PROFILE={profile.name}\n"
+            "ExecStart=\n"
+            f"ExecStart={profile.command(java, jar_args)}\n"
+        )
+
+
+def tag_instance(profile):
+    """Tags the instance with the profile summary. Failures are logged, since the server runs fine without the tag."""
+    try:
+        import boto3
+
+        from imds import load_instance_identity
+
+        instance_id, region = load_instance_identity()
+        boto3.client('ec2', region_name=region).create_tags(
+            Resources=[instance_id],
+            Tags=[{'Key': PROFILE_TAG, 'Value': profile.summary()}]
+        )
+        print(f"Tagged {instance_id} with {PROFILE_TAG}={profile.summary()}")
+    except Exception as e:
+        print(f"Could not tag the instance with its JVM profile: {e}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pick JVM flags for the Minecraft server from the instance's hardware.")
+    parser.add_argument('--memory-mb', type=int, help="Total memory (default: read from /proc/meminfo)")
+    parser.add_argument('--vcpus', type=int, help="vCPU count (default: CPUs available to this process)")
+    parser.add_argument('--java', default='java')
+    parser.add_argument('--jar-args', default=DEFAULT_JAR_ARGS)
+    parser.add_argument('--print', action='store_true', help="Only print the profile, without writing or tagging anything")
+    parser.add_argument('--tag', action='store_true', help=f"Tag the instance with {PROFILE_TAG}")
+    args = parser.parse_args()
+
+    profile = select_profile(args.memory_mb or read_memory_mb(), args.vcpus or read_vcpus())
+    print(f"JVM profile: {profile.summary()}")
+    print(profile.command(args.java, args.jar_args))
+    if args.print:
+        return 0
+
+    write_drop_in(profile, args.java, args.jar_args)
+    with open(PROFILE_FILE, 'w') as f:
+        json.dump(profile.to_dict(), f, indent=2)
+    if args.tag:
+        tag_instance(profile)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
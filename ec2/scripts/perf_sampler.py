@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Samples the Minecraft server's tick performance for the Discord bot's /perf command.
+
+Every interval, a few commands over one persistent RCON connection read the tick
+time (vanilla `tick query`, Paper `tps`/`mspt` or Forge `forge tps`, whichever the server
+understands), the player count and, on Paper, the loaded chunk count. Every few samples,
+`jcmd PerfCounter.print` adds heap usage and GC time from the JVM, and /proc adds its RSS.
+
+Samples go into a fixed-size ring buffer (an hour at the default interval) that is written
+compactly to /run/minecraft-perf/perf.json after every sample, so the bot can read all of
+it with a single `cat` over SSM. Runs as the minecraft-perf systemd service set up by
+ec2/user_dat_script.sh.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import deque
+
+from rcon import RconClient, RconError, load_env_file, strip_color_codes
+
+PERF_FILE = '/run/minecraft-perf/perf.json'
+FORMAT_VERSION = 1
+FIELDS = ['t', 'tps', 'mspt', 'mspt_p95', 'players', 'chunks', 'heap_mb', 'heap_max_mb', 'gc_ms', 'rss_mb']
+
+TICK_QUERY_REGEX = re.compile(r'Average time per tick: ([\d.]+) ?ms')
+TICK_PERCENTILES_REGEX = re.compile(r'P95: ([\d.]+) ?ms')
+TARGET_RATE_REGEX = re.compile(r'Target tick rate: ([\d.]+)')
+PAPER_TPS_REGEX = re.compile(r'TPS from last 1m, 5m, 15m: \*?([\d.]+)')
+PAPER_MSPT_REGEX = re.compile(r'◴ ([\d.]+)/([\d.]+)/([\d.]+)')
+FORGE_TPS_REGEX = re.compile(r'Overall:.*?(?:Mean tick time: ([\d.]+) ms\. Mean TPS: ([\d.]+)|([\d.]+) TPS \(([\d.]+) ms/tick\))')
+PLAYERS_REGEX = re.compile(r'There are (\d+) (?:of a max of|out of maximum) \d+')
+PAPER_CHUNKS_REGEX = re.compile(r'Total: ?(\d+)')
+PERF_COUNTER_REGEX = re.compile(r'^([\w.]+)=(.*)$', re.MULTILINE)
+# sun.gc.policy.name of the collectors whose generations split the heap between them (Serial, Parallel).
+# Others (G1, Shenandoah, ZGC) report the whole heap as the maximum of every generation.
+PARTITIONED_HEAP_POLICIES = {'Copy:MSC', 'ParScav:MSC'}
+
+
+def parse_tick_query(text):
+    """Parses vanilla `tick query` (1.20.3+). Returns {'tps', 'mspt', 'mspt_p95'} or None."""
+    mspt = TICK_QUERY_REGEX.search(text)
+    if not mspt:
+        return None
+    target = TARGET_RATE_REGEX.search(text)
+    p95 = TICK_PERCENTILES_REGEX.search(text)
+    mspt = float(mspt.group(1))
+    target_rate = float(target.group(1)) if target else 20.0
+    return {
+        'tps': round(min(target_rate, 1000 / mspt), 2) if mspt else target_rate,
+        'mspt': mspt,
+        'mspt_p95': float(p95.group(1)) if p95 else None
+    }
+
+
+def parse_paper_tps(text):
+    """Parses Paper's `tps` and `mspt` output (sent together, see TICK_SOURCES)."""
+    tps = PAPER_TPS_REGEX.search(text)
+    if not tps:
+        return None
+    mspt = PAPER_MSPT_REGEX.search(text)
+    return {
+        'tps': float(tps.group(1)),
+        # avg/min/max over the last 5 seconds; the max stands in for a high percentile
+        'mspt': float(mspt.group(1)) if mspt else None,
+        'mspt_p95': float(mspt.group(3)) if mspt else None
+    }
+
+
+def parse_forge_tps(text):
+    """Parses the 'Overall' line of Forge's `forge tps`, in its old and new wording."""
+    match = FORGE_TPS_REGEX.search(text)
+    if not match:
+        return None
+    if match.group(1):
+        mspt, tps = float(match.group(1)), float(match.group(2))
+    else:
+        tps, mspt = float(match.group(3)), float(match.group(4))
+    return {'tps': tps, 'mspt': mspt, 'mspt_p95': None}
+
+
+# Tick time sources in the order they are tried: (commands, parser of their joined output)
+TICK_SOURCES = [
+    (['tick query'], parse_tick_query),
+    (['tps', 'mspt'], parse_paper_tps),
+    (['forge tps'], parse_forge_tps)
+]
+PAPER_CHUNKS_COMMAND = 'paper chunkinfo *'
+
+
+def parse_players(text):
+    match = PLAYERS_REGEX.search(text)
+    return int(match.group(1)) if match else None
+
+
+def parse_perf_counters(text):
+    """
+    Parses `jcmd <pid> PerfCounter.print` into heap and cumulative GC figures. The heap maximum is the
+    sum of the generation maxima for Serial and Parallel, and the largest one for G1 and the others.
+    """
+    counters = {}
+    policy = None
+    for name, value in PERF_COUNTER_REGEX.findall(text):
+        value = value.strip().strip('"')
+        if value.lstrip('-').isdigit():
+            counters[name] = int(value)
+        elif name == 'sun.gc.policy.name':
+            policy = value
+    used = sum(value for name, value in counters.items() if re.fullmatch(r'sun\.gc\.generation\.\d+\.space\.\d+\.used', name))
+    capacities = [value for name, value in counters.items() if re.fullmatch(r'sun\.gc\.generation\.\d+\.maxCapacity', name)]
+    capacity = (sum if policy in PARTITIONED_HEAP_POLICIES else max)(capacities) if capacities else 0
+    ticks = sum(value for name, value in counters.items() if re.fullmatch(r'sun\.gc\.collector\.\d+\.time', name))
+    frequency = counters.get('sun.os.hrt.frequency')
+    return {
+        'heap_mb': round(used / 2**20) if used else None,
+        'heap_max_mb': round(capacity / 2**20) if capacity else None,
+        'gc_total_ms': ticks * 1000 / frequency if frequency else None
+    }
+
+
+def server_pid():
+    """Main PID of minecraft.service, or None if it is not running."""
+    output = subprocess.run(['/usr/bin/systemctl', 'show', '-p', 'MainPID', '--value', 'minecraft.service'],
+                            capture_output=True, text=True).stdout.strip()
+    return int(output) if output.isdigit() and output != '0' else None
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024)
+    except OSError:
+        pass
+    return None
+
+
+def jvm_stats(pid, timeout=10):
+    """Heap, cumulative GC time and RSS of the server JVM. jcmd attaches as the JVM's own user."""
+    try:
+        output = subprocess.run(['jcmd', str(pid), 'PerfCounter.print'], capture_output=True, text=True,
+                                timeout=timeout).stdout
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"jcmd failed: {e}")
+        return {}
+    stats = parse_perf_counters(output)
+    stats['rss_mb'] = rss_mb(pid)
+    return stats
+
+
+class PerfSampler:
+    """
+    Collects samples into a ring buffer of the last `size` samples.
+
+    rcon_factory() returns a new, unconnected RconClient (see RconClient); the sampler connects
+    it, keeps the connection open between samples and reopens it after an error. jvm_every controls how often (in samples) the
+    comparatively expensive jcmd call is made.
+    """
+
+    def __init__(self, rcon_factory, interval=15, size=240, jvm_every=4, pid_lookup=server_pid,
+                 jvm_lookup=jvm_stats, clock=time.time):
+        self.rcon_factory = rcon_factory
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self.jvm_every = jvm_every
+        self.pid_lookup = pid_lookup
+        self.jvm_lookup = jvm_lookup
+        self.clock = clock
+        self.rcon = None
+        self.tick_source = None
+        self.paper = False
+        self.count = 0
+        self._gc_total = None
+        self._gc_read_at = None
+
+    def _connection(self):
+        if self.rcon is None or self.rcon.sock is None:
+            self.rcon = self.rcon_factory()
+            self.rcon.connect()
+        return self.rcon
+
+    def _detect_tick_source(self, rcon):
+        """Finds the first tick time command this server understands."""
+        for commands, parser in TICK_SOURCES:
+            if parser('\n'.join(strip_color_codes(output) for output in rcon.pipeline(commands))):
+                self.tick_source = (commands, parser)
+                self.paper = parser is parse_paper_tps
+                print(f"Reading tick times with: {', '.join(commands)}")
+                return
+        raise RconError("The server understands none of the tick time commands")
+
+    def read_server(self):
+        """Runs the sample's RCON commands over the persistent connection: tick times, players and (on Paper) loaded chunks."""
+        rcon = self._connection()
+        if self.tick_source is None:
+            self._detect_tick_source(rcon)
+        commands, parser = self.tick_source
+        extra = ['list'] + ([PAPER_CHUNKS_COMMAND] if self.paper else [])
+        outputs = [strip_color_codes(output) for output in rcon.pipeline(commands + extra)]
+        stats = parser('\n'.join(outputs[:len(commands)])) or {}
+        stats['players'] = parse_players(outputs[len(commands)])
+        if self.paper:
+            chunks = PAPER_CHUNKS_REGEX.search(outputs[-1])
+            stats['chunks'] = int(chunks.group(1)) if chunks else None
+        return stats
+
+    def read_jvm(self):
+        pid = self.pid_lookup()
+        if pid is None:
+            return {}
+        stats = self.jvm_lookup(pid)
+        gc_total = stats.pop('gc_total_ms', None)
+        now = self.clock()
+        if gc_total is not None:
+            # GC time spent since the previous JVM reading, per minute (a restarted JVM starts from 0 again)
+            if self._gc_total is not None and gc_total >= self._gc_total and now > self._gc_read_at:
+                stats['gc_ms'] = round((gc_total - self._gc_total) / ((now - self._gc_read_at) / 60), 1)
+            self._gc_total = gc_total
+            self._gc_read_at = now
+        return stats
+
+    def sample(self):
+        """Takes one sample and appends it to the ring buffer. Returns it, or None if the server is unreachable."""
+        try:
+            stats = self.read_server()
+        except RconError as e:
+            print(f"Could not read the server over RCON: {e}")
+            if self.rcon is not None:
+                self.rcon.close()
+            self.rcon = None
+            return None
+        if self.count % self.jvm_every == 0:
+            stats.update(self.read_jvm())
+        self.count += 1
+        stats['t'] = int(self.clock())
+        self.samples.append([stats.get(field) for field in FIELDS])
+        return stats
+
+    def to_dict(self):
+        return {
+            'v': FORMAT_VERSION,
+            'interval': self.interval,
+            'source': self.tick_source[0][0] if self.tick_source else None,
+            'fields': FIELDS,
+            'samples': list(self.samples)
+        }
+
+    def save(self, path=PERF_FILE):
+        """Writes the ring buffer atomically, so readers never see a partial file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def load(self, path=PERF_FILE):
+        """Restores samples written before a restart of the sampler."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('v') == FORMAT_VERSION and data.get('fields') == FIELDS:
+            self.samples.extend(data['samples'])
+
+    def run(self, path=PERF_FILE):
+        self.load(path)
+        while True:
+            started = time.monotonic()
+            if self.sample() is not None:
+                self.save(path)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sample Minecraft tick performance into a ring buffer file.")
+    parser.add_argument('--interval', type=float, default=float(os.environ.get('PERF_SAMPLE_INTERVAL', '15')),
+                        help="Seconds between samples")
+    parser.add_argument('--size', type=int, default=240, help="Samples kept (240 at 15s = 1 hour)")
+    parser.add_argument('--jvm-every', type=int, default=4, help="Read JVM heap and GC stats every N samples")
+    parser.add_argument('--output', default=PERF_FILE)
+    parser.add_argument('--once', action='store_true', help="Take one sample, print it and exit")
+    args = parser.parse_args()
+
+    env = load_env_file()
+    password = os.environ.get('RCON_PASSWORD') or env.get('RCON_PASSWORD')
+    port = int(os.environ.get('RCON_PORT', env.get('RCON_PORT', '25575')))
+    if not password:
+        print("FATAL: RCON_PASSWORD is not set", file=sys.stderr)
+        return 2
+
+    sampler = PerfSampler(lambda: RconClient('127.0.0.1', port, password, timeout=5), args.interval, args.size,
+                          args.jvm_every)
+    if args.once:
+        print(json.dumps(sampler.sample()))
+        return 0
+    sampler.run(args.output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Pure-Python Minecraft RCON client.
+
+Implements the Source RCON protocol as spoken by the Minecraft server: login, command
+execution, reassembly of responses the server splits into 4096 byte fragments, and
+running several commands over one connection.
+
+Used by the Discord bot (direct transport) and by the scripts in /opt/minecraft.
+Run it directly to send commands from a shell:
+    python3 /opt/minecraft/rcon.py "say Hello" "list"
+"""
+import itertools
+import os
+import re
+import socket
+import struct
+import sys
+
+# Packet types
+SERVERDATA_RESPONSE_VALUE = 0
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_AUTH = 3
+
+# The server rejects command payloads larger than this
+MAX_COMMAND_LENGTH = 1446
+
+# Written by the user data script. Holds RCON_PASSWORD for the on-instance scripts.
+ENV_FILE = '/opt/minecraft/minecraft.env'
+
+COLOR_CODE_REGEX = re.compile('§[0-9a-fk-or]', re.IGNORECASE)
+
+
+class RconError(Exception):
+    """Raised when the RCON connection fails or the server sends something unexpected."""
+
+
+class RconAuthError(RconError):
+    """Raised when the server rejects the RCON password."""
+
+
+def strip_color_codes(text):
+    """Strips Minecraft section sign formatting codes (e.g. '§a') from server output."""
+    return COLOR_CODE_REGEX.sub('', text)
+
+
+def load_env_file(path=ENV_FILE):
+    """
+    Reads KEY=VALUE lines from the instance environment file. Returns an empty dict if it is missing
+    or cannot be read (which is logged, as the caller will then miss the RCON password).
+    """
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    values[key.strip()] = value.strip().strip('"')
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not read {path}: {e}", file=sys.stderr)
+    return values
+
+
+class RconClient:
+    """
+    A single RCON connection. Use as a context manager:
+
+        with RconClient('127.0.0.1', 25575, password) as rcon:
+            print(rcon.command('list'))
+
+    Long-running scripts that keep a connection open (idle_monitor.py, perf_sampler.py) take an
+    rcon_factory instead: a callable returning a new RconClient that is not connected yet, such as
+    lambda: RconClient('127.0.0.1', port, password). They call connect() on it themselves, and
+    close it and ask the factory for a new one after an RconError.
+    """
+
+    def __init__(self, host='127.0.0.1', port=25575, password='', timeout=5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self._buffer = b''
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def connect(self):
+        """Opens the TCP connection and logs in."""
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            # Every packet is a single small write; send it at once instead of waiting to coalesce
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            raise RconError(f"Could not connect to RCON at {self.host}:{self.port}: {e}") from e
+        self._buffer = b''
+        self.login()
+
+    def close(self):
+        """Closes the connection. Safe to call more than once."""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+    def login(self):
+        """Authenticates with the password. Raises RconAuthError if it is rejected."""
+        request_id = next(self._ids)
+        self._send_packet(request_id, SERVERDATA_AUTH, self.password)
+        response_id, _, _ = self._read_packet()
+        if response_id == -1:
+            raise RconAuthError("RCON password rejected by the server")
+        if response_id != request_id:
+            raise RconError(f"Unexpected RCON login response id {response_id}")
+
+    def command(self, command):
+        """Runs one command and returns its full response text."""
+        return self.pipeline([command])[0]
+
+    def pipeline(self, commands):
+        """
+        Runs several commands over the one connection and returns their responses in the same order.
+
+        The vanilla server reads at most 1460 bytes per read and parses exactly one packet from
+        it, dropping anything else that arrived with it. So every packet goes out in its own write,
+        and the next one only after the server has answered the previous one. After the first
+        fragment of a command's response, a packet of an unknown type follows. The server answers
+        it with an "Unknown request" packet once the command's last fragment is sent, so multi-packet
+        responses can be reassembled without guessing on timeouts.
+        """
+        if self.sock is None:
+            raise RconError("RCON client is not connected")
+        for command in commands:
+            if len(command.encode('utf-8')) > MAX_COMMAND_LENGTH:
+                raise RconError(f"Command is longer than {MAX_COMMAND_LENGTH} bytes")
+        return [self._run(command) for command in commands]
+
+    def _run(self, command):
+        command_id = next(self._ids)
+        self._send_packet(command_id, SERVERDATA_EXECCOMMAND, command)
+        # The server always sends at least one (possibly empty) fragment
+        fragments = [self._read_response(command_id)]
+        sentinel_id = next(self._ids)
+        self._send_packet(sentinel_id, SERVERDATA_RESPONSE_VALUE, '')
+        while True:
+            response_id, _, payload = self._read_packet()
+            if response_id == sentinel_id:
+                return ''.join(fragments)
+            if response_id != command_id:
+                raise RconError(f"Unexpected RCON response id {response_id}")
+            fragments.append(payload)
+
+    def _read_response(self, request_id):
+        response_id, _, payload = self._read_packet()
+        if response_id != request_id:
+            raise RconError(f"Unexpected RCON response id {response_id}")
+        return payload
+
+    @staticmethod
+    def _encode_packet(request_id, packet_type, payload):
+        body = struct.pack('<ii', request_id, packet_type) + payload.encode('utf-8') + b'\x00\x00'
+        return struct.pack('<i', len(body)) + body
+
+    def _send_packet(self, request_id, packet_type, payload):
+        self._sendall(self._encode_packet(request_id, packet_type, payload))
+
+    def _sendall(self, data):
+        try:
+            self.sock.sendall(data)
+        except OSError as e:
+            self.close()
+            raise RconError(f"RCON connection lost: {e}") from e
+
+    def _read_exactly(self, size):
+        while len(self._buffer) < size:
+            try:
+                chunk = self.sock.recv(max(4096, size - len(self._buffer)))
+            except OSError as e:
+                self.close()
+                raise RconError(f"RCON connection lost: {e}") from e
+            if not chunk:
+                self.close()
+                raise RconError("RCON connection closed by the server")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_packet(self):
+        (length,) = struct.unpack('<i', self._read_exactly(4))
+        if length < 10:
+            raise RconError(f"Malformed RCON packet of length {length}")
+        body = self._read_exactly(length)
+        request_id, packet_type = struct.unpack('<ii', body[:8])
+        return request_id, packet_type, body[8:-2].decode('utf-8', errors='replace')
+
+
+def main():
+    # Only the command line needs argparse; the Lambda package imports this module too
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Send commands to the Minecraft server over RCON.")
+    parser.add_argument('commands', nargs='+', help="Commands to run, in order, over one connection")
+    parser.add_argument('-H', '--host', default='127.0.0.1')
+    parser.add_argument('-P', '--port', type=int, default=25575)
+    parser.add_argument('-p', '--password', help=f"Defaults to RCON_PASSWORD from the environment or {ENV_FILE}")
+    parser.add_argument('-t', '--timeout', type=float, default=5)
+    args = parser.parse_args()
+
+    password = args.password or os.environ.get('RCON_PASSWORD') or load_env_file().get('RCON_PASSWORD')
+    if not password:
+        print("No RCON password given and none found in the environment.", file=sys.stderr)
+        return 2
+
+    try:
+        with RconClient(args.host, args.port, password, args.timeout) as rcon:
+            for response in rcon.pipeline(args.commands):
+                print(strip_color_codes(response))
+    except RconError as e:
+        print(f"RCON error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Analyzes Anvil region files (.mca) and prunes chunks players barely spent time in.
+
+Chunks that were only generated while someone flew past keep a tiny InhabitedTime (ticks a
+player spent nearby) but take up space on the volume, in every backup and in the server's
+chunk I/O. This tool memory-maps each region file, reads the 1024-entry location table,
+and finds each chunk's InhabitedTime by inflating its NBT only as far as needed and skipping
+every other tag without building it. Regions are processed in parallel with a process pool.
+
+Pruning drops chunks below the threshold from the region file and the matching entities/
+and poi/ region files, rewriting each file compacted to a temporary file that atomically
+replaces the original. Dropped chunks are generated again if a player ever visits them.
+The server must be stopped; the tool refuses to prune while world/session.lock is held.
+
+    python3 /opt/minecraft/region_pruner.py /minecraft/server/world
+    sudo systemctl stop minecraft
+    python3 /opt/minecraft/region_pruner.py /minecraft/server/world --prune-below 1200 --dry-run
+    python3 /opt/minecraft/region_pruner.py /minecraft/server/world --prune-below 1200
+"""
+import fcntl
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+SECTOR_SIZE = 4096
+CHUNKS_PER_REGION = 1024
+HEADER_SIZE = 2 * SECTOR_SIZE
+REGION_NAME_REGEX = re.compile(r'^r\.(-?\d+)\.(-?\d+)\.mca$')
+# Region file directories that store data per chunk, relative to a dimension directory
+CHUNK_DATA_DIRS = ['region', 'entities', 'poi']
+
+COMPRESSION_GZIP = 1
+COMPRESSION_ZLIB = 2
+COMPRESSION_NONE = 3
+COMPRESSION_EXTERNAL_FLAG = 0x80
+
+TAG_END, TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG, TAG_FLOAT, TAG_DOUBLE = 0, 1, 2, 3, 4, 5, 6
+TAG_BYTE_ARRAY, TAG_STRING, TAG_LIST, TAG_COMPOUND, TAG_INT_ARRAY, TAG_LONG_ARRAY = 7, 8, 9, 10, 11, 12
+FIXED_TAG_SIZES = {TAG_BYTE: 1, TAG_SHORT: 2, TAG_INT: 4, TAG_LONG: 8, TAG_FLOAT: 4, TAG_DOUBLE: 8}
+ARRAY_ITEM_SIZES = {TAG_BYTE_ARRAY: 1, TAG_INT_ARRAY: 4, TAG_LONG_ARRAY: 8}
+UBYTE = struct.Struct('>B')
+USHORT = struct.Struct('>H')
+INT = struct.Struct('>i')
+LONG = struct.Struct('>q')
+LIST_HEADER = struct.Struct('>bi')
+
+
+class NbtError(Exception):
+    """Raised when chunk data is not valid NBT."""
+
+
+class PrunerError(Exception):
+    """Raised when pruning cannot run safely."""
+
+
+class InflateReader:
+    """Reads a compressed NBT stream a little at a time, so parsing can stop without inflating the rest."""
+
+    READ_SIZE = 16384
+
+    def __init__(self, data, compression):
+        if compression == COMPRESSION_NONE:
+            self.inflater = None
+            self.buffer = bytearray(data)
+        else:
+            wbits = 16 + zlib.MAX_WBITS if compression == COMPRESSION_GZIP else zlib.MAX_WBITS
+            self.inflater = zlib.decompressobj(wbits)
+            self.pending = bytes(data)
+            self.buffer = bytearray()
+        self.pos = 0
+        self.inflated = 0
+
+    def _fill(self, size):
+        while len(self.buffer) - self.pos < size:
+            if self.inflater is None or (not self.pending and self.inflater.eof):
+                raise NbtError("unexpected end of chunk data")
+            # Drop what was already consumed so the buffer stays small
+            del self.buffer[:self.pos]
+            self.pos = 0
+            output = self.inflater.decompress(self.pending, self.READ_SIZE)
+            self.pending = self.inflater.unconsumed_tail
+            self.inflated += len(output)
+            self.buffer += output
+            if not output and not self.pending:
+                raise NbtError("unexpected end of chunk data")
+
+    def read(self, size):
+        self._fill(size)
+        data = bytes(self.buffer[self.pos:self.pos + size])
+        self.pos += size
+        return data
+
+    def unpack(self, fmt):
+        """Reads one value (or tuple, for several fields) with a precompiled struct.Struct."""
+        self._fill(fmt.size)
+        values = fmt.unpack_from(self.buffer, self.pos)
+        self.pos += fmt.size
+        return values if len(values) > 1 else values[0]
+
+    def skip(self, size):
+        while size > 0:
+            step = min(size, self.READ_SIZE)
+            self._fill(step)
+            self.pos += step
+            size -= step
+
+
+def read_string(reader):
+    """Reads an NBT string: a big-endian length followed by that many UTF-8 bytes."""
+    return reader.read(reader.unpack(USHORT)).decode('utf-8', errors='replace')
+
+
+def skip_payload(reader, tag_type):
+    """Skips the payload of a tag of tag_type, nested lists and compounds included, without decoding it."""
+    if tag_type in FIXED_TAG_SIZES:
+        reader.skip(FIXED_TAG_SIZES[tag_type])
+    elif tag_type in ARRAY_ITEM_SIZES:
+        reader.skip(reader.unpack(INT) * ARRAY_ITEM_SIZES[tag_type])
+    elif tag_type == TAG_STRING:
+        reader.skip(reader.unpack(USHORT))
+    elif tag_type == TAG_LIST:
+        item_type, length = reader.unpack(LIST_HEADER)
+        if item_type in FIXED_TAG_SIZES:
+            reader.skip(length * FIXED_TAG_SIZES[item_type])
+        else:
+            for _ in range(length):
+                skip_payload(reader, item_type)
+    elif tag_type == TAG_COMPOUND:
+        while True:
+            child_type = reader.unpack(UBYTE)
+            if child_type == TAG_END:
+                return
+            reader.skip(reader.unpack(USHORT))
+            skip_payload(reader, child_type)
+    else:
+        raise NbtError(f"unknown tag type {tag_type}")
+
+
+def _find_inhabited_time(reader):
+    """Walks a compound payload and returns InhabitedTime, looking inside 'Level' (pre-1.18 chunks)."""
+    while True:
+        tag_type = reader.unpack(UBYTE)
+        if tag_type == TAG_END:
+            return None
+        name = read_string(reader)
+        if name == 'InhabitedTime' and tag_type == TAG_LONG:
+            return reader.unpack(LONG)
+        if name == 'Level' and tag_type == TAG_COMPOUND:
+            value = _find_inhabited_time(reader)
+            if value is not None:
+                return value
+        else:
+            skip_payload(reader, tag_type)
+
+
+def read_inhabited_time(data, compression):
+    """
+    Returns (InhabitedTime or None, bytes inflated to find it) for the compressed NBT of one chunk.
+    Parsing stops as soon as the tag is found.
+    """
+    reader = InflateReader(data, compression)
+    root_type = reader.unpack(UBYTE)
+    if root_type != TAG_COMPOUND:
+        raise NbtError(f"root tag is {root_type}, not a compound")
+    read_string(reader)
+    return _find_inhabited_time(reader), reader.inflated
+
+
+def read_header(mm):
+    """Returns the location entries [(sector offset, sector count)] and save timestamps of a region file."""
+    locations = struct.unpack_from('>1024I', mm, 0)
+    timestamps = struct.unpack_from('>1024I', mm, SECTOR_SIZE)
+    return [(entry >> 8, entry & 0xFF) for entry in locations], list(timestamps)
+
+
+def scan_region(path):
+    """
+    Reads every chunk's InhabitedTime in one region file.
+    Returns {chunk index: InhabitedTime, or None when it can't be read (such chunks are never pruned)}.
+    """
+    chunks = {}
+    size = os.path.getsize(path)
+    if size < HEADER_SIZE:
+        return chunks
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        locations, _ = read_header(mm)
+        for index, (sector, count) in enumerate(locations):
+            if sector == 0 or count == 0:
+                continue
+            offset = sector * SECTOR_SIZE
+            if offset + 5 > size:
+                chunks[index] = None
+                continue
+            length, compression = struct.unpack_from('>IB', mm, offset)
+            if compression & COMPRESSION_EXTERNAL_FLAG or compression not in (COMPRESSION_GZIP, COMPRESSION_ZLIB, COMPRESSION_NONE):
+                # Oversized chunks live in .mcc files, and LZ4 is not supported; keep them
+                chunks[index] = None
+                continue
+            try:
+                chunks[index] = read_inhabited_time(memoryview(mm)[offset + 5:offset + 4 + length], compression)[0]
+            except (NbtError, zlib.error, IndexError, struct.error):
+                chunks[index] = None
+    return chunks
+
+
+def compact_region(path, drop):
+    """
+    Rewrites a region file without the chunks in drop (a set of chunk indices), packing the
+    remaining chunks together. The file is replaced atomically; it is deleted if no chunk remains.
+    Returns the number of bytes reclaimed.
+    """
+    size = os.path.getsize(path)
+    if size < HEADER_SIZE:
+        return 0
+    stat = os.stat(path)
+    temp_path = f"{path}.pruning"
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        locations, timestamps = read_header(mm)
+        kept = [(index, sector, count) for index, (sector, count) in enumerate(locations)
+                if sector and count and index not in drop]
+        if not kept:
+            os.remove(path)
+            return size
+        new_locations = [0] * CHUNKS_PER_REGION
+        new_timestamps = [0] * CHUNKS_PER_REGION
+        with open(temp_path, 'wb') as out:
+            out.seek(HEADER_SIZE)
+            next_sector = 2
+            # Keep the chunks in file order so reads stay sequential
+            for index, sector, count in sorted(kept, key=lambda chunk: chunk[1]):
+                out.write(mm[sector * SECTOR_SIZE:(sector + count) * SECTOR_SIZE].ljust(count * SECTOR_SIZE, b'\0'))
+                new_locations[index] = (next_sector << 8) | count
+                new_timestamps[index] = timestamps[index]
+                next_sector += count
+            out.seek(0)
+            out.write(struct.pack('>1024I', *new_locations))
+            out.write(struct.pack('>1024I', *new_timestamps))
+            out.flush()
+            os.fsync(out.fileno())
+    os.chown(temp_path, stat.st_uid, stat.st_gid)
+    os.chmod(temp_path, stat.st_mode & 0o7777)
+    os.replace(temp_path, path)
+    return size - os.path.getsize(path)
+
+
+def analyze_region(path, threshold=None, dry_run=True):
+    """
+    Scans one region file and, if threshold is set, prunes its chunks with InhabitedTime below it
+    (together with the matching entities/ and poi/ region files) unless dry_run is set.
+    Returns the region's statistics.
+    """
+    chunks = scan_region(path)
+    readable = sorted(value for value in chunks.values() if value is not None)
+    drop = set()
+    if threshold is not None:
+        drop = {index for index, value in chunks.items() if value is not None and value < threshold}
+
+    stats = {
+        'region': os.path.basename(path),
+        'bytes': os.path.getsize(path),
+        'chunks': len(chunks),
+        'unreadable': len(chunks) - len(readable),
+        'inhabited_min': readable[0] if readable else None,
+        'inhabited_median': readable[len(readable) // 2] if readable else None,
+        'inhabited_max': readable[-1] if readable else None,
+        'prunable': len(drop),
+        'reclaimed_bytes': 0
+    }
+    if drop and not dry_run:
+        dimension_dir = os.path.dirname(os.path.dirname(path))
+        for data_dir in CHUNK_DATA_DIRS:
+            data_path = os.path.join(dimension_dir, data_dir, os.path.basename(path))
+            if os.path.exists(data_path):
+                stats['reclaimed_bytes'] += compact_region(data_path, drop)
+    return stats
+
+
+def find_regions(world_dir):
+    """Returns the region files of every dimension under a world directory."""
+    regions = []
+    for dirpath, dirnames, filenames in os.walk(world_dir):
+        if os.path.basename(dirpath) != 'region':
+            continue
+        regions.extend(os.path.join(dirpath, name) for name in sorted(filenames) if REGION_NAME_REGEX.match(name))
+    return regions
+
+
+def world_in_use(world_dir):
+    """True if a running server holds the world's session.lock."""
+    lock_path = os.path.join(world_dir, 'session.lock')
+    if not os.path.exists(lock_path):
+        return False
+    with open(lock_path, 'rb+') as f:
+        try:
+            fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.lockf(f, fcntl.LOCK_UN)
+    return False
+
+
+def analyze_world(world_dir, threshold=None, dry_run=True, workers=None):
+    """Analyzes (and optionally prunes) every region of a world in parallel. Returns the per-region statistics."""
+    if threshold is not None and not dry_run and world_in_use(world_dir):
+        raise PrunerError(f"{world_dir} is in use by a running server. Stop it before pruning.")
+    regions = find_regions(world_dir)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(analyze_region, regions, [threshold] * len(regions), [dry_run] * len(regions),
+                                 chunksize=4))
+
+
+def format_report(results, threshold, dry_run):
+    lines = [f"{'region':<20}{'MB':>8}{'chunks':>8}{'min':>10}{'median':>10}{'max':>12}{'prunable':>10}"]
+    for stats in sorted(results, key=lambda item: item['region']):
+        lines.append(
+            f"{stats['region']:<20}{stats['bytes'] / 1e6:>8.2f}{stats['chunks']:>8}{stats['inhabited_min'] or 0:>10}"
+            f"{stats['inhabited_median'] or 0:>10}{stats['inhabited_max'] or 0:>12}{stats['prunable']:>10}"
+        )
+    total_chunks = sum(stats['chunks'] for stats in results)
+    prunable = sum(stats['prunable'] for stats in results)
+    unreadable = sum(stats['unreadable'] for stats in results)
+    lines.append(f"{len(results)} regions, {sum(stats['bytes'] for stats in results) / 1e6:.1f} MB, "
+                 f"{total_chunks} chunks ({unreadable} unreadable, always kept)")
+    if threshold is not None:
+        if dry_run:
+            lines.append(f"Dry run: {prunable} chunks have InhabitedTime below {threshold} ticks and would be pruned")
+        else:
+            reclaimed = sum(stats['reclaimed_bytes'] for stats in results)
+            lines.append(f"Pruned {prunable} chunks with InhabitedTime below {threshold} ticks, reclaimed {reclaimed / 1e6:.1f} MB")
+    return '\n'.join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze Anvil region files and prune rarely visited chunks.")
+    parser.add_argument('world_dir', nargs='?', default='/minecraft/server/world')
+    parser.add_argument('--prune-below', type=int, metavar='TICKS',
+                        help="Drop chunks with InhabitedTime below this many ticks (20 ticks = 1 second)")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be pruned without changing files")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    try:
+        results = analyze_world(args.world_dir, args.prune_below, args.dry_run, args.workers)
+    except PrunerError as e:
+        print(f"FATAL: {e}", file=sys.stderr)
+        return 1
+    print(format_report(results, args.prune_below, args.dry_run))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Restarts the Minecraft server when its health degrades, instead of on a fixed schedule.
+
+Runs as the minecraft-restart systemd service (root, to restart minecraft.service). Once a
+minute it reads the samples written by perf_sampler.py to /run/minecraft-perf/perf.json and
+checks the last WINDOW minutes against three thresholds:
+
+  * MSPT: the median tick time is above RESTART_MSPT_P50 ms,
+  * tick lag: the median TPS is below RESTART_MIN_TPS, and
+  * heap after GC: the lowest heap usage in the window (what is left after collections,
+    i.e. the live set) is above RESTART_HEAP_FLOOR_PCT of the maximum heap.
+
+Samples from the first RESTART_WARMUP minutes after the server starts are ignored, since
+world loading and spawn chunk generation are always slow. A threshold has to stay exceeded
+for RESTART_SUSTAIN minutes, so a short lag spike never restarts the server. Then the
+restart waits until at most RESTART_MAX_PLAYERS players are online, for up to
+RESTART_MAX_DEFER minutes. Players get the same one-minute `say` warning as before.
+Every decision change is logged as one JSON line with the metrics behind it
+(journalctl -u minecraft-restart).
+
+RestartPolicy has no side effects, so decisions can be replayed on recorded traces:
+
+    python3 /opt/minecraft/restart_scheduler.py --replay perf-trace.json
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+from perf_sampler import PERF_FILE, server_pid
+from rcon import RconClient, RconError, load_env_file
+
+RESTART_WARNING = "say Server is restarting in 1 minute to fix lag!"
+WARNING_SECONDS = 60
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile. values must not be empty. Kept in step with the copy in
+    DiscordBot/perf_report.py: the bot and the instance scripts are deployed separately.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Decision:
+    """What RestartPolicy.check() decided, why, and the metrics it looked at."""
+
+    def __init__(self, action, reasons=(), metrics=None):
+        self.action = action  # 'warmup', 'no_data', 'healthy', 'degraded', 'defer' or 'restart'
+        self.reasons = list(reasons)
+        self.metrics = metrics or {}
+
+    def to_dict(self):
+        return {'action': self.action, 'reasons': self.reasons, 'metrics': self.metrics}
+
+
+class RestartPolicy:
+    """
+    Decides whether the server should be restarted from its recent performance samples.
+    Keeps only when the server first became unhealthy, to bound how long a restart is deferred.
+    """
+
+    def __init__(self, window=600, warmup=900, sustain=600, mspt_p50=40.0, min_tps=18.0, heap_floor_pct=90.0,
+                 max_players=1, max_defer=7200, min_coverage=0.5):
+        self.window = window
+        self.warmup = warmup
+        self.sustain = sustain
+        self.mspt_p50 = mspt_p50
+        self.min_tps = min_tps
+        self.heap_floor_pct = heap_floor_pct
+        self.max_players = max_players
+        self.max_defer = max_defer
+        self.min_coverage = min_coverage
+        self.unhealthy_since = None
+
+    @classmethod
+    def from_env(cls, env=os.environ):
+        return cls(
+            window=float(env.get('RESTART_WINDOW', '10')) * 60,
+            warmup=float(env.get('RESTART_WARMUP', '15')) * 60,
+            sustain=float(env.get('RESTART_SUSTAIN', '10')) * 60,
+            mspt_p50=float(env.get('RESTART_MSPT_P50', '40')),
+            min_tps=float(env.get('RESTART_MIN_TPS', '18')),
+            heap_floor_pct=float(env.get('RESTART_HEAP_FLOOR_PCT', '90')),
+            max_players=int(env.get('RESTART_MAX_PLAYERS', '1')),
+            max_defer=float(env.get('RESTART_MAX_DEFER', '120')) * 60
+        )
+
+    def metrics(self, data, now, started_at):
+        """Window metrics from the samples taken after warmup, or None if there are too few."""
+        fields = data['fields']
+        since = max(now - self.window, started_at + self.warmup)
+        rows = [dict(zip(fields, row)) for row in data['samples'] if since <= row[fields.index('t')] <= now]
+        if len(rows) < self.min_coverage * self.window / data['interval']:
+            return None
+
+        def column(name):
+            return [row[name] for row in rows if row.get(name) is not None]
+
+        mspt, tps, heap, heap_max = column('mspt'), column('tps'), column('heap_mb'), column('heap_max_mb')
+        players = column('players')
+        return {
+            'samples': len(rows),
+            'mspt_p50': percentile(mspt, 50) if mspt else None,
+            'mspt_p95': percentile(mspt, 95) if mspt else None,
+            'tps_p50': percentile(tps, 50) if tps else None,
+            'heap_floor_pct': round(min(heap) / heap_max[-1] * 100, 1) if heap and heap_max else None,
+            'players': players[-1] if players else None
+        }
+
+    def check(self, data, now, started_at):
+        """Returns the Decision for the samples in data at time now, for a server started at started_at."""
+        if now - started_at < self.warmup + self.window * self.min_coverage:
+            return Decision('warmup')
+        metrics = self.metrics(data, now, started_at)
+        if metrics is None:
+            return Decision('no_data')
+
+        reasons = []
+        if metrics['mspt_p50'] is not None and metrics['mspt_p50'] > self.mspt_p50:
+            reasons.append(f"median tick time {metrics['mspt_p50']:.1f} ms > {self.mspt_p50:.0f} ms")
+        if metrics['tps_p50'] is not None and metrics['tps_p50'] < self.min_tps:
+            reasons.append(f"median TPS {metrics['tps_p50']:.1f} < {self.min_tps:.0f}")
+        if metrics['heap_floor_pct'] is not None and metrics['heap_floor_pct'] > self.heap_floor_pct:
+            reasons.append(f"heap after GC {metrics['heap_floor_pct']:.0f}% > {self.heap_floor_pct:.0f}% of max")
+
+        if not reasons:
+            self.unhealthy_since = None
+            return Decision('healthy', metrics=metrics)
+
+        if self.unhealthy_since is None:
+            self.unhealthy_since = now
+        unhealthy_for = now - self.unhealthy_since
+        metrics['unhealthy_for_s'] = round(unhealthy_for)
+        if unhealthy_for < self.sustain:
+            return Decision('degraded', reasons, metrics)
+        players = metrics['players'] or 0
+        if players > self.max_players and unhealthy_for < self.sustain + self.max_defer:
+            return Decision('defer', reasons + [f"{players} players online"], metrics)
+        return Decision('restart', reasons, metrics)
+
+    def restarted(self):
+        self.unhealthy_since = None
+
+
+def server_started_at():
+    """Wall-clock start time of the minecraft.service main process, or None if it is not running."""
+    pid = server_pid()
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/stat") as f:
+        # Field 22 (after the parenthesized command name) is the start time in clock ticks since boot
+        start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+    with open('/proc/uptime') as f:
+        uptime = float(f.read().split()[0])
+    return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def restart_server(password, port):
+    """Warns the players, waits a minute and restarts minecraft.service."""
+    try:
+        with RconClient('127.0.0.1', port, password) as rcon:
+            rcon.command(RESTART_WARNING)
+    except RconError as e:
+        print(f"Could not warn the players: {e}")
+    time.sleep(WARNING_SECONDS)
+    subprocess.run(['/usr/bin/systemctl', 'restart', 'minecraft.service'], check=True)
+
+
+def log_decision(decision, now):
+    print(json.dumps({'time': int(now), **decision.to_dict()}), flush=True)
+
+
+def replay(policy, data, step=60):
+    """
+    Yields (time, Decision) for a check every step seconds over a recorded perf.json trace of one
+    server run, the way the service would have seen it. Stops after the first restart.
+    """
+    times = [row[data['fields'].index('t')] for row in data['samples']]
+    t = started_at = times[0]
+    while t <= times[-1]:
+        decision = policy.check(data, t, started_at)
+        yield t, decision
+        if decision.action == 'restart':
+            return
+        t += step
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Restart the Minecraft server when its performance degrades.")
+    parser.add_argument('--interval', type=float, default=60, help="Seconds between checks")
+    parser.add_argument('--perf-file', default=PERF_FILE)
+    parser.add_argument('--replay', metavar='TRACE', help="Print the decisions for a recorded perf.json trace and exit")
+    args = parser.parse_args()
+
+    policy = RestartPolicy.from_env()
+    if args.replay:
+        with open(args.replay) as f:
+            data = json.load(f)
+        previous = None
+        for t, decision in replay(policy, data, args.interval):
+            if decision.action != previous:
+                log_decision(decision, t)
+                previous = decision.action
+        return 0
+
+    env = load_env_file()
+    password = os.environ.get('RCON_PASSWORD') or env.get('RCON_PASSWORD')
+    port = int(os.environ.get('RCON_PORT', env.get('RCON_PORT', '25575')))
+    previous = None
+    while True:
+        time.sleep(args.interval)
+        started_at = server_started_at()
+        if started_at is None:
+            continue
+        try:
+            with open(args.perf_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        now = time.time()
+        decision = policy.check(data, now, started_at)
+        if decision.action != previous or decision.action == 'restart':
+            log_decision(decision, now)
+            previous = decision.action
+        if decision.action == 'restart':
+            restart_server(password, port)
+            policy.restarted()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
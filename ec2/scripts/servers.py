@@ -0,0 +1,35 @@
+"""
+Naming of the Minecraft servers (worlds) managed by the bot.
+
+Each server keeps its own SSM parameters under /minecraft/<server>/ (fleet_id,
+eip_allocation_id, volume_tag_value, rcon_password and, for fast-resume, standby_instance_id).
+The server named 'default' uses the original flat /minecraft/ parameters, so a single-world
+setup needs no changes. Parameters shared by all servers (discord_public_key, backup_bucket,
+status_cache_table) always stay under /minecraft/.
+
+Instances find out which server they run from their minecraft:server tag, which /start_fleet
+puts on every fleet instance. Shared with the Lambda function, which packages a copy (see
+DiscordBot/build_function.sh).
+"""
+import re
+
+DEFAULT_SERVER = 'default'
+SERVER_TAG = 'minecraft:server'
+# Lowercase so server names work unchanged in SSM paths, S3 prefixes and Discord option choices
+SERVER_NAME_REGEX = re.compile(r'^[a-z0-9][a-z0-9_-]{0,29}$')
+
+
+def parameter_name(server, name):
+    """SSM parameter path of one server's parameter, e.g. /minecraft/creative/fleet_id."""
+    if server == DEFAULT_SERVER:
+        return f"/minecraft/{name}"
+    return f"/minecraft/{server}/{name}"
+
+
+def parse_servers(value):
+    """Parses a comma-separated list of server names. An empty list means just the default server."""
+    servers = [name.strip() for name in (value or '').split(',') if name.strip()]
+    for name in servers:
+        if not SERVER_NAME_REGEX.match(name) or name == 'all':
+            raise ValueError(f"Invalid server name {name!r}: use up to 30 lowercase letters, digits, '-' and '_' ('all' is reserved)")
+    return servers or [DEFAULT_SERVER]
@@ -0,0 +1,199 @@
+"""
+Short-lived /status results shared by every Lambda invocation, with one refresh at a time.
+
+When several people run /status at once, each invocation would otherwise describe the fleet,
+the instance and the Elastic IP and ping the server on its own. StatusCache keeps the last
+result in a small key-value store for a few seconds. On a miss, exactly one invocation takes
+a refresh lease and rebuilds the result while the others poll the store for it.
+
+DynamoStatusStore keeps the entries in a DynamoDB table (partition key `cache_key`, string;
+`expires_at` can be enabled as its TTL attribute) whose name is stored in SSM as
+/minecraft/status_cache_table. MemoryStatusStore is the in-process stand-in used when no
+table is configured, and by the benchmarks.
+
+Anything that changes the server's state calls invalidate(): the bot's /start, /start_fleet
+and /stop_fleet, and the instance's idle shutdown (idle_monitor.py). Invalidating also drops
+the refresh lease, so a refresh that was already running cannot write its result over it.
+Shared with the Lambda function, which packages a copy (see DiscordBot/build_function.sh).
+"""
+import threading
+import time
+import uuid
+
+from servers import DEFAULT_SERVER
+
+# Cache key of the /status result of the default server (see servers.py)
+STATUS_KEY = 'status'
+# Entries are deleted by the DynamoDB TTL this long after they were written; freshness is checked separately
+ENTRY_RETENTION = 86400
+
+
+def status_key(server):
+    """Cache key of one server's /status result."""
+    return STATUS_KEY if server == DEFAULT_SERVER else f"{STATUS_KEY}:{server}"
+
+
+class MemoryStatusStore:
+    """In-process store with the same conditional semantics as DynamoStatusStore."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            return dict(item) if item else None
+
+    def acquire(self, key, owner, until, now):
+        """Takes the refresh lease unless another owner holds an unexpired one. Returns True if taken."""
+        with self._lock:
+            item = self._items.setdefault(key, {})
+            if item.get('lease_until') is not None and item['lease_until'] >= now:
+                return False
+            item['lease_owner'], item['lease_until'] = owner, until
+            return True
+
+    def put(self, key, owner, value, refreshed_at):
+        """Stores a refreshed value and drops the lease, only if owner still holds it. Returns True if stored."""
+        with self._lock:
+            item = self._items.get(key)
+            if not item or item.get('lease_owner') != owner:
+                return False
+            self._items[key] = {'value': value, 'refreshed_at': refreshed_at}
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            item = self._items.get(key)
+            if item and item.get('lease_owner') == owner:
+                item.pop('lease_owner')
+                item.pop('lease_until')
+
+    def invalidate(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class DynamoStatusStore:
+    """Store backed by a DynamoDB table, using conditional writes for the refresh lease."""
+
+    def __init__(self, dynamodb_client, table_name):
+        self.client = dynamodb_client
+        self.table_name = table_name
+
+    def _key(self, key):
+        return {'cache_key': {'S': key}}
+
+    def _conditional_update(self, key, **kwargs):
+        # Imported here so loading this module does not pull in botocore
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.update_item(TableName=self.table_name, Key=self._key(key), **kwargs)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise e
+            return False
+
+    def get(self, key):
+        item = self.client.get_item(TableName=self.table_name, Key=self._key(key), ConsistentRead=True).get('Item')
+        if not item:
+            return None
+        result = {}
+        if 'message' in item:
+            result['value'] = item['message']['S']
+            result['refreshed_at'] = float(item['refreshed_at']['N'])
+        if 'lease_until' in item:
+            result['lease_owner'] = item['lease_owner']['S']
+            result['lease_until'] = float(item['lease_until']['N'])
+        return result
+
+    def acquire(self, key, owner, until, now):
+        return self._conditional_update(
+            key,
+            UpdateExpression='SET lease_owner = :owner, lease_until = :until, expires_at = :expires',
+            ConditionExpression='attribute_not_exists(lease_until) OR lease_until < :now',
+            ExpressionAttributeValues={':owner': {'S': owner}, ':until': {'N': repr(until)}, ':now': {'N': repr(now)},
+                                       ':expires': {'N': str(int(now + ENTRY_RETENTION))}}
+        )
+
+    def put(self, key, owner, value, refreshed_at):
+        return self._conditional_update(
+            key,
+            UpdateExpression='SET message = :message, refreshed_at = :at, expires_at = :expires REMOVE lease_owner, lease_until',
+            ConditionExpression='lease_owner = :owner',
+            ExpressionAttributeValues={':message': {'S': value}, ':at': {'N': repr(refreshed_at)}, ':owner': {'S': owner},
+                                       ':expires': {'N': str(int(refreshed_at + ENTRY_RETENTION))}}
+        )
+
+    def release(self, key, owner):
+        self._conditional_update(key, UpdateExpression='REMOVE lease_owner, lease_until',
+                                 ConditionExpression='lease_owner = :owner',
+                                 ExpressionAttributeValues={':owner': {'S': owner}})
+
+    def invalidate(self, key):
+        self.client.delete_item(TableName=self.table_name, Key=self._key(key))
+
+
+class StatusCache:
+    """
+    Serves a cached value while it is younger than the caller's ttl. Otherwise one caller
+    refreshes it under a lease of lease_seconds, and concurrent callers wait up to `wait`
+    seconds for that result before giving up and refreshing on their own (uncached).
+    Waiters poll the store after poll_interval, doubling it up to max_poll_interval, so a
+    waiter makes about ten reads in `wait` seconds instead of one every poll_interval.
+    """
+
+    def __init__(self, store, lease_seconds=10.0, wait=6.0, poll_interval=0.1, max_poll_interval=1.0,
+                 clock=time.time, sleep=time.sleep):
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.clock = clock
+        self.sleep = sleep
+
+    def _fresh(self, item, ttl, now):
+        return item is not None and 'value' in item and now - item['refreshed_at'] < ttl
+
+    def get(self, key, refresh, ttl):
+        """
+        Returns (value, age in seconds, source). source is 'hit' for a cached value, 'coalesced'
+        for a value refreshed by a concurrent caller, 'refresh' if this caller refreshed it, and
+        'timeout' if it refreshed it after waiting in vain for another caller.
+        """
+        now = self.clock()
+        item = self.store.get(key)
+        if self._fresh(item, ttl, now):
+            return item['value'], now - item['refreshed_at'], 'hit'
+
+        owner = uuid.uuid4().hex
+        deadline = now + self.wait
+        interval = self.poll_interval
+        while True:
+            if self.store.acquire(key, owner, now + self.lease_seconds, now):
+                try:
+                    value = refresh()
+                except Exception:
+                    self.store.release(key, owner)
+                    raise
+                if not self.store.put(key, owner, value, self.clock()):
+                    print(f"Status cache entry {key} was invalidated during the refresh; not caching the result")
+                return value, 0.0, 'refresh'
+
+            # Another invocation is refreshing: wait for its result, or for its lease to be dropped
+            self.sleep(min(interval, max(deadline - now, 0)))
+            interval = min(interval * 2, self.max_poll_interval)
+            now = self.clock()
+            item = self.store.get(key)
+            if self._fresh(item, ttl, now):
+                return item['value'], now - item['refreshed_at'], 'coalesced'
+            if now >= deadline:
+                print(f"Gave up waiting for the refresh of status cache entry {key}")
+                return refresh(), 0.0, 'timeout'
+
+    def invalidate(self, key):
+        self.store.invalidate(key)
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Incremental, content-deduplicated backups of the Minecraft server directory to S3.
+
+Every file is split into fixed-size blocks (BLOCK_SIZE, a multiple of the 4 KiB sectors of
+region files, so a changed chunk only dirties the blocks it lives in). Blocks are stored
+once under their SHA-256, and each backup writes a gzipped manifest listing every file with
+its size, mtime, mode and block digests:
+
+    s3://BUCKET/PREFIX/blocks/ab/abcdef...       block contents
+    s3://BUCKET/PREFIX/manifests/<backup id>.json.gz
+    s3://BUCKET/PREFIX/latest                    ID of the newest backup
+
+A backup only reads files whose size or mtime changed since the previous manifest, and only
+uploads blocks that manifest doesn't already reference. Uploads are streamed through a
+bounded number of in-flight blocks, so memory stays around (workers + in-flight) * block size
+whatever the world size. Restores download blocks in parallel, skipping blocks that already
+match the local file.
+
+Run on the instance by the idle monitor before it shuts the server down, and by /backup:
+    python3 /opt/minecraft/world_backup.py backup
+    python3 /opt/minecraft/world_backup.py list
+    sudo systemctl stop minecraft && python3 /opt/minecraft/world_backup.py restore latest
+The bucket comes from BACKUP_BUCKET (written to /opt/minecraft/minecraft.env from the
+/minecraft/backup_bucket SSM parameter) or --bucket. --endpoint-url points the client at a
+local S3 stand-in.
+"""
+import fcntl
+import fnmatch
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from rcon import ENV_FILE, RconClient, RconError, load_env_file
+
+BLOCK_SIZE = 256 * 1024
+DEFAULT_PREFIX = 'minecraft-world'
+# Paths (relative to the server directory) that are never backed up
+DEFAULT_EXCLUDES = ['logs/*', 'crash-reports/*', 'session.lock']
+MANIFEST_VERSION = 1
+
+
+class BackupError(Exception):
+    """Raised when a backup or restore cannot run or complete."""
+
+
+def is_missing_key(error):
+    """True if a botocore ClientError means the object does not exist."""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') in ['NoSuchKey', '404', 'NotFound']
+
+
+class BackupStore:
+    """Block, manifest and pointer objects of one backup set in S3."""
+
+    def __init__(self, s3_client, bucket, prefix=DEFAULT_PREFIX):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def block_key(self, digest):
+        return f"{self.prefix}/blocks/{digest[:2]}/{digest}"
+
+    def manifest_key(self, backup_id):
+        return f"{self.prefix}/manifests/{backup_id}.json.gz"
+
+    def put_block(self, digest, data):
+        self.s3.put_object(Bucket=self.bucket, Key=self.block_key(digest), Body=data)
+
+    def get_block(self, digest):
+        return self.s3.get_object(Bucket=self.bucket, Key=self.block_key(digest))['Body'].read()
+
+    def put_manifest(self, manifest):
+        body = gzip.compress(json.dumps(manifest, separators=(',', ':')).encode())
+        self.s3.put_object(Bucket=self.bucket, Key=self.manifest_key(manifest['id']), Body=body)
+        # The pointer is written last, so it never names a manifest that isn't complete
+        self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}/latest", Body=manifest['id'].encode())
+        return len(body)
+
+    def get_manifest(self, backup_id):
+        """Returns the manifest of a backup ID (or 'latest'), or None if there is no such backup."""
+        try:
+            if backup_id == 'latest':
+                response = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}/latest")
+                backup_id = response['Body'].read().decode().strip()
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.manifest_key(backup_id))
+        except Exception as e:
+            if is_missing_key(e):
+                return None
+            raise e
+        return json.loads(gzip.decompress(response['Body'].read()))
+
+    def list_backups(self):
+        """Returns the IDs of all backups, oldest first."""
+        backup_ids = []
+        kwargs = {'Bucket': self.bucket, 'Prefix': f"{self.prefix}/manifests/"}
+        while True:
+            response = self.s3.list_objects_v2(**kwargs)
+            for item in response.get('Contents', []):
+                backup_ids.append(item['Key'].rsplit('/', 1)[1][:-len('.json.gz')])
+            if not response.get('IsTruncated'):
+                return sorted(backup_ids)
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def manifest_files(manifest):
+    """Yields (path, size, mtime_ns, mode, list of block digests) for every file in a manifest."""
+    for path, size, mtime_ns, mode, digests in manifest['files']:
+        yield path, size, mtime_ns, mode, [digests[i:i + 64] for i in range(0, len(digests), 64)]
+
+
+def iter_files(root, excludes):
+    """Yields the relative paths of the regular files under root in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            relative = os.path.relpath(path, root)
+            if any(fnmatch.fnmatch(relative, pattern) for pattern in excludes):
+                continue
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield relative
+
+
+@contextmanager
+def backup_lock(root):
+    """Holds an exclusive lock on the server directory so two backups or restores never overlap."""
+    fd = os.open(root, os.O_RDONLY)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise BackupError("Another backup or restore is already running.")
+        yield
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def saves_paused(rcon):
+    """
+    Flushes the world to disk and stops the server from writing region files until the block
+    exits. Does nothing if rcon is None (server not running).
+    """
+    if rcon is None:
+        yield
+        return
+    rcon.command('save-off')
+    try:
+        rcon.command('save-all flush')
+        yield
+    finally:
+        rcon.command('save-on')
+
+
+class BlockUploader:
+    """Uploads blocks on a thread pool with at most max_in_flight blocks held in memory."""
+
+    def __init__(self, store, executor, max_in_flight):
+        self.store = store
+        self.executor = executor
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.futures = []
+
+    def submit(self, digest, data):
+        self.slots.acquire()
+        future = self.executor.submit(self.store.put_block, digest, data)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def wait(self):
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+
+def backup_world(store, root, block_size=BLOCK_SIZE, workers=8, max_in_flight=16, excludes=DEFAULT_EXCLUDES,
+                 rehash=False, clock=time.time):
+    """
+    Backs up root and returns statistics about the run. Files whose size and mtime match the
+    previous manifest are not read again unless rehash is set.
+    """
+    started = time.monotonic()
+    previous = store.get_manifest('latest')
+    previous_files = {}
+    known = set()
+    if previous is not None and previous['block_size'] == block_size:
+        for path, size, mtime_ns, mode, digests in manifest_files(previous):
+            previous_files[path] = (size, mtime_ns, digests)
+            known.update(digests)
+
+    stats = {'files': 0, 'unchanged_files': 0, 'bytes': 0, 'bytes_read': 0, 'blocks': 0,
+             'blocks_uploaded': 0, 'bytes_uploaded': 0}
+    files = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload') as executor:
+        uploader = BlockUploader(store, executor, max_in_flight)
+        for relative in iter_files(root, excludes):
+            path = os.path.join(root, relative)
+            stat = os.stat(path)
+            stats['files'] += 1
+            stats['bytes'] += stat.st_size
+
+            cached = previous_files.get(relative)
+            if not rehash and cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                digests = cached[2]
+                stats['unchanged_files'] += 1
+            else:
+                digests = []
+                with open(path, 'rb') as f:
+                    while True:
+                        data = f.read(block_size)
+                        if not data:
+                            break
+                        digest = hashlib.sha256(data).hexdigest()
+                        digests.append(digest)
+                        stats['bytes_read'] += len(data)
+                        if digest not in known:
+                            known.add(digest)
+                            uploader.submit(digest, data)
+                            stats['blocks_uploaded'] += 1
+                            stats['bytes_uploaded'] += len(data)
+            stats['blocks'] += len(digests)
+            files.append([relative, stat.st_size, stat.st_mtime_ns, stat.st_mode & 0o7777, ''.join(digests)])
+        uploader.wait()
+
+    backup_id = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(clock()))
+    if previous is not None and previous['id'] >= backup_id:
+        # Two backups in the same second still need distinct, ordered IDs
+        backup_id = f"{previous['id']}-1"
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'id': backup_id,
+        'created': clock(),
+        'parent': previous['id'] if previous else None,
+        'block_size': block_size,
+        'files': files
+    }
+    stats['manifest_bytes'] = store.put_manifest(manifest)
+    stats['id'] = backup_id
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def restore_file_blocks(store, path, digests, block_size, verify_existing):
+    """Writes the blocks of one file that differ from what is on disk. Returns the number downloaded."""
+    downloaded = 0
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        for index, digest in enumerate(digests):
+            offset = index * block_size
+            if verify_existing:
+                local = os.pread(fd, block_size, offset)
+                if local and hashlib.sha256(local).hexdigest() == digest:
+                    continue
+            data = store.get_block(digest)
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise BackupError(f"Block {digest} of {path} is corrupt")
+            os.pwrite(fd, data, offset)
+            downloaded += 1
+    finally:
+        os.close(fd)
+    return downloaded
+
+
+def restore_world(store, backup_id, root, workers=8, delete=False, excludes=DEFAULT_EXCLUDES):
+    """
+    Restores a backup into root, downloading files in parallel and only the blocks that differ.
+    With delete, files that are not in the backup are removed. Returns statistics about the run.
+    """
+    started = time.monotonic()
+    manifest = store.get_manifest(backup_id)
+    if manifest is None:
+        raise BackupError(f"Backup {backup_id} not found in s3://{store.bucket}/{store.prefix}")
+    block_size = manifest['block_size']
+    owner = os.stat(root)
+    stats = {'id': manifest['id'], 'files': 0, 'blocks': 0, 'blocks_downloaded': 0, 'deleted': 0}
+
+    entries = list(manifest_files(manifest))
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='restore') as executor:
+        for relative, size, mtime_ns, mode, digests in entries:
+            path = os.path.join(root, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            verify_existing = os.path.exists(path)
+            with open(path, 'ab') as f:
+                f.truncate(size)
+            stats['files'] += 1
+            stats['blocks'] += len(digests)
+            futures.append(executor.submit(restore_file_blocks, store, path, digests, block_size, verify_existing))
+        for future in futures:
+            stats['blocks_downloaded'] += future.result()
+
+    for relative, size, mtime_ns, mode, digests in entries:
+        path = os.path.join(root, relative)
+        os.chmod(path, mode)
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        # Restores run as root, but the server runs as the owner of the server directory
+        os.chown(path, owner.st_uid, owner.st_gid)
+
+    if delete:
+        wanted = {entry[0] for entry in entries}
+        for relative in list(iter_files(root, excludes)):
+            if relative not in wanted:
+                os.remove(os.path.join(root, relative))
+                stats['deleted'] += 1
+
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def connect_rcon(env):
+    """Opens an RCON connection to the local server, or returns None if it isn't running."""
+    password = env.get('RCON_PASSWORD')
+    if not password:
+        return None
+    rcon = RconClient('127.0.0.1', int(env.get('RCON_PORT', '25575')), password)
+    try:
+        rcon.connect()
+    except RconError as e:
+        print(f"Server not reachable over RCON ({e}), backing up without pausing saves.")
+        return None
+    return rcon
+
+
+def run_backup(store, root, rcon=None, **kwargs):
+    """Backs up root with saves paused on the running server. Returns the statistics."""
+    with backup_lock(root), saves_paused(rcon):
+        return backup_world(store, root, **kwargs)
+
+
+def backup_server(store, root, env, pause_saves=True, **kwargs):
+    """Backs up the local server, pausing its saves over RCON if it is running. Returns the statistics."""
+    rcon = connect_rcon(env) if pause_saves else None
+    try:
+        return run_backup(store, root, rcon, **kwargs)
+    finally:
+        if rcon is not None:
+            rcon.close()
+
+
+def format_stats(stats):
+    if 'blocks_uploaded' in stats:
+        return (f"Backup {stats['id']}: {stats['files']} files, {stats['bytes'] / 1e6:.1f} MB "
+                f"({stats['unchanged_files']} unchanged), uploaded {stats['blocks_uploaded']}/{stats['blocks']} blocks "
+                f"({stats['bytes_uploaded'] / 1e6:.1f} MB) in {stats['seconds']:.1f}s")
+    return (f"Restored {stats['id']}: {stats['files']} files, downloaded {stats['blocks_downloaded']}/{stats['blocks']} "
+            f"blocks, deleted {stats['deleted']} files in {stats['seconds']:.1f}s")
+
+
+def create_store(env, bucket=None, prefix=None, region=None, endpoint_url=None):
+    """Builds the BackupStore from command line values, falling back to the instance environment."""
+    import boto3
+
+    bucket = bucket or env.get('BACKUP_BUCKET')
+    if not bucket:
+        raise BackupError(f"No backup bucket. Set /minecraft/backup_bucket in SSM (BACKUP_BUCKET in {ENV_FILE}) or pass --bucket.")
+    if not region and not endpoint_url:
+        from imds import load_instance_identity
+        region = load_instance_identity()[1]
+    s3_client = boto3.client('s3', region_name=region or 'us-east-1', endpoint_url=endpoint_url)
+    return BackupStore(s3_client, bucket, prefix or env.get('BACKUP_PREFIX', DEFAULT_PREFIX))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incremental, deduplicated backups of the Minecraft server to S3.")
+    parser.add_argument('action', choices=['backup', 'restore', 'list'])
+    parser.add_argument('backup_id', nargs='?', default='latest', help="Backup to restore (default: latest)")
+    parser.add_argument('--server-dir', help="Directory to back up or restore into (default: SERVER_DIR or /minecraft/server)")
+    parser.add_argument('--bucket')
+    parser.add_argument('--prefix')
+    parser.add_argument('--region')
+    parser.add_argument('--endpoint-url', help="S3 endpoint, e.g. a local S3 stand-in for testing")
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rehash', action='store_true', help="Read every file, even if its size and mtime are unchanged")
+    parser.add_argument('--no-pause', action='store_true', help="Don't pause world saves over RCON during the backup")
+    parser.add_argument('--delete', action='store_true', help="On restore, remove files that are not in the backup")
+    args = parser.parse_args()
+
+    env = {**load_env_file(), **os.environ}
+    root = args.server_dir or env.get('SERVER_DIR', '/minecraft/server')
+    if args.block_size % 4096:
+        print("--block-size must be a multiple of 4096 (the region file sector size).", file=sys.stderr)
+        return 2
+
+    try:
+        store = create_store(env, args.bucket, args.prefix, args.region, args.endpoint_url)
+        if args.action == 'list':
+            for backup_id in store.list_backups():
+                print(backup_id)
+            return 0
+        if args.action == 'restore':
+            with backup_lock(root):
+                stats = restore_world(store, args.backup_id, root, args.workers, args.delete)
+        else:
+            stats = backup_server(store, root, env, not args.no_pause, block_size=args.block_size,
+                                  workers=args.workers, max_in_flight=args.workers * 2, rehash=args.rehash)
+    except (BackupError, RconError) as e:
+        print(f"FATAL: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(stats))
+    print(format_stats(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
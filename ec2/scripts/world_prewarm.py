@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Prewarms the world's region files before the Minecraft service starts, run by ec2/user_dat_script.sh.
+
+A world volume created from a snapshot loads its blocks from S3 the first time they are read,
+so the first players to join would wait seconds for every chunk. This tool reads the region
+files (and the matching entities/ and poi/ files) in the order players are likely to need them:
+
+  1. the regions around the world spawn (from level.dat), nearest first,
+  2. every other region of every dimension, most recently modified first.
+
+Files are read by a thread pool: each worker asks the kernel to read the whole file ahead
+(posix_fadvise WILLNEED, so several requests are queued on the volume at once) and then
+reads it into a reused buffer, which waits for the blocks and leaves them in the page cache.
+Reading stops at the time budget or after the I/O budget, whichever comes first.
+
+    python3 /opt/minecraft/world_prewarm.py --server-dir /minecraft/server --budget-seconds 30 --budget-mb 2048
+    python3 /opt/minecraft/world_prewarm.py --server-dir /minecraft/server --plan    # print the order only
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from region_pruner import (CHUNK_DATA_DIRS, COMPRESSION_GZIP, INT, REGION_NAME_REGEX, TAG_COMPOUND, TAG_END, TAG_INT,
+                           TAG_INT_ARRAY, UBYTE, InflateReader, NbtError, read_string, skip_payload)
+
+# Blocks per region side: a region holds 32x32 chunks of 16x16 blocks
+REGION_BLOCKS = 512
+READ_SIZE = 1 << 20
+# Dimension directories the Bukkit family (Spigot, Paper) keeps next to the main world
+SEPARATE_DIMENSION_SUFFIXES = ['_nether', '_the_end']
+
+
+def level_name(server_dir):
+    """The world directory name set by level-name in server.properties."""
+    try:
+        with open(os.path.join(server_dir, 'server.properties'), encoding='utf-8') as f:
+            for line in f:
+                key, _, value = line.strip().partition('=')
+                if key == 'level-name' and value:
+                    return value
+    except OSError:
+        pass
+    return 'world'
+
+
+def world_dirs(server_dir):
+    """The main world directory followed by the separate nether and end directories that exist."""
+    main = os.path.join(server_dir, level_name(server_dir))
+    return [main] + [main + suffix for suffix in SEPARATE_DIMENSION_SUFFIXES if os.path.isdir(main + suffix)]
+
+
+def _find_spawn(reader):
+    """Walks the Data compound of level.dat for SpawnX/SpawnZ, or the spawn.pos array of newer versions."""
+    spawn = {}
+    while True:
+        tag_type = reader.unpack(UBYTE)
+        if tag_type == TAG_END:
+            return (spawn['SpawnX'], spawn['SpawnZ']) if 'SpawnX' in spawn and 'SpawnZ' in spawn else None
+        name = read_string(reader)
+        if name in ('SpawnX', 'SpawnZ') and tag_type == TAG_INT:
+            spawn[name] = reader.unpack(INT)
+        elif name == 'spawn' and tag_type == TAG_COMPOUND:
+            position = _find_spawn_pos(reader)
+            if position is not None:
+                return position
+        else:
+            skip_payload(reader, tag_type)
+
+
+def _find_spawn_pos(reader):
+    position = None
+    while True:
+        tag_type = reader.unpack(UBYTE)
+        if tag_type == TAG_END:
+            return position
+        name = read_string(reader)
+        if name == 'pos' and tag_type == TAG_INT_ARRAY and position is None:
+            values = [reader.unpack(INT) for _ in range(reader.unpack(INT))]
+            if len(values) == 3:
+                position = (values[0], values[2])
+        else:
+            skip_payload(reader, tag_type)
+
+
+def read_spawn(world_dir):
+    """Returns the (x, z) block coordinates of the world spawn from level.dat, or None if it cannot be read."""
+    try:
+        with open(os.path.join(world_dir, 'level.dat'), 'rb') as f:
+            reader = InflateReader(f.read(), COMPRESSION_GZIP)
+        if reader.unpack(UBYTE) != TAG_COMPOUND:
+            return None
+        read_string(reader)
+        while True:
+            tag_type = reader.unpack(UBYTE)
+            if tag_type == TAG_END:
+                return None
+            name = read_string(reader)
+            if name == 'Data' and tag_type == TAG_COMPOUND:
+                return _find_spawn(reader)
+            skip_payload(reader, tag_type)
+    except (OSError, NbtError) as e:
+        print(f"Could not read the spawn from {world_dir}/level.dat: {e}")
+        return None
+
+
+def find_region_files(world_dir):
+    """Returns (dimension directory, region x, region z, path, size, mtime) for the region, entities and poi files."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(world_dir):
+        if os.path.basename(dirpath) not in CHUNK_DATA_DIRS:
+            continue
+        dimension_dir = os.path.dirname(dirpath)
+        for name in filenames:
+            match = REGION_NAME_REGEX.match(name)
+            if not match:
+                continue
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            if stat.st_size:
+                files.append((dimension_dir, int(match.group(1)), int(match.group(2)), path, stat.st_size,
+                              stat.st_mtime))
+    return files
+
+
+def plan_prewarm(dirs, spawn=None, spawn_radius=1, budget_bytes=None):
+    """
+    Returns the files to read as [(path, bytes to read, reason)] in prewarm order. dirs[0] is the main
+    world, whose overworld holds the spawn. Regions within spawn_radius regions of the spawn come first,
+    nearest first, then all other files by modification time, newest first. The files of one region
+    (region, entities, poi) stay together. With budget_bytes, the plan stops once that much is read,
+    reading only the start of the last file.
+    """
+    if spawn is None and dirs:
+        spawn = read_spawn(dirs[0])
+    spawn_region = (spawn[0] // REGION_BLOCKS, spawn[1] // REGION_BLOCKS) if spawn else None
+
+    keyed = []
+    for world_dir in dirs:
+        for dimension_dir, x, z, path, size, mtime in find_region_files(world_dir):
+            distance = None
+            if spawn_region and dimension_dir == dirs[0]:
+                distance = max(abs(x - spawn_region[0]), abs(z - spawn_region[1]))
+            if distance is not None and distance <= spawn_radius:
+                # Spawn regions by distance; the region file of a region before its entities and poi files
+                key = (0, distance, x, z, os.path.basename(os.path.dirname(path)) != 'region', 0)
+                keyed.append((key, path, size, 'spawn'))
+            else:
+                keyed.append(((1, 0, 0, 0, False, -mtime), path, size, 'recent'))
+    keyed.sort(key=lambda item: (item[0], item[1]))
+
+    plan = []
+    remaining = budget_bytes
+    for _, path, size, reason in keyed:
+        if remaining is not None:
+            if remaining <= 0:
+                break
+            size = min(size, remaining)
+            remaining -= size
+        plan.append((path, size, reason))
+    return plan
+
+
+def prewarm_file(path, length, deadline, buffer):
+    """Reads the first length bytes of path into the page cache. Returns the bytes read, stopping at the deadline."""
+    done = 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Queue the whole range at once; the reads below then mostly wait for blocks already requested
+        os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+        view = memoryview(buffer)
+        while done < length and time.monotonic() < deadline:
+            read = os.readv(fd, [view[:min(READ_SIZE, length - done)]])
+            if not read:
+                break
+            done += read
+    finally:
+        os.close(fd)
+    return done
+
+
+def prewarm(plan, budget_seconds, workers=8):
+    """Reads the planned files with a pool of workers until done or budget_seconds have passed. Returns the statistics."""
+    started = time.monotonic()
+    deadline = started + budget_seconds
+    local = threading.local()
+    stats = {'files': 0, 'bytes': 0, 'spawn_files': 0, 'errors': 0, 'complete': True}
+    lock = threading.Lock()
+
+    def warm(entry):
+        path, length, reason = entry
+        if time.monotonic() >= deadline:
+            return
+        if not hasattr(local, 'buffer'):
+            local.buffer = bytearray(READ_SIZE)
+        try:
+            done = prewarm_file(path, length, deadline, local.buffer)
+        except OSError as e:
+            print(f"Could not prewarm {path}: {e}")
+            with lock:
+                stats['errors'] += 1
+            return
+        with lock:
+            stats['bytes'] += done
+            if done == length:
+                stats['files'] += 1
+                stats['spawn_files'] += reason == 'spawn'
+
+    # map() hands out the files in plan order, so the first files are read first
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prewarm') as executor:
+        list(executor.map(warm, plan))
+
+    stats['complete'] = stats['files'] == len(plan)
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the world's region files into the page cache before the server starts.")
+    parser.add_argument('--server-dir', default='/minecraft/server')
+    parser.add_argument('--budget-seconds', type=float, default=30, help="Stop reading after this many seconds")
+    parser.add_argument('--budget-mb', type=float, default=2048, help="Stop reading after this many MB")
+    parser.add_argument('--spawn-radius', type=int, default=1, help="Regions around the spawn region read first")
+    parser.add_argument('--workers', type=int, default=8, help="Files read at the same time")
+    parser.add_argument('--plan', action='store_true', help="Print the files in prewarm order without reading them")
+    args = parser.parse_args()
+
+    dirs = [path for path in world_dirs(args.server_dir) if os.path.isdir(path)]
+    if not dirs:
+        print(f"No world under {args.server_dir}; nothing to prewarm")
+        return 0
+    planned = time.monotonic()
+    plan = plan_prewarm(dirs, spawn_radius=args.spawn_radius, budget_bytes=int(args.budget_mb * 1e6))
+    print(f"Planned {len(plan)} files ({sum(length for _, length, _ in plan) / 1e6:.1f} MB) from {', '.join(dirs)} "
+          f"in {time.monotonic() - planned:.3f}s")
+    if args.plan:
+        for path, length, reason in plan:
+            print(f"{reason:<8}{length / 1e6:>9.2f} MB  {path}")
+        return 0
+
+    stats = prewarm(plan, args.budget_seconds, args.workers)
+    megabytes = stats['bytes'] / 1e6
+    print(f"Prewarmed {stats['files']} files ({stats['spawn_files']} around the spawn), {megabytes:.1f} MB "
+          f"in {stats['seconds']:.1f}s ({megabytes / max(stats['seconds'], 0.001):.1f} MB/s)")
+    if not stats['complete']:
+        print(f"Stopped at the budget with {len(plan) - stats['files'] - stats['errors']} files not (fully) read")
+    if stats['errors']:
+        print(f"{stats['errors']} files could not be read")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
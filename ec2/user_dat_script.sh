@@ -1,74 +1,68 @@
 #!/bin/bash -xe
 # This script runs on instance boot to automate Minecraft server setup.
-# It attaches an EBS volume, configures the server as a systemd service,
-# sets up a scheduled restart, and adds an idle auto-shutdown service.
+# It attaches an EBS volume, prewarms the world's region files, configures the server as a systemd service with JVM
+# flags sized for the instance, adds a restart scheduler that restarts the server when its performance degrades,
+# and an idle auto-shutdown service.
+# The Python scripts it runs are installed in /opt/minecraft by the custom AMI (see ec2/scripts).
 
 # --- CONFIGURATION ---
 # Static Configuration
 VOLUME_TAG_KEY="minecraft-server"
 MOUNT_POINT="/minecraft"
 DEVICE_NAME="/dev/sdb"
-MINECRAFT_START_COMMAND="java -Xmx1300M -Xms1300M -jar server.jar nogui"
+MINECRAFT_JAR_ARGS="-jar server.jar nogui"
+# 'auto' sizes the heap and picks the garbage collector from the instance's memory and vCPUs (see
+# /opt/minecraft/jvm_profile.py). 'off' always uses MINECRAFT_START_COMMAND, which is also the fallback.
+JVM_PROFILE="auto"
+MINECRAFT_START_COMMAND="java -Xmx1300M -Xms1300M ${MINECRAFT_JAR_ARGS}"
 SERVER_DIR="${MOUNT_POINT}/server"
 IDLE_TIMEOUT_MINUTES=10
-DEBUG_LOG="/tmp/minecraft_auto_shutdown.log"
-
-# Dynamic Configuration fetched from SSM Parameter Store
-echo "Fetching configuration from AWS Parameter Store..."
-RCON_PASSWORD=$(aws ssm get-parameter --name "/minecraft/rcon_password" --with-decryption --query "Parameter.Value" --output text)
-EIP_ALLOCATION_ID=$(aws ssm get-parameter --name "/minecraft/eip_allocation_id" --query "Parameter.Value" --output text)
-VOLUME_TAG_VALUE=$(aws ssm get-parameter --name "/minecraft/volume_tag_value" --query "Parameter.Value" --output text)
-
-# Check if secrets were fetched successfully
-if [ -z "$RCON_PASSWORD" ] || [ -z "$EIP_ALLOCATION_ID" ]; then
-    echo "FATAL: Could not fetch secrets from Parameter Store. Check IAM permissions." >&2
-    exit 1
-fi
+# 'fleet' sets the fleet capacity to 0 when idle. 'stop' stops (or hibernates) the instance instead, for the
+# fast-resume standby instance started by /start when the Lambda function runs with START_MODE=resume.
+SHUTDOWN_MODE="fleet"
+# Back up the world to S3 before every idle shutdown (only if /minecraft/backup_bucket is set in SSM)
+BACKUP_ON_IDLE_SHUTDOWN="true"
+# Seconds between tick performance samples for /perf
+PERF_SAMPLE_INTERVAL=15
+# Restart the server when, over the last 10 minutes, the median tick time is above RESTART_MSPT_P50 ms, the average
+# TPS is below RESTART_MIN_TPS or the heap after GC stays above RESTART_HEAP_FLOOR_PCT % of the maximum. The restart
+# waits until at most RESTART_MAX_PLAYERS players are online, for up to RESTART_MAX_DEFER minutes.
+RESTART_MSPT_P50=40
+RESTART_MIN_TPS=18
+RESTART_HEAP_FLOOR_PCT=90
+RESTART_MAX_PLAYERS=1
+RESTART_MAX_DEFER=120
+# Before the server starts, read the world's region files (spawn area first, then the most recently modified) for up
+# to PREWARM_SECONDS seconds or PREWARM_MB MB, so a volume restored from a snapshot does not stall the first chunk
+# loads. PREWARM_SECONDS=0 turns it off.
+PREWARM_SECONDS=30
+PREWARM_MB=2048
 
 
 # --- AUTOMATION LOGIC ---
 
-# GET INSTANCE METADATA
-TOKEN=$(/usr/bin/curl -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 21600")
-INSTANCE_ID=$(/usr/bin/curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/instance-id)
-AWS_REGION=$(/usr/bin/curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/placement/availability-zone | /usr/bin/sed 's/\(.*\)[a-z]/\1/')
-
-# ATTACH AND MOUNT EBS VOLUME
-VOLUME_ID=$(/usr/bin/aws ec2 describe-volumes --region $AWS_REGION --filters "Name=tag:${VOLUME_TAG_KEY},Values=${VOLUME_TAG_VALUE}" --query "Volumes[0].VolumeId" --output text)
-if [ -z "$VOLUME_ID" ] || [ "$VOLUME_ID" == "None" ]; then
-    /usr/bin/echo "FATAL: Could not find EBS volume. Exiting." >&2
-    exit 1
-fi
-
-# Add a retry loop to check the volume's state
-/usr/bin/echo "Found EBS volume with ID: $VOLUME_ID. Checking its state."
-MAX_WAIT_TIME=120
-CURRENT_WAIT_TIME=0
-VOLUME_STATE=$(/usr/bin/aws ec2 describe-volumes --region $AWS_REGION --volume-ids $VOLUME_ID --query "Volumes[0].State" --output text)
-
-while [ "$VOLUME_STATE" != "available" ] && [ "$CURRENT_WAIT_TIME" -lt "$MAX_WAIT_TIME" ]; do
-    /usr/bin/echo "Volume state is '$VOLUME_STATE'. Waiting..."
-    /usr/bin/sleep 5
-    CURRENT_WAIT_TIME=$((CURRENT_WAIT_TIME + 5))
-    VOLUME_STATE=$(/usr/bin/aws ec2 describe-volumes --region $AWS_REGION --volume-ids $VOLUME_ID --query "Volumes[0].State" --output text)
-done
-
-if [ "$VOLUME_STATE" != "available" ]; then
-    /usr/bin/echo "FATAL: EBS volume did not become available in time. Exiting." >&2
-    exit 1
+# BOOT AGENT
+# Reads the instance metadata and SSM parameters, attaches and mounts the EBS volume while associating
+# the Elastic IP, and writes /opt/minecraft/minecraft.env. Independent steps run at the same time and
+# each step is timed; the report is saved to /opt/minecraft/boot_report.json.
+/usr/bin/python3 /opt/minecraft/boot_agent.py \
+    --volume-tag-key "${VOLUME_TAG_KEY}" \
+    --mount-point "${MOUNT_POINT}" \
+    --device "${DEVICE_NAME}" \
+    $([ "${SHUTDOWN_MODE}" == "stop" ] && echo "--persist-mount")
+
+# WORLD PREWARM
+# Blocks of a volume created from a snapshot are fetched from S3 on first read. /opt/minecraft/world_prewarm.py reads
+# the region files in the order players will need them, several at a time, within the budget above. A failure only
+# means a colder start, so it never stops the boot.
+if [ "${PREWARM_SECONDS}" != "0" ]; then
+    /usr/bin/python3 /opt/minecraft/world_prewarm.py \
+        --server-dir "${SERVER_DIR}" \
+        --budget-seconds "${PREWARM_SECONDS}" \
+        --budget-mb "${PREWARM_MB}" \
+        || /usr/bin/echo "World prewarm failed, starting the server anyway"
 fi
 
-/usr/bin/echo "EBS volume is available. Attaching..."
-
-/usr/bin/aws ec2 attach-volume --region $AWS_REGION --volume-id $VOLUME_ID --instance-id $INSTANCE_ID --device $DEVICE_NAME
-while [ ! -e $DEVICE_NAME ]; do /usr/bin/sleep 5; done
-/usr/bin/mkdir -p $MOUNT_POINT
-/usr/bin/mount $DEVICE_NAME $MOUNT_POINT
-/usr/bin/chown -R ec2-user:ec2-user $MOUNT_POINT
-
-# ASSOCIATE ELASTIC IP
-/usr/bin/aws ec2 associate-address --region $AWS_REGION --instance-id $INSTANCE_ID --allocation-id $EIP_ALLOCATION_ID
-
 # MINECRAFT SYSTEMD SERVICE
 /usr/bin/cat << EOF > /etc/systemd/system/minecraft.service
 [Unit]
@@ -82,8 +76,9 @@ User=ec2-user
 Type=simple # Change type to simple
 WorkingDirectory=${SERVER_DIR}
 # Execute the java command directly. Systemd handles the process.
+EnvironmentFile=/opt/minecraft/minecraft.env
 ExecStart=${MINECRAFT_START_COMMAND}
-ExecStop=/usr/local/bin/mcrcon -H 127.0.0.1 -P 25575 -p "${RCON_PASSWORD}" "stop"
+ExecStop=/usr/bin/python3 /opt/minecraft/rcon.py "stop"
 # Automatically restart the service if it fails
 Restart=on-failure
 RestartSec=5s
@@ -92,81 +87,18 @@ RestartSec=5s
 WantedBy=multi-user.target
 EOF
 
-# SCRIPTS DIRECTORY AND RESTART WRAPPER
-/usr/bin/mkdir -p /opt/minecraft
-/usr/bin/cat << EOF > /opt/minecraft/restart_wrapper.sh
-#!/bin/bash
-/usr/local/bin/mcrcon -H 127.0.0.1 -P 25575 -p "${RCON_PASSWORD}" "say Server is restarting in 1 minute!"
-/usr/bin/sleep 60
-/usr/bin/systemctl restart minecraft.service
-EOF
-/usr/bin/chmod +x /opt/minecraft/restart_wrapper.sh
-
-# CRON JOB FOR SCHEDULED RESTART
-/usr/bin/mkdir -p /etc/cron.d
-/usr/bin/echo "0 */6 * * * root /opt/minecraft/restart_wrapper.sh" > /etc/cron.d/minecraft-restart
-/usr/bin/systemctl enable --now crond
-
-# AUTO-SHUTDOWN SCRIPT
-/usr/bin/cat << EOF > /opt/minecraft/auto_shutdown.sh
-#!/bin/bash
-# Add a log file path at the top
-echo "--- Script started at $(date) ---" >> $DEBUG_LOG
-
-RCON_PASSWORD="${RCON_PASSWORD}"
-IDLE_TIMEOUT_MINUTES=${IDLE_TIMEOUT_MINUTES}
-idle_minutes=0
-
-echo "Entering RCON wait loop..." >> $DEBUG_LOG
-while ! /usr/local/bin/mcrcon -H 127.0.0.1 -P 25575 -p "\$RCON_PASSWORD" "list" > /dev/null 2>&1; do
-    /usr/bin/echo "Waiting for Minecraft RCON to be available..."
-    echo "RCON not available. Sleeping for 10s..." >> $DEBUG_LOG
-    /usr/bin/sleep 10
-done
-echo "RCON is available. Exited wait loop." >> $DEBUG_LOG
-echo "Entering main player check loop..." >> $DEBUG_LOG
-while true; do
-    player_list=\$(/usr/local/bin/mcrcon -H 127.0.0.1 -P 25575 -p "\$RCON_PASSWORD" "list")
-    player_count=\$(/usr/bin/echo "\$player_list" | /usr/bin/awk 'BEGIN{FS="[ /]"} /players online/{print \$3}')
-
-    if ! [[ "\$player_count" =~ ^[0-9]+$ ]]; then
-        player_count=1
-    fi
-
-    /usr/bin/echo "Current player count: \$player_count"
-
-    if [ "\$player_count" -eq 0 ]; then
-        idle_minutes=\$((idle_minutes + 1))
-        /usr/bin/echo "Server idle. Shutdown counter: \$idle_minutes / \$IDLE_TIMEOUT_MINUTES"
-    else
-        idle_minutes=0
-        /usr/bin/echo "Players are online. Resetting shutdown counter."
-    fi
-
-    if [ "\$idle_minutes" -ge "\$IDLE_TIMEOUT_MINUTES" ]; then
-        /usr/bin/echo "Server has been idle for \$IDLE_TIMEOUT_MINUTES minutes. Shutting down."
-        TOKEN=\$(/usr/bin/curl -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 60")
-        INSTANCE_ID=\$(/usr/bin/curl -H "X-aws-ec2-metadata-token: \$TOKEN" -s http://169.254.169.254/latest/meta-data/instance-id)
-        AWS_REGION=\$(/usr/bin/curl -H "X-aws-ec2-metadata-token: \$TOKEN" -s http://169.254.169.254/latest/meta-data/placement/availability-zone | /usr/bin/sed 's/\(.*\)[a-z]/\1/')
-        echo "Debugging: INSTANCE_ID is \$INSTANCE_ID"
-        echo "Debugging: AWS_REGION is \$AWS_REGION"
-        FLEET_ID=\$(/usr/bin/aws ec2 describe-instances --region "\$AWS_REGION" --instance-ids "\$INSTANCE_ID" --query "Reservations[].Instances[].Tags[?Key=='aws:ec2:fleet-id'].Value" --output text)
-        echo "Debugging: FLEET_ID is \$FLEET_ID"
-        if [ -n "\$FLEET_ID" ]; then
-            /usr/bin/echo "Found EC2 Fleet ID: \$FLEET_ID. Canceling request..."
-            /usr/bin/aws ec2 modify-fleet --region "\$AWS_REGION" --fleet-id "\$FLEET_ID" --target-capacity-specification TotalTargetCapacity=0
-            exit 0
-        else
-            /usr/bin/echo "ERROR: Could not find EC2 Fleet ID."
-            exit 1
-        fi
-    fi
-    /usr/bin/sleep 60
-done
-EOF
-/usr/bin/chmod +x /opt/minecraft/auto_shutdown.sh
+# JVM PROFILE
+# Writes a drop-in that replaces ExecStart above, saves the profile to /opt/minecraft/jvm_profile.json and tags
+# the instance with it (shown by /status).
+/usr/bin/rm -f /etc/systemd/system/minecraft.service.d/jvm-profile.conf
+if [ "${JVM_PROFILE}" == "auto" ]; then
+    /usr/bin/python3 /opt/minecraft/jvm_profile.py --jar-args "${MINECRAFT_JAR_ARGS}" --tag \
+        || /usr/bin/echo "Could not pick a JVM profile, using MINECRAFT_START_COMMAND"
+fi
 
 # AUTO-SHUTDOWN SYSTEMD SERVICE
+# /opt/minecraft/idle_monitor.py follows the server log for joins and leaves, backs up the world and sets the
+# fleet capacity to 0 once nobody has been online for IDLE_TIMEOUT_MINUTES. Its output goes to: journalctl -u minecraft-shutdown
 /usr/bin/cat << EOF > /etc/systemd/system/minecraft-shutdown.service
 [Unit]
 Description=Minecraft Auto-Shutdown Service
@@ -174,9 +106,66 @@ After=minecraft.service
 
 [Service]
 User=ec2-user
-ExecStartPre=/bin/sleep 30
-ExecStart=/opt/minecraft/auto_shutdown.sh
-Restart=always
+EnvironmentFile=/opt/minecraft/minecraft.env
+Environment=IDLE_TIMEOUT_MINUTES=${IDLE_TIMEOUT_MINUTES}
+Environment=SERVER_DIR=${SERVER_DIR}
+Environment=SHUTDOWN_MODE=${SHUTDOWN_MODE}
+Environment=BACKUP_ON_IDLE_SHUTDOWN=${BACKUP_ON_IDLE_SHUTDOWN}
+Environment=PYTHONUNBUFFERED=1
+ExecStart=/usr/bin/python3 /opt/minecraft/idle_monitor.py
+Restart=on-failure
+RestartSec=10s
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# PERFORMANCE SAMPLER SYSTEMD SERVICE
+# /opt/minecraft/perf_sampler.py samples tick times, players, heap and GC every PERF_SAMPLE_INTERVAL seconds into
+# /run/minecraft-perf/perf.json, which the bot's /perf command reads. It runs as the server's user so jcmd can attach.
+/usr/bin/cat << EOF > /etc/systemd/system/minecraft-perf.service
+[Unit]
+Description=Minecraft Performance Sampler
+After=minecraft.service
+
+[Service]
+User=ec2-user
+EnvironmentFile=/opt/minecraft/minecraft.env
+Environment=PERF_SAMPLE_INTERVAL=${PERF_SAMPLE_INTERVAL}
+Environment=PYTHONUNBUFFERED=1
+RuntimeDirectory=minecraft-perf
+# Keep the samples when the sampler restarts
+RuntimeDirectoryPreserve=yes
+ExecStart=/usr/bin/python3 /opt/minecraft/perf_sampler.py
+Restart=on-failure
+RestartSec=10s
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# RESTART SCHEDULER SYSTEMD SERVICE
+# /opt/minecraft/restart_scheduler.py checks the samples in /run/minecraft-perf/perf.json every minute and restarts the
+# server (after a one-minute warning in chat) only when it is lagging or running out of heap. It runs as root to restart
+# minecraft.service. Its decisions and the metrics behind them go to: journalctl -u minecraft-restart
+# It replaces the fixed 6-hourly cron restart, which an AMI built from an older version of this script may still have.
+/usr/bin/rm -f /etc/cron.d/minecraft-restart /opt/minecraft/restart_wrapper.sh
+/usr/bin/cat << EOF > /etc/systemd/system/minecraft-restart.service
+[Unit]
+Description=Minecraft Health-Driven Restart Scheduler
+After=minecraft-perf.service
+
+[Service]
+EnvironmentFile=/opt/minecraft/minecraft.env
+Environment=RESTART_MSPT_P50=${RESTART_MSPT_P50}
+Environment=RESTART_MIN_TPS=${RESTART_MIN_TPS}
+Environment=RESTART_HEAP_FLOOR_PCT=${RESTART_HEAP_FLOOR_PCT}
+Environment=RESTART_MAX_PLAYERS=${RESTART_MAX_PLAYERS}
+Environment=RESTART_MAX_DEFER=${RESTART_MAX_DEFER}
+Environment=PYTHONUNBUFFERED=1
+ExecStart=/usr/bin/python3 /opt/minecraft/restart_scheduler.py
+Restart=on-failure
+RestartSec=10s
 
 [Install]
 WantedBy=multi-user.target
@@ -188,3 +177,7 @@ EOF
 /usr/bin/systemctl start minecraft.service
 /usr/bin/systemctl enable minecraft-shutdown.service
 /usr/bin/systemctl start minecraft-shutdown.service
+/usr/bin/systemctl enable minecraft-perf.service
+/usr/bin/systemctl start minecraft-perf.service
+/usr/bin/systemctl enable minecraft-restart.service
+/usr/bin/systemctl start minecraft-restart.service
@@ -2,15 +2,46 @@
 # Builds the PyNaCl Lambda layer zip file.
 # Requires Docker to be running.
 # The resulting pynacl-layer.zip is uploaded to AWS Lambda > Layers.
+#
+# Usage: bash layer/build_layer.sh [--slim-boto]
+#   --slim-boto  Also packages boto3/botocore into the layer, keeping only the botocore service
+#                models the bot calls (BOTO_SERVICES). Layer packages take precedence over the
+#                runtime's boto3, and the pruned copy is about a quarter of the size.
 
 set -e
 
+# Services the Lambda function creates clients for
+BOTO_SERVICES=${BOTO_SERVICES:-"ec2 ssm lambda dynamodb logs"}
+
+SLIM_BOTO=false
+if [ "$1" == "--slim-boto" ]; then
+  SLIM_BOTO=true
+fi
+
 echo "Building PyNaCl Lambda layer..."
 
+INSTALL="pip install -r /var/task/layer/requirements.txt -t /var/task/python/"
+if [ "$SLIM_BOTO" == "true" ]; then
+  INSTALL="$INSTALL && pip install -r /var/task/layer/requirements-boto.txt -t /var/task/python/"
+fi
+
 docker run \
   -v "$(pwd)":/var/task \
   "public.ecr.aws/lambda/python:3.13" \
-  /bin/sh -c "pip install -r /var/task/layer/requirements.txt -t /var/task/python/; exit"
+  /bin/sh -c "$INSTALL; exit"
+
+if [ "$SLIM_BOTO" == "true" ]; then
+  echo "Pruning botocore and boto3 service models (keeping: $BOTO_SERVICES)..."
+  # Top-level files (endpoints.json, partitions.json, _retry.json, ...) are needed by every client
+  for dir in python/botocore/data/*/ python/boto3/data/*/; do
+    service=$(basename "$dir")
+    if [[ ! " $BOTO_SERVICES " =~ " $service " ]]; then
+      rm -rf "$dir"
+    fi
+  done
+  find python -name "__pycache__" -type d -prune -exec rm -rf {} +
+  rm -rf python/bin
+fi
 
 zip -r layer/pynacl-layer.zip python/
 rm -rf python/